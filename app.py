@@ -1,7 +1,7 @@
 # app.py
 import streamlit as st
 
-from src.db import init_db
+from src.cache import ensure_db
 from src.auth import logout_button
 from src.utils import get_settings
 
@@ -19,7 +19,7 @@ st.set_page_config(
 # Init settings + DB
 # ----------------------------
 settings = get_settings()
-init_db(settings["DB_PATH"])
+ensure_db(settings["DB_PATH"])
 
 # ----------------------------
 # Ensure session defaults
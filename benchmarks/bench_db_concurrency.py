@@ -0,0 +1,108 @@
+"""
+Concurrency benchmark for the SQLite access layer.
+
+Simulates N Streamlit sessions that each list reports and insert new ones at the
+same time, once through the old connect-per-call pattern and once through the
+pooled WAL connections in src.db.
+
+    python -m benchmarks.bench_db_concurrency --sessions 16 --ops 200
+"""
+import argparse
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, List
+
+from src import db
+
+REPORT_JSON = json.dumps({"kpis": {"total_revenue": 1234.5}, "menu_summary": [{"drink_name": "x"}] * 50})
+
+@contextmanager
+def _legacy_conn_ctx(db_path: str):
+    # the pre-pooling implementation: fresh connection and a commit on every call
+    conn = sqlite3.connect(db_path, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    try:
+        yield conn
+        conn.commit()
+    finally:
+        conn.close()
+
+def _legacy_q_all(db_path, sql, params=()):
+    with _legacy_conn_ctx(db_path) as conn:
+        return [dict(r) for r in conn.execute(sql, params).fetchall()]
+
+def _legacy_exec_one(db_path, sql, params=()):
+    with _legacy_conn_ctx(db_path) as conn:
+        return int(conn.execute(sql, params).lastrowid)
+
+def _session(db_path: str, bar_id: int, ops: int, write_every: int,
+             q_all: Callable, exec_one: Callable, errors: List[str], latencies: List[float]) -> None:
+    for i in range(ops):
+        t0 = time.perf_counter()
+        try:
+            if i % write_every == 0:
+                exec_one(db_path,
+                         "INSERT INTO reports (bar_id, upload_id, label, report_json) VALUES (?, ?, ?, ?)",
+                         (bar_id, 1, f"run {i}", REPORT_JSON))
+            else:
+                q_all(db_path,
+                      "SELECT id, label, created_at FROM reports WHERE bar_id = ? ORDER BY created_at DESC LIMIT 50",
+                      (bar_id,))
+        except sqlite3.OperationalError as e:
+            errors.append(str(e))
+        latencies.append(time.perf_counter() - t0)
+
+def _run(name: str, sessions: int, ops: int, write_every: int, q_all: Callable, exec_one: Callable) -> Dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "bench.db")
+        db.init_db(db_path)
+        db.close_thread_connections()
+        if name == "legacy":
+            # legacy databases were created in rollback-journal mode
+            with sqlite3.connect(db_path) as conn:
+                conn.execute("PRAGMA journal_mode=DELETE;")
+
+        errors: List[str] = []
+        latencies: List[float] = []
+        threads = [
+            threading.Thread(target=_session,
+                             args=(db_path, s % 8 + 1, ops, write_every, q_all, exec_one, errors, latencies))
+            for s in range(sessions)
+        ]
+        t0 = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        wall = time.perf_counter() - t0
+
+    latencies.sort()
+    n = len(latencies)
+    return {
+        "mode": name,
+        "ops": n,
+        "wall_s": round(wall, 3),
+        "ops_per_s": round(n / wall, 1) if wall else 0.0,
+        "p50_ms": round(latencies[n // 2] * 1000, 2) if n else 0.0,
+        "p99_ms": round(latencies[min(n - 1, int(n * 0.99))] * 1000, 2) if n else 0.0,
+        "locked_errors": len(errors),
+    }
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--sessions", type=int, default=16)
+    ap.add_argument("--ops", type=int, default=200, help="operations per session")
+    ap.add_argument("--write-every", type=int, default=5, help="every k-th op is a report insert")
+    args = ap.parse_args()
+
+    for name, q_all, exec_one in (("legacy", _legacy_q_all, _legacy_exec_one),
+                                  ("pooled", db.q_all, db.exec_one)):
+        print(json.dumps(_run(name, args.sessions, args.ops, args.write_every, q_all, exec_one)))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+Size and speed of the columnar report encoding vs the JSON-records format.
+
+Builds a report from synthetic POS data with a large menu and times, for each
+format, encoding the report and decoding the menu back into a DataFrame.
+
+    python -m benchmarks.bench_report_codec --drinks 20000 --rows 500000
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+from typing import Any, Callable, Dict
+
+import pandas as pd
+
+from benchmarks.synth import SynthSpec, generate
+from src.analytics import build_report
+from src.io_validate import read_validated
+from src.report_codec import decode_section, encode_report
+
+def _best(fn: Callable[[], Any], repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+def run(drinks: int, rows: int, repeat: int) -> Dict[str, Dict[str, float]]:
+    with tempfile.TemporaryDirectory() as d:
+        paths = generate(SynthSpec(sales_rows=rows, drinks=drinks, items=max(80, drinks // 10)), d)
+        frames = {k: read_validated(p, k)[0] for k, p in paths.items()}
+    report = build_report(frames["sales"], frames["purchases"], frames["recipes"], records=False)
+    records = {k: (v.to_dict(orient="records") if isinstance(v, pd.DataFrame) else v) for k, v in report.items()}
+
+    legacy = json.dumps(records, default=str)
+    report_json, blob = encode_report(report)
+    raw_json, raw_blob = encode_report(report, compress=False)
+
+    def legacy_encode() -> None:
+        json.dumps({k: (v.to_dict(orient="records") if isinstance(v, pd.DataFrame) else v)
+                    for k, v in report.items()}, default=str)
+
+    return {
+        "json_records": {
+            "bytes": len(legacy),
+            "encode_s": round(_best(legacy_encode, repeat), 4),
+            "decode_menu_s": round(_best(lambda: pd.DataFrame(json.loads(legacy)["menu_summary"]), repeat), 4),
+        },
+        "columnar": {
+            "bytes": len(raw_json) + len(raw_blob),
+            "encode_s": round(_best(lambda: encode_report(report, compress=False), repeat), 4),
+            "decode_menu_s": round(_best(lambda: decode_section(raw_blob, "menu_summary"), repeat), 4),
+        },
+        "columnar_zlib": {
+            "bytes": len(report_json) + len(blob),
+            "encode_s": round(_best(lambda: encode_report(report), repeat), 4),
+            "decode_menu_s": round(_best(lambda: decode_section(blob, "menu_summary"), repeat), 4),
+        },
+    }
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--drinks", type=int, default=20_000)
+    ap.add_argument("--rows", type=int, default=500_000)
+    ap.add_argument("--repeat", type=int, default=3)
+    args = ap.parse_args()
+    for fmt, r in run(args.drinks, args.rows, args.repeat).items():
+        print(json.dumps({"format": fmt, **r}))
+
+if __name__ == "__main__":
+    main()
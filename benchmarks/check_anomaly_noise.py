@@ -0,0 +1,84 @@
+"""
+Check the calibration of src/anomalies.py: on pure noise (every drink selling an
+i.i.d. Poisson number of units a day, no pattern at all) it should flag next to
+nothing, and anomalies planted in that noise should still be found.
+
+    python -m benchmarks.check_anomaly_noise --drinks 3000 --days 730
+
+Planted: a one-day spike of three times the usual volume and a week at half volume,
+each in its own set of busy drinks (20 or more a day). Exits 1 if more than
+--max-rate of the series-days are flagged on the noise, or fewer than --min-recall
+of the planted anomalies are found.
+"""
+import argparse
+import sys
+import time
+from typing import Tuple
+
+import numpy as np
+import pandas as pd
+
+from src.anomalies import ANOMALY_PERIOD, ANOMALY_POOL_DAYS, ANOMALY_Z, detect_anomalies
+
+def noise_sales(drinks: int, days: int, seed: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """(days x drinks units, price per drink, rate per drink); rates log-uniform over 0.3 - 60 a day."""
+    rng = np.random.default_rng(seed)
+    rate = np.exp(rng.uniform(np.log(0.3), np.log(60), drinks))
+    price = rng.uniform(5, 15, drinks).round(2)
+    return rng.poisson(rate, size=(days, drinks)).astype(float), price, rate
+
+def as_sales(units: np.ndarray, price: np.ndarray) -> pd.DataFrame:
+    d, s = np.nonzero(units > 0)
+    names = pd.Categorical.from_codes(s, [f"Drink {i:04d}" for i in range(units.shape[1])])
+    return pd.DataFrame({"date": pd.Timestamp("2024-01-01") + pd.to_timedelta(d, "D"), "drink_name": names,
+                         "quantity_sold": units[d, s], "revenue": units[d, s] * price[s]})
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--drinks", type=int, default=3000)
+    ap.add_argument("--days", type=int, default=730)
+    ap.add_argument("--planted", type=int, default=100, help="drinks per planted pattern")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--max-rate", type=float, default=1e-4, help="allowed flagged share of series-days on noise")
+    ap.add_argument("--min-recall", type=float, default=0.9)
+    args = ap.parse_args()
+
+    units, price, rate = noise_sales(args.drinks, args.days, args.seed)
+    sales = as_sales(units, price)
+    t0 = time.perf_counter()
+    found = detect_anomalies(sales, max_rows=len(sales))
+    wall = time.perf_counter() - t0
+    # days that have a full baseline and scale behind them
+    screened = args.drinks * max(args.days - ANOMALY_POOL_DAYS - 2 * ANOMALY_PERIOD, 0)
+    flagged = int(found["days"].sum()) if len(found) else 0
+    rate_flagged = flagged / max(screened, 1)
+    print(f"noise    {args.drinks} drinks x {args.days} days, {len(sales):,} rows in {wall:.3f}s: "
+          f"{len(found)} anomalies, {flagged} flagged days = {rate_flagged:.1e} of series-days "
+          f"(ANOMALY_Z={ANOMALY_Z}, limit {args.max_rate:.0e})")
+
+    rng = np.random.default_rng(args.seed + 1)
+    busy = rng.permutation(np.flatnonzero(rate >= 20))
+    spikes, drops = busy[:args.planted], busy[args.planted:2 * args.planted]
+    day = rng.integers(ANOMALY_POOL_DAYS + 4 * ANOMALY_PERIOD, args.days - ANOMALY_PERIOD, 2 * args.planted)
+    planted = units.copy()
+    planted[day[:len(spikes)], spikes] *= 3
+    for d, s in zip(day[len(spikes):], drops):
+        planted[d:d + ANOMALY_PERIOD, s] = np.round(planted[d:d + ANOMALY_PERIOD, s] / 2)
+    found = detect_anomalies(as_sales(planted, price), max_rows=len(sales))
+    names = found["name"].to_numpy(dtype=str)
+    hits = 0
+    for drinks, days, direction, length in ((spikes, day[:len(spikes)], "spike", 1),
+                                            (drops, day[len(spikes):], "drop", ANOMALY_PERIOD)):
+        for s, d in zip(drinks, days):
+            start = pd.Timestamp("2024-01-01") + pd.Timedelta(days=int(d))
+            end = start + pd.Timedelta(days=length - 1)
+            m = ((names == f"Drink {s:04d}") & (found["direction"] == direction).to_numpy()
+                 & (found["start"] <= end).to_numpy() & (found["end"] >= start).to_numpy())
+            hits += bool(m.any())
+    recall = hits / max(len(spikes) + len(drops), 1)
+    print(f"planted  {len(spikes)} spikes, {len(drops)} week-long drops: found {recall:.0%} "
+          f"(limit {args.min_recall:.0%})")
+    return 0 if rate_flagged <= args.max_rate and recall >= args.min_recall else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,143 @@
+"""
+Check src/cogs.py (recipe_cogs, FIFO and weighted average) against a straightforward
+reference: a per-item queue of purchase layers consumed day by day in plain Python.
+
+Runs on synthetic POS data with a few sub-recipes mixed in and one item never
+purchased, and exits 1 if any drink's recipe COGS differs.
+
+    python -m benchmarks.check_cogs_reference --rows 20000
+"""
+import argparse
+import sys
+import tempfile
+from collections import defaultdict, deque
+from typing import Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.synth import SynthSpec, generate
+from src.cogs import COGS_METHODS, recipe_cogs
+from src.io_validate import read_validated
+from src.recipes import compile_recipes
+
+ML_PER_UNIT = 750.0
+
+def _with_sub_recipes(recipes: pd.DataFrame, rng: np.random.Generator) -> pd.DataFrame:
+    """Two house mixes made of purchased items, one nested in the other, used by some drinks."""
+    items = recipes["item_name"].astype(str).unique()
+    drinks = recipes["drink_name"].astype(str).unique()
+    rows = [("House Mix", items[0], 500.0), ("House Mix", items[1], 250.0),
+            ("Batch Punch", "House Mix", 300.0), ("Batch Punch", items[2], 700.0)]
+    rows += [(d, rng.choice(["House Mix", "Batch Punch"]), 20.0) for d in rng.choice(drinks, 10, replace=False)]
+    extra = pd.DataFrame(rows, columns=["drink_name", "item_name", "ml_per_drink"])
+    return pd.concat([recipes.astype({"drink_name": str, "item_name": str}), extra], ignore_index=True)
+
+def _leaf_ml(recipes: pd.DataFrame) -> Dict[str, List[Tuple[str, float]]]:
+    """drink -> [(purchased item, ml per drink)], sub-recipes expanded by batch share."""
+    rows = defaultdict(list)
+    for d, i, ml in recipes[["drink_name", "item_name", "ml_per_drink"]].itertuples(index=False):
+        rows[d].append((i, float(ml)))
+    memo: Dict[str, List[Tuple[str, float]]] = {}
+
+    def expand(drink: str) -> List[Tuple[str, float]]:
+        if drink not in memo:
+            out = []
+            for item, ml in rows[drink]:
+                if item in rows and item != drink:
+                    batch = sum(m for _, m in rows[item])
+                    out += [(leaf, ml * m / batch) for leaf, m in expand(item)]
+                else:
+                    out.append((item, ml))
+            memo[drink] = out
+        return memo[drink]
+
+    return {d: expand(d) for d in rows}
+
+def reference_cogs(sales: pd.DataFrame, purchases: pd.DataFrame, recipes: pd.DataFrame, method: str) -> pd.Series:
+    """recipe_cogs per drink, one item and one day at a time."""
+    leaf = _leaf_ml(recipes)
+    # ml used per (item, day), and which (drink, ml) made it up
+    used: Dict[str, Dict[pd.Timestamp, float]] = defaultdict(lambda: defaultdict(float))
+    entries = []
+    for day, drink, qty in sales[["date", "drink_name", "quantity_sold"]].itertuples(index=False):
+        for item, ml in leaf.get(str(drink), []):
+            used[item][day] += ml * qty
+            entries.append((str(drink), item, day, ml * qty))
+
+    layers: Dict[str, List[Tuple[pd.Timestamp, float, float]]] = defaultdict(list)
+    p = purchases.sort_values("date", kind="stable")
+    for day, item, units, cost in p[["date", "item_name", "units_purchased", "unit_cost"]].itertuples(index=False):
+        if units > 0:
+            layers[str(item)].append((day, units * ML_PER_UNIT, cost / ML_PER_UNIT))
+
+    cost_per_ml: Dict[Tuple[str, pd.Timestamp], float] = {}
+    for item, by_day in used.items():
+        if not layers[item]:
+            continue   # never purchased: uncosted
+        if method == "fifo":
+            queue = deque([ml, cpm] for _, ml, cpm in layers[item])
+            last = layers[item][-1][2]
+            for day in sorted(by_day):
+                need, cost = by_day[day], 0.0
+                while need > 0 and queue:
+                    take = min(need, queue[0][0])
+                    cost += take * queue[0][1]
+                    queue[0][0] -= take
+                    need -= take
+                    if queue[0][0] <= 0:
+                        queue.popleft()
+                cost += need * last   # beyond everything bought
+                cost_per_ml[item, day] = cost / by_day[day] if by_day[day] > 0 else 0.0
+        else:
+            first_day = layers[item][0][0]
+            first = [(ml, ml * cpm) for d, ml, cpm in layers[item] if d == first_day]
+            first_avg = sum(s for _, s in first) / sum(m for m, _ in first)
+            for day in sorted(by_day):
+                bought = [(ml, ml * cpm) for d, ml, cpm in layers[item] if d <= day]
+                cost_per_ml[item, day] = (sum(s for _, s in bought) / sum(m for m, _ in bought)
+                                          if bought else first_avg)
+
+    out: Dict[str, float] = defaultdict(float)
+    for drink, item, day, ml in entries:
+        if (item, day) in cost_per_ml:
+            out[drink] += ml * cost_per_ml[item, day]
+    return pd.Series(out, dtype=float)
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--rows", type=int, default=20_000)
+    ap.add_argument("--days", type=int, default=120)
+    ap.add_argument("--seed", type=int, default=SynthSpec.seed)
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = generate(SynthSpec(sales_rows=args.rows, drinks=60, items=25, days=args.days, seed=args.seed), tmp)
+        frames = {}
+        for kind, path in paths.items():
+            df, err = read_validated(path, kind)
+            if err:
+                raise SystemExit(err)
+            frames[kind] = df
+    rng = np.random.default_rng(args.seed)
+    recipes = _with_sub_recipes(frames["recipes"], rng)
+    sales = frames["sales"].assign(date=frames["sales"]["date"].dt.floor("D"))
+    purchases = frames["purchases"].assign(date=frames["purchases"]["date"].dt.floor("D"))
+    # one item is never bought, so its usage must stay uncosted
+    skip = frames["recipes"]["item_name"].astype(str).iloc[-1]
+    purchases = purchases[purchases["item_name"].astype(str) != skip]
+
+    compiled = compile_recipes(recipes)
+    failed = False
+    for method in COGS_METHODS:
+        got = recipe_cogs(sales, purchases, compiled, ML_PER_UNIT, method).set_index("drink_name")["recipe_cogs"]
+        want = reference_cogs(sales, purchases, recipes, method).reindex(got.index, fill_value=0.0)
+        diff = float((got - want).abs().max())
+        ok = bool(np.allclose(got.to_numpy(), want.to_numpy(), rtol=1e-9, atol=1e-6))
+        failed |= not ok
+        print(f"{method:8s} drinks={len(got)} total={got.sum():,.2f} reference={want.sum():,.2f} "
+              f"max_abs_diff={diff:.2e} {'ok' if ok else 'MISMATCH'}")
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,92 @@
+"""
+Check that src/report_codec.py round-trips every column type it may be handed:
+decode_section(encode_tables(df)) must equal df, values and dtypes.
+
+Covers categoricals with missing codes and unused categories, nullable Int64 /
+Float64 / boolean with missing values, NaT datetimes, string and JSON-object
+columns, empty frames, and every table section of a report built from synthetic
+POS data (with counts, anomalies and weekly shrinkage). Exits 1 on any mismatch.
+
+    python -m benchmarks.check_report_codec --rows 20000
+"""
+import argparse
+import sys
+import tempfile
+from typing import Dict
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.synth import SynthSpec, generate
+from src.analytics import build_report
+from src.io_validate import read_validated
+from src.report_codec import TABLE_SECTIONS, decode_section, encode_tables
+
+def edge_frames() -> Dict[str, pd.DataFrame]:
+    days = pd.to_datetime(["2024-01-01 00:00:00", None, "2024-03-05 10:30:00"])
+    return {
+        "categorical": pd.DataFrame({
+            "name": pd.Categorical(["Negroni", None, "Mojito", "Negroni"], categories=["Mojito", "Negroni", "Unused"]),
+            "all_missing": pd.Categorical([None] * 4, categories=["x"]),
+        }),
+        "nullable": pd.DataFrame({
+            "int": pd.array([1, None, -3], dtype="Int64"),
+            "float": pd.array([1.5, None, np.inf], dtype="Float64"),
+            "flag": pd.array([True, None, False], dtype="boolean"),
+            "full": pd.array([7, 8, 9], dtype="Int64"),
+        }),
+        "datetimes": pd.DataFrame({"date": days, "all_nat": pd.Series([pd.NaT] * 3, dtype="datetime64[ns]")}),
+        "plain": pd.DataFrame({"f": [0.1, np.nan, -0.0], "f32": np.array([1.5, np.nan, 2], dtype=np.float32),
+                               "i32": np.array([1, -2, 3], dtype=np.int32), "u8": np.array([0, 7, 255], dtype=np.uint8),
+                               "b": [True, False, True]}),
+        "objects": pd.DataFrame({
+            "text": ["a", None, "ünïcode"],
+            "string": pd.array(["x", None, "z"], dtype="string"),
+            "nested": [[1, 2], {"k": "v"}, None],
+        }),
+        "empty": pd.DataFrame(),
+        "empty_columns": pd.DataFrame({"name": pd.Categorical([]), "qty": pd.Series(dtype=float),
+                                       "note": pd.Series(dtype=object), "n": pd.array([], dtype="Int64"),
+                                       "date": pd.Series(dtype="datetime64[ns]")}),
+    }
+
+def report_frames(rows: int, seed: int) -> Dict[str, pd.DataFrame]:
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = generate(SynthSpec(sales_rows=rows, drinks=60, items=25, days=120, seed=seed), tmp)
+        frames = {k: read_validated(p, k)[0] for k, p in paths.items()}
+    purchases = frames["purchases"]
+    # one count per item on two dates, so the counted-shrink columns are filled in
+    counts = (purchases.assign(date=purchases["date"].dt.floor("D"))
+              .groupby("item_name", observed=True).head(2)[["date", "item_name", "units_purchased"]]
+              .rename(columns={"units_purchased": "units_on_hand"}).reset_index(drop=True))
+    report = build_report(frames["sales"], purchases, frames["recipes"], records=False, cogs_method="fifo",
+                          counts=counts, daily_anomalies=True, weekly_shrinkage=True)
+    return {k: report[k] for k in TABLE_SECTIONS if isinstance(report.get(k), pd.DataFrame)}
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--rows", type=int, default=20_000)
+    ap.add_argument("--seed", type=int, default=SynthSpec.seed)
+    args = ap.parse_args()
+
+    tables = {**edge_frames(), **{f"report.{k}": v for k, v in report_frames(args.rows, args.seed).items()}}
+    failed = False
+    for compress in (True, False):
+        blob = encode_tables(tables, compress)
+        for name, df in tables.items():
+            got = decode_section(blob, name)
+            try:
+                # unused categories are dropped on purpose; the column index type of an empty frame doesn't matter
+                pd.testing.assert_frame_equal(got, df.reset_index(drop=True), check_categorical=False,
+                                              check_column_type=False)
+                status = "ok"
+            except AssertionError as e:
+                failed, status = True, "MISMATCH " + " ".join(str(e).split())[:200]
+            if compress:
+                print(f"{name:28s} rows={len(df):6d} cols={df.shape[1]:2d} {status}")
+            elif status != "ok":
+                print(f"{name:28s} uncompressed {status}")
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
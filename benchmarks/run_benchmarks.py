@@ -0,0 +1,159 @@
+"""
+Stage-by-stage benchmark of the analysis pipeline on synthetic POS data.
+
+    python -m benchmarks.run_benchmarks --sizes 10k,100k,1m
+    python -m benchmarks.run_benchmarks --sizes 10k,100k --update-baseline
+
+Each stage is timed (best of --repeat, no tracing) and then run once more under
+tracemalloc for its peak allocation. Results are compared with the stored baseline;
+a stage regresses when it is slower / larger than the baseline by more than the
+tolerance *and* by more than a small absolute noise floor. Exit status is 1 if any
+stage regressed.
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List, Tuple
+
+from benchmarks.synth import SynthSpec, generate
+from src.analytics import approximate_cogs_for_menu, build_report, menu_summary, shrinkage_estimate
+from src.db import exec_one, init_db
+from src.facts import append_purchase_facts, append_sales_facts, sales_day_rollup
+from src.io_validate import VALIDATORS, read_typed_csv
+from src.report_codec import encode_report
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "baselines.json")
+KINDS = ("sales", "purchases", "recipes")
+# regressions smaller than these are treated as noise
+MIN_TIME_DELTA_S = 0.01
+MIN_MEM_DELTA_MIB = 1.0
+
+def parse_size(s: str) -> int:
+    s = s.strip().lower()
+    mult = {"k": 1_000, "m": 1_000_000}.get(s[-1], 1)
+    return int(float(s[:-1] if mult > 1 else s) * mult)
+
+def _measure(fn: Callable[[], Any], repeat: int, memory: bool) -> Tuple[Any, float, float]:
+    best = float("inf")
+    out = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        out = fn()
+        best = min(best, time.perf_counter() - t0)
+    peak = 0.0
+    if memory:
+        tracemalloc.start()
+        fn()
+        peak = tracemalloc.get_traced_memory()[1] / 2**20
+        tracemalloc.stop()
+    return out, best, peak
+
+def run_size(rows: int, data_dir: str, repeat: int, memory: bool) -> Dict[str, Dict[str, float]]:
+    spec = SynthSpec(sales_rows=rows, drinks=min(2000, max(50, rows // 500)), days=730)
+    paths = generate(spec, os.path.join(data_dir, f"pos_{rows}"))
+    results: Dict[str, Dict[str, float]] = {}
+
+    def stage(name: str, fn: Callable[[], Any]) -> Any:
+        out, wall, peak = _measure(fn, repeat, memory)
+        results[name] = {"wall_s": round(wall, 4), "peak_mib": round(peak, 1)}
+        return out
+
+    raw = stage("csv_parse", lambda: {k: read_typed_csv(paths[k], k) for k in KINDS})
+    clean = stage("validate", lambda: {k: VALIDATORS[k](raw[k])[0] for k in KINDS})
+    sales, purchases, recipes = clean["sales"], clean["purchases"], clean["recipes"]
+    del raw
+
+    stage("menu_summary", lambda: menu_summary(sales))
+    stage("approximate_cogs_for_menu", lambda: approximate_cogs_for_menu(sales, purchases))
+    stage("shrinkage_estimate", lambda: shrinkage_estimate(sales, purchases, recipes))
+    report = stage("build_report", lambda: build_report(sales, purchases, recipes, records=False))
+    # the opt-in daily anomaly screen and weekly shrinkage, tracked on their own
+    stage("build_report_extras", lambda: build_report(sales, purchases, recipes, records=False, daily_anomalies=True,
+                                                      weekly_shrinkage=True))
+    report_json, report_blob = stage("report_encode", lambda: encode_report(report))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "bench.db")
+        init_db(db_path)
+
+        def db_insert() -> None:
+            upload_id = exec_one(db_path, "INSERT INTO uploads (bar_id, label, sales_path) VALUES (1, 'bench', ?)",
+                                 (paths["sales"],))
+            append_sales_facts(db_path, 1, upload_id, sales_day_rollup(sales))
+            append_purchase_facts(db_path, 1, upload_id, purchases)
+            exec_one(db_path, "INSERT INTO reports (bar_id, upload_id, label, report_json, report_blob) "
+                     "VALUES (1, ?, 'bench', ?, ?)", (upload_id, report_json, report_blob))
+
+        stage("db_insert", db_insert)
+    return results
+
+def compare(current: Dict[str, Dict[str, Dict[str, float]]], baseline: Dict[str, Any],
+            time_tol: float, mem_tol: float) -> List[str]:
+    regressions = []
+    for size, stages in current.items():
+        for name, m in stages.items():
+            b = baseline.get(size, {}).get(name)
+            if not b:
+                continue
+            dt = m["wall_s"] - b["wall_s"]
+            if dt > MIN_TIME_DELTA_S and m["wall_s"] > b["wall_s"] * (1 + time_tol):
+                regressions.append(f"{size}/{name}: wall {b['wall_s']:.4f}s -> {m['wall_s']:.4f}s")
+            dm = m["peak_mib"] - b["peak_mib"]
+            if b["peak_mib"] and dm > MIN_MEM_DELTA_MIB and m["peak_mib"] > b["peak_mib"] * (1 + mem_tol):
+                regressions.append(f"{size}/{name}: peak {b['peak_mib']:.1f}MiB -> {m['peak_mib']:.1f}MiB")
+    return regressions
+
+def _print_table(size: str, stages: Dict[str, Dict[str, float]], baseline: Dict[str, Any]) -> None:
+    print(f"\n== {size} sales rows ==")
+    print(f"{'stage':<28}{'wall_s':>10}{'base':>10}{'peak_mib':>10}{'base':>10}")
+    for name, m in stages.items():
+        b = baseline.get(size, {}).get(name, {})
+        print(f"{name:<28}{m['wall_s']:>10.4f}{b.get('wall_s', float('nan')):>10.4f}"
+              f"{m['peak_mib']:>10.1f}{b.get('peak_mib', float('nan')):>10.1f}")
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--sizes", default="10k,100k", help="comma separated sales row counts, e.g. 10k,1m,50m")
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--no-memory", action="store_true", help="skip the tracemalloc pass")
+    ap.add_argument("--data-dir", default=None, help="keep generated CSVs here instead of a temp dir")
+    ap.add_argument("--baseline", default=BASELINE_PATH)
+    ap.add_argument("--time-tolerance", type=float, default=0.25, help="allowed relative slowdown")
+    ap.add_argument("--mem-tolerance", type=float, default=0.20, help="allowed relative peak memory growth")
+    ap.add_argument("--update-baseline", action="store_true")
+    args = ap.parse_args()
+
+    baseline: Dict[str, Any] = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    current: Dict[str, Dict[str, Dict[str, float]]] = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        data_dir = args.data_dir or tmp
+        for size in args.sizes.split(","):
+            size = size.strip()
+            current[size] = run_size(parse_size(size), data_dir, args.repeat, not args.no_memory)
+            _print_table(size, current[size], baseline)
+
+    if args.update_baseline:
+        baseline.update(current)
+        with open(args.baseline, "w") as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+        print(f"\nBaseline written to {args.baseline}")
+        return 0
+
+    regressions = compare(current, baseline, args.time_tolerance, args.mem_tolerance)
+    if regressions:
+        print("\nRegressions:")
+        for r in regressions:
+            print(f"  {r}")
+        return 1
+    print("\nNo regressions." if baseline else "\nNo baseline stored yet (run with --update-baseline).")
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
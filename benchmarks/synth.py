@@ -0,0 +1,103 @@
+"""
+Reproducible synthetic POS data: sales by drink, purchases (invoices) and recipes.
+
+    python -m benchmarks.synth --rows 1000000 --out /tmp/pos_1m
+
+Sales rows are written in chunks, so 50M-row files don't need 50M rows in memory.
+"""
+import argparse
+import os
+from dataclasses import dataclass
+from typing import Dict
+
+import numpy as np
+import pandas as pd
+
+CHUNK_ROWS = 1_000_000
+
+@dataclass
+class SynthSpec:
+    sales_rows: int = 100_000
+    drinks: int = 200
+    items: int = 80
+    days: int = 365
+    locations: int = 1
+    start: str = "2024-01-01"
+    seed: int = 7
+
+def _names(prefix: str, n: int, rng: np.random.Generator) -> np.ndarray:
+    # a few messy variants (stray spaces) so cleaning paths get exercised
+    names = np.array([f"{prefix} {i}" for i in range(n)], dtype=object)
+    pad = rng.random(n) < 0.05
+    names[pad] = [f" {x} " for x in names[pad]]
+    return names
+
+def generate(spec: SynthSpec, out_dir: str) -> Dict[str, str]:
+    """Write sales.csv, purchases.csv and recipes.csv into out_dir and return their paths."""
+    os.makedirs(out_dir, exist_ok=True)
+    rng = np.random.default_rng(spec.seed)
+    drinks = _names("Drink", spec.drinks, rng)
+    items = _names("Item", spec.items, rng)
+    dates = pd.date_range(spec.start, periods=spec.days).strftime("%Y-%m-%d").to_numpy()
+    locations = np.array([f"Location {i}" for i in range(spec.locations)], dtype=object)
+
+    # popularity and price per drink are fixed so aggregates look like a real menu
+    popularity = rng.zipf(1.6, spec.drinks).astype(float)
+    popularity /= popularity.sum()
+    price = rng.uniform(6, 18, spec.drinks).round(2)
+
+    paths = {k: os.path.join(out_dir, f"{k}.csv") for k in ("sales", "purchases", "recipes")}
+
+    written = 0
+    header = True
+    with open(paths["sales"], "w", newline="") as f:
+        while written < spec.sales_rows:
+            n = min(CHUNK_ROWS, spec.sales_rows - written)
+            d = rng.choice(spec.drinks, n, p=popularity)
+            qty = rng.poisson(3, n)
+            pd.DataFrame({
+                "date": rng.choice(dates, n),
+                "location": rng.choice(locations, n),
+                "drink_name": drinks[d],
+                "quantity_sold": qty,
+                "revenue": (qty * price[d]).round(2),
+            }).to_csv(f, index=False, header=header)
+            header = False
+            written += n
+
+    # roughly weekly invoices per item and location
+    n_p = max(1, spec.items * spec.locations * max(1, spec.days // 7))
+    pd.DataFrame({
+        "date": rng.choice(dates, n_p),
+        "location": rng.choice(locations, n_p),
+        "item_name": rng.choice(items, n_p),
+        "units_purchased": rng.integers(1, 12, n_p),
+        "unit_cost": rng.uniform(12, 45, n_p).round(2),
+    }).to_csv(paths["purchases"], index=False)
+
+    # 1-3 ingredients per drink
+    k = rng.integers(1, 4, spec.drinks)
+    pd.DataFrame({
+        "drink_name": np.repeat(drinks, k),
+        "item_name": rng.choice(items, int(k.sum())),
+        "ml_per_drink": rng.choice([15, 30, 45, 60], int(k.sum())),
+    }).to_csv(paths["recipes"], index=False)
+    return paths
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--rows", type=int, default=SynthSpec.sales_rows, help="sales rows (10k .. 50M)")
+    ap.add_argument("--drinks", type=int, default=SynthSpec.drinks)
+    ap.add_argument("--items", type=int, default=SynthSpec.items)
+    ap.add_argument("--days", type=int, default=SynthSpec.days)
+    ap.add_argument("--locations", type=int, default=SynthSpec.locations)
+    ap.add_argument("--seed", type=int, default=SynthSpec.seed)
+    ap.add_argument("--out", required=True)
+    a = ap.parse_args()
+    spec = SynthSpec(sales_rows=a.rows, drinks=a.drinks, items=a.items, days=a.days,
+                     locations=a.locations, seed=a.seed)
+    for kind, path in generate(spec, a.out).items():
+        print(f"{kind}: {path}")
+
+if __name__ == "__main__":
+    main()
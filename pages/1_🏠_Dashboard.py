@@ -1,9 +1,13 @@
 import streamlit as st
+import pandas as pd
 from src.utils import get_settings
 from src.auth import require_login
 from src.db import q_all, q_one, exec_one, require_user
+from src.reports import list_reports
+from src.cache import ensure_db, cached_kpi_trend
 
 settings = get_settings()
+ensure_db(settings["DB_PATH"])
 require_login()
 user = require_user()
 
@@ -43,9 +47,9 @@ st.session_state["active_bar_name"] = selected["name"]
 
 st.success(f"Active bar set to: **{selected['name']}**")
 
-# Quick stats
-uploads = q_all(settings["DB_PATH"], "SELECT * FROM uploads WHERE bar_id = ? ORDER BY created_at DESC LIMIT 5", (selected["id"],))
-reports = q_all(settings["DB_PATH"], "SELECT * FROM reports WHERE bar_id = ? ORDER BY created_at DESC LIMIT 5", (selected["id"],))
+# Quick stats (metadata columns only; report bodies are never read on this page)
+uploads = q_all(settings["DB_PATH"], "SELECT label, created_at FROM uploads WHERE bar_id = ? ORDER BY created_at DESC LIMIT 5", (selected["id"],))
+reports = list_reports(settings["DB_PATH"], selected["id"], limit=5)
 
 c1, c2 = st.columns(2)
 with c1:
@@ -59,3 +63,28 @@ with c2:
         for r in reports[:5]:
             st.caption(f"• {r['label']} — {r['created_at']}")
 
+
+# KPI trends, one point per reporting period, straight from report_kpis
+trend = cached_kpi_trend(settings["DB_PATH"], selected["id"])
+if len(trend) > 1:
+    st.subheader("Trends")
+    t = trend.set_index("date_max")
+    t.index.name = "period end"
+    last, prev = trend.iloc[-1], trend.iloc[-2]
+    m1, m2, m3, m4 = st.columns(4)
+    m1.metric("Revenue", f"${last['total_revenue'] or 0:,.0f}", f"{(last['total_revenue'] or 0) - (prev['total_revenue'] or 0):+,.0f}")
+    m2.metric("Units sold", f"{last['total_units'] or 0:,.0f}", f"{(last['total_units'] or 0) - (prev['total_units'] or 0):+,.0f}")
+    m3.metric("Purchases spend", f"${last['total_purchases_spend']:,.0f}" if pd.notna(last["total_purchases_spend"]) else "—")
+    m4.metric("Top leak", f"${last['top_leak_cost']:,.0f}" if pd.notna(last["top_leak_cost"]) else "—",
+              help=f"Largest shrinkage gap cost ({last['top_leak_item']})" if last["top_leak_item"] else None)
+    c1, c2 = st.columns(2)
+    c1.caption("Revenue vs purchases spend")
+    c1.line_chart(t[["total_revenue", "total_purchases_spend"]].rename(
+        columns={"total_revenue": "revenue", "total_purchases_spend": "purchases spend"}))
+    c2.caption("Units sold")
+    c2.line_chart(t[["total_units"]].rename(columns={"total_units": "units"}))
+    if t["top_leak_cost"].notna().any():
+        st.caption("Top shrinkage leak cost per period")
+        st.bar_chart(t[["top_leak_cost"]].rename(columns={"top_leak_cost": "top leak cost"}))
+elif len(trend) == 1:
+    st.caption("Trends appear once the bar has reports for more than one period.")
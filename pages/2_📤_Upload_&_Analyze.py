@@ -1,12 +1,17 @@
-import os
-import json
+import time
 import streamlit as st
 import pandas as pd
 from src.utils import get_settings
 from src.auth import require_login
-from src.db import exec_one, q_one, require_user
-from src.io_validate import validate_sales, validate_purchases, validate_recipes
-from src.analytics import build_report
+from src.db import require_user
+from src.storage import content_hash, blob_path
+from src.jobs import get_job_runner, get_job, active_jobs
+from src.cache import cached_report_section, cached_report_frame
+
+# sales files above this size default to chunked (streaming) ingest
+STREAMING_THRESHOLD_BYTES = 200 * 1024 * 1024
+JOB_POLL_SECONDS = 1.0
+COGS_CHOICES = {"approx": "Approximate (revenue share)", "fifo": "Recipe cost, FIFO", "average": "Recipe cost, weighted average"}
 
 settings = get_settings()
 require_login()
@@ -27,102 +32,92 @@ st.markdown("### Upload files (CSV)")
 sales_file = st.file_uploader("Sales by Drink (required)", type=["csv"], key="sales_csv")
 purchases_file = st.file_uploader("Purchases (optional)", type=["csv"], key="purchases_csv")
 recipes_file = st.file_uploader("Recipes (optional, enables shrinkage)", type=["csv"], key="recipes_csv")
+counts_file = st.file_uploader("Inventory counts (optional: date, item_name, units_on_hand)", type=["csv"],
+                               key="counts_csv", help="Stock on hand at close of each count date, in purchased units "
+                                                      "(0.4 = four tenths of a bottle). Reconciles weekly shrinkage.")
 
 ml_default = st.number_input("Assumed ml per purchased unit (default bottle size)", min_value=100, max_value=5000, value=750, step=50)
 
+cogs_method = st.selectbox(
+    "COGS method",
+    list(COGS_CHOICES),
+    format_func=lambda m: COGS_CHOICES[m],
+    help="FIFO / weighted average cost each drink through its recipe at the cost of the stock it used "
+         "(needs purchases and recipes). Approximate allocates total spend by revenue share.",
+)
+
+c_anom, c_week = st.columns(2)
+daily_anomalies = c_anom.checkbox(
+    "Daily anomaly screen",
+    help="Flags days, or runs of days, where a drink or recipe ingredient sold far off its usual level for that "
+         "weekday. Adds time on large files.",
+)
+weekly_shrinkage = c_week.checkbox(
+    "Weekly shrinkage",
+    help="Expected usage vs purchases per item, week by week (needs purchases and recipes). Always on when "
+         "inventory counts are uploaded.",
+)
+
 label = st.text_input("Label for this run (e.g., 'Dec 2025 POS Export')", value="New analysis")
 
-def _save_upload_file(file, out_path: str):
-    with open(out_path, "wb") as f:
-        f.write(file.getbuffer())
+streaming = st.checkbox(
+    "Streaming mode (very large sales files)",
+    value=(sales_file is not None and sales_file.size > STREAMING_THRESHOLD_BYTES),
+    help="Reads the sales CSV in chunks so memory stays flat regardless of file size.",
+)
 
 if st.button("Run analysis", type="primary", use_container_width=True, disabled=(sales_file is None)):
-    # Read CSVs
-    try:
-        sales_df_raw = pd.read_csv(sales_file)
-    except Exception as e:
-        st.error(f"Could not read sales CSV: {e}")
-        st.stop()
-
-    sales_df, err = validate_sales(sales_df_raw)
-    if err:
-        st.error(err)
-        st.stop()
-
-    purchases_df = None
-    recipes_df = None
-
-    if purchases_file is not None:
-        try:
-            purchases_raw = pd.read_csv(purchases_file)
-            purchases_df, err2 = validate_purchases(purchases_raw)
-            if err2:
-                st.error(err2)
-                st.stop()
-        except Exception as e:
-            st.error(f"Could not read purchases CSV: {e}")
-            st.stop()
-
-    if recipes_file is not None:
-        try:
-            recipes_raw = pd.read_csv(recipes_file)
-            recipes_df, err3 = validate_recipes(recipes_raw)
-            if err3:
-                st.error(err3)
-                st.stop()
-        except Exception as e:
-            st.error(f"Could not read recipes CSV: {e}")
-            st.stop()
-
-    # Store files to disk per bar
-    bar_dir = os.path.join(settings["DATA_DIR"], f"bar_{bar_id}")
-    os.makedirs(bar_dir, exist_ok=True)
-
-    upload_label = label.strip() or "New analysis"
-    sales_path = os.path.join(bar_dir, f"sales_{pd.Timestamp.now().strftime('%Y%m%d_%H%M%S')}.csv")
-    _save_upload_file(sales_file, sales_path)
-
-    purchases_path = None
-    recipes_path = None
-    if purchases_file is not None:
-        purchases_path = os.path.join(bar_dir, f"purchases_{pd.Timestamp.now().strftime('%Y%m%d_%H%M%S')}.csv")
-        _save_upload_file(purchases_file, purchases_path)
-
-    if recipes_file is not None:
-        recipes_path = os.path.join(bar_dir, f"recipes_{pd.Timestamp.now().strftime('%Y%m%d_%H%M%S')}.csv")
-        _save_upload_file(recipes_file, recipes_path)
-
-    upload_id = exec_one(
-        settings["DB_PATH"],
-        "INSERT INTO uploads (bar_id, label, sales_path, purchases_path, recipes_path) VALUES (?, ?, ?, ?, ?)",
-        (bar_id, upload_label, sales_path, purchases_path, recipes_path),
-    )
-
-    # Build report
-    report = build_report(sales_df, purchases_df, recipes_df, ml_per_unit_purchased_default=float(ml_default))
-    report_json = json.dumps(report)
-
-    report_id = exec_one(
-        settings["DB_PATH"],
-        "INSERT INTO reports (bar_id, upload_id, label, report_json) VALUES (?, ?, ?, ?)",
-        (bar_id, upload_id, upload_label, report_json),
-    )
-
-    st.success("Report generated and saved.")
-    st.session_state["last_report_id"] = report_id
+    # Only hashing happens here. Writing the files to the content store, parsing,
+    # validation and the report all run on the background job, the writes overlapping
+    # the analysis.
+    params = {
+        "ml_per_unit_purchased_default": float(ml_default),
+        "streaming": bool(streaming),
+        "perf_enabled": settings["PERF_ENABLED"],
+        "cogs_method": cogs_method,
+        "daily_anomalies": bool(daily_anomalies),
+        "weekly_shrinkage": bool(weekly_shrinkage),
+    }
+    data = {}
+    for kind, f in (("sales", sales_file), ("purchases", purchases_file), ("recipes", recipes_file),
+                    ("counts", counts_file)):
+        if f is not None:
+            data[kind] = f.getvalue()
+            digest = content_hash(data[kind])
+            params[f"{kind}_hash"] = digest
+            params[f"{kind}_path"] = blob_path(settings["DATA_DIR"], digest)
+
+    job_id = get_job_runner(settings["DB_PATH"]).submit(bar_id, label.strip() or "New analysis", params, data=data)
+    st.session_state["active_job_id"] = job_id
     st.rerun()
 
+# Poll the running job (also picks up jobs started before a rerun or in another tab).
+# Creating the runner first marks jobs orphaned by a server restart as failed.
+get_job_runner(settings["DB_PATH"])
+job_id = st.session_state.get("active_job_id")
+if not job_id:
+    pending = active_jobs(settings["DB_PATH"], bar_id)
+    job_id = pending[-1]["id"] if pending else None
+if job_id:
+    job = get_job(settings["DB_PATH"], job_id)
+    if job and job["bar_id"] == bar_id:
+        if job["status"] in ("queued", "running"):
+            st.progress(float(job["progress"] or 0.0), text=f"**{job['label']}** — {job['stage']}")
+            time.sleep(JOB_POLL_SECONDS)
+            st.rerun()
+        st.session_state.pop("active_job_id", None)
+        if job["status"] == "done":
+            st.success("Report generated and saved.")
+            st.session_state["last_report_id"] = job["report_id"]
+        else:
+            st.error(job["error"] or "Analysis failed.")
+
 # If a report was just created, show a preview
 last_id = st.session_state.get("last_report_id")
 if last_id:
-    import json
-    from src.db import q_one
-
-    row = q_one(settings["DB_PATH"], "SELECT * FROM reports WHERE id = ? AND bar_id = ?", (last_id, bar_id))
-    if row:
-        rep = json.loads(row["report_json"])
+    k = cached_report_section(settings["DB_PATH"], bar_id, last_id, "kpis")
+    if k is not None:
         st.markdown("## Preview")
-        k = rep.get("kpis", {})
         c1, c2, c3, c4 = st.columns(4)
         c1.metric("Revenue", f"${k.get('total_revenue', 0):,.0f}")
         c2.metric("Units sold", f"{k.get('total_units', 0):,.0f}")
@@ -130,21 +125,28 @@ if last_id:
         c4.metric("Purchases spend", f"${k.get('total_purchases_spend', 0):,.0f}" if "total_purchases_spend" in k else "—")
 
         st.markdown("### Top actions")
-        for a in rep.get("actions", {}).get("top_3", []):
+        for a in (cached_report_section(settings["DB_PATH"], bar_id, last_id, "actions") or {}).get("top_3", []):
             st.info(f"**{a['title']}**\n\n- Why: {a['why']}\n- Do this: {a['do_this']}")
 
-        menu = pd.DataFrame(rep.get("menu_summary", []))
+        menu = cached_report_frame(settings["DB_PATH"], bar_id, last_id, "menu_summary")
         if len(menu) > 0:
             st.markdown("### Top drinks by revenue")
             st.dataframe(menu.sort_values("revenue", ascending=False).head(15), use_container_width=True)
 
-        approx = pd.DataFrame(rep.get("menu_profit_approx", []))
+        approx = cached_report_frame(settings["DB_PATH"], bar_id, last_id, "menu_profit_approx")
         if len(approx) > 0:
             st.markdown("### Approx profit leak ranking (worst first)")
             st.dataframe(approx[["drink_name", "revenue", "approx_cogs_allocated", "approx_gross_profit", "approx_margin"]].head(20), use_container_width=True)
 
-        shrink = pd.DataFrame(rep.get("shrinkage", []))
+        true_cogs = cached_report_frame(settings["DB_PATH"], bar_id, last_id, "menu_profit_recipe")
+        if len(true_cogs) > 0:
+            st.markdown("### Recipe-costed profit (worst first)")
+            st.dataframe(true_cogs[["drink_name", "revenue", "recipe_cogs", "gross_profit", "margin", "costed_share"]].head(20), use_container_width=True)
+
+        shrink = cached_report_frame(settings["DB_PATH"], bar_id, last_id, "shrinkage")
         if len(shrink) > 0:
             st.markdown("### Shrinkage signals (requires recipes)")
             st.dataframe(shrink[["item_name", "ml_expected", "ml_purchased", "ml_gap", "est_cost_of_gap"]].head(25), use_container_width=True)
-
+        if "counted_shrink_cost" in k:
+            st.metric("Counted shrinkage (vs inventory counts)", f"${k['counted_shrink_cost']:,.0f}",
+                      help=f"{k['counted_shrink_ml']:,.0f} ml missing against book stock between counts")
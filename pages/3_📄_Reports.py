@@ -1,9 +1,13 @@
-import json
 import streamlit as st
 import pandas as pd
 from src.utils import get_settings
 from src.auth import require_login
-from src.db import q_all, q_one, require_user
+from src.db import require_user, q_one
+from src.reports import list_reports
+from src.cache import (cached_day_cube, cached_day_slice, cached_report_list, cached_report_section, cached_report_frame,
+                       cached_scenario_cube)
+from src.daycube import WEEKDAYS
+from src.jobs import get_job_runner
 
 settings = get_settings()
 require_login()
@@ -20,45 +24,188 @@ if not bar_id:
 
 st.caption(f"Active bar: **{bar_name}**")
 
-rows = q_all(settings["DB_PATH"], "SELECT * FROM reports WHERE bar_id = ? ORDER BY created_at DESC", (bar_id,))
+# Metadata only; older pages are fetched on demand via keyset pagination
+rows = cached_report_list(settings["DB_PATH"], bar_id)
 if not rows:
     st.info("No reports yet. Go to Upload & Analyze.")
     st.stop()
 
+older = st.session_state.setdefault("older_reports", {}).setdefault(bar_id, [])
+# drop pages loaded before newer reports pushed rows into the first page
+first_ids = {r["id"] for r in rows}
+older[:] = [r for r in older if r["id"] not in first_ids]
+rows = rows + older
+
 labels = [f"{r['label']} — {r['created_at']}" for r in rows]
-idx = st.selectbox("Select a report", range(len(rows)), format_func=lambda i: labels[i])
+c_sel, c_more = st.columns([4, 1])
+idx = c_sel.selectbox("Select a report", range(len(rows)), format_func=lambda i: labels[i])
+if c_more.button("Load older", use_container_width=True):
+    last = rows[-1]
+    more = list_reports(settings["DB_PATH"], bar_id, after=(last["created_at"], last["id"]))
+    if more:
+        older.extend(more)
+        st.rerun()
+    else:
+        st.caption("No older reports.")
 r = rows[idx]
-rep = json.loads(r["report_json"])
 
-k = rep.get("kpis", {})
+def _section(name: str):
+    return cached_report_section(settings["DB_PATH"], bar_id, r["id"], name)
+
+def _frame(name: str) -> pd.DataFrame:
+    return cached_report_frame(settings["DB_PATH"], bar_id, r["id"], name)
+
+upload = q_one(settings["DB_PATH"], "SELECT * FROM uploads WHERE id = ? AND bar_id = ?", (r["upload_id"], bar_id))
+cube = (cached_day_cube(settings["DB_PATH"], upload["sales_hash"], upload["purchases_hash"])
+        if upload and upload.get("sales_hash") else None)
+
+# KPIs, menu, approximate profit and actions can be re-cut by date / weekday from the
+# upload's day cube; everything else always covers the whole upload
+sliced = None
+if cube is not None and len(cube.days):
+    first, last = cube.days[0].date(), cube.days[-1].date()
+    c_dates, c_days = st.columns([2, 3])
+    dates = c_dates.date_input("Dates", value=(first, last), min_value=first, max_value=last,
+                               key=f"slice_dates_{r['id']}")
+    weekdays = c_days.multiselect("Weekdays", list(range(7)), default=list(range(7)),
+                                  format_func=WEEKDAYS.__getitem__, key=f"slice_weekdays_{r['id']}")
+    start, end = (dates[0], dates[-1]) if dates else (first, last)
+    if (start, end) != (first, last) or len(weekdays) < 7:
+        sliced = cached_day_slice(settings["DB_PATH"], upload["sales_hash"], upload["purchases_hash"],
+                                  start, end, tuple(sorted(weekdays)))
+        st.caption("Filtered view: KPIs, menu summary, approximate profit and actions cover the selected days only.")
+        if sliced["kpis"].get("unique_drinks", 0) == 0:
+            st.info("No sales on the selected days. Widen the dates or pick more weekdays.")
+
+def _table(name: str) -> pd.DataFrame:
+    if sliced is not None and name in ("menu_summary", "menu_profit_approx"):
+        return sliced.get(name, pd.DataFrame())
+    return _frame(name)
+
+k = _section("kpis") or {}
+top = sliced["kpis"] if sliced is not None else k
 c1, c2, c3, c4 = st.columns(4)
-c1.metric("Revenue", f"${k.get('total_revenue', 0):,.0f}")
-c2.metric("Units sold", f"{k.get('total_units', 0):,.0f}")
-c3.metric("Unique drinks", f"{k.get('unique_drinks', 0)}")
-c4.metric("Purchases spend", f"${k.get('total_purchases_spend', 0):,.0f}" if "total_purchases_spend" in k else "—")
+c1.metric("Revenue", f"${top.get('total_revenue', 0):,.0f}")
+c2.metric("Units sold", f"{top.get('total_units', 0):,.0f}")
+c3.metric("Unique drinks", f"{top.get('unique_drinks', 0)}")
+c4.metric("Purchases spend", f"${top.get('total_purchases_spend', 0):,.0f}" if "total_purchases_spend" in top else "—")
 
 st.markdown("## Owner Summary")
-for a in rep.get("actions", {}).get("top_3", []):
+actions = sliced["actions"] if sliced is not None else _section("actions")
+for a in (actions or {}).get("top_3", []):
     st.info(f"**{a['title']}**\n\n- Why: {a['why']}\n- Do this: {a['do_this']}")
 
 st.markdown("## Data Views")
 
-menu = pd.DataFrame(rep.get("menu_summary", []))
-if len(menu) > 0:
-    st.subheader("Menu summary")
-    st.dataframe(menu, use_container_width=True)
+# each table is only loaded and decoded when its toggle is on
+if st.toggle("Menu summary", key="show_menu"):
+    menu = _table("menu_summary")
+    if len(menu) > 0:
+        st.dataframe(menu, use_container_width=True)
 
-approx = pd.DataFrame(rep.get("menu_profit_approx", []))
-if len(approx) > 0:
-    st.subheader("Approx profit leak ranking (worst first)")
-    st.dataframe(approx, use_container_width=True)
-else:
-    st.caption("No purchases uploaded for this run, so profit approximation is not available.")
+if st.toggle("Approx profit leak ranking (worst first)", key="show_profit"):
+    approx = _table("menu_profit_approx")
+    if len(approx) > 0:
+        st.dataframe(approx, use_container_width=True)
+    else:
+        st.caption("No purchases uploaded for this run, so profit approximation is not available.")
 
-shrink = pd.DataFrame(rep.get("shrinkage", []))
-if len(shrink) > 0:
-    st.subheader("Shrinkage signals")
-    st.dataframe(shrink, use_container_width=True)
-else:
-    st.caption("No recipes+purchases for this run, so shrinkage signals are not available.")
+if "total_recipe_cogs" in k and st.toggle("Recipe-costed profit (worst first)", key="show_recipe_cogs"):
+    st.caption((_section("method_notes") or {}).get("recipe_cogs_method", ""))
+    st.dataframe(_frame("menu_profit_recipe"), use_container_width=True)
 
+if st.toggle("Shrinkage signals", key="show_shrink"):
+    shrink = _frame("shrinkage")
+    if len(shrink) > 0:
+        st.dataframe(shrink, use_container_width=True)
+    else:
+        st.caption("No recipes+purchases for this run, so shrinkage signals are not available.")
+
+notes = _section("method_notes") or {}
+if "shrinkage_periods_method" in notes and st.toggle("Weekly shrinkage", key="show_shrink_weekly"):
+    st.caption(notes["shrinkage_periods_method"])
+    weekly = _frame("shrinkage_periods")
+    if "counted_shrink_cost" in k:
+        c1, c2 = st.columns(2)
+        c1.metric("Counted shrinkage", f"${k['counted_shrink_cost']:,.0f}")
+        c2.metric("Counted shrinkage (ml)", f"{k['counted_shrink_ml']:,.0f}")
+    if weekly.empty:
+        st.caption("No recipe item had sales or purchases to phase by week.")
+    else:
+        item = st.selectbox("Item", ["All items"] + sorted(weekly["item_name"].astype(str).unique()), key="shrink_item")
+        if item == "All items":
+            by_week = weekly.groupby("period_end", as_index=True)[["est_cost_of_gap", "est_cost_of_shrink"]].sum()
+            st.bar_chart(by_week if "counted_shrink_cost" in k else by_week[["est_cost_of_gap"]])
+        else:
+            one = weekly[weekly["item_name"].astype(str) == item]
+            st.line_chart(one.set_index("period_end")[["ml_expected", "ml_purchased", "ml_gap_cum"]])
+            st.dataframe(one, use_container_width=True, hide_index=True)
+
+if "anomaly_count" in k and st.toggle(f"Daily anomalies ({k['anomaly_count']})", key="show_anomalies"):
+    st.caption((_section("method_notes") or {}).get("anomaly_method", ""))
+    anomalies = _frame("anomalies")
+    if len(anomalies) > 0:
+        st.dataframe(anomalies, use_container_width=True)
+    else:
+        st.caption("No day stood out from its weekday baseline.")
+
+# the scenario cube is computed once per report and targeting choice; the sliders only slice it
+if st.toggle("What-if scenarios", key="show_whatif"):
+    top_n = st.selectbox("Apply price change to", [2, 5, 10, 0],
+                         format_func=lambda n: f"Top {n} sellers" if n else "Every drink")
+    scenario = cached_scenario_cube(settings["DB_PATH"], bar_id, r["id"], top_n)
+    c_dp, c_el, c_ml = st.columns(3)
+    dp = c_dp.select_slider("Price change ($)", options=scenario.price_deltas.tolist(), value=0.5)
+    el = c_el.select_slider("Demand elasticity", options=scenario.elasticities.tolist(), value=-0.5,
+                            help="% change in volume per % change in price. 0 = volume unaffected.")
+    ml = c_ml.select_slider("Bottle size (ml)", options=scenario.bottle_sizes.tolist(), value=scenario.base_bottle_ml)
+
+    totals = scenario.totals()
+    point = totals[(totals["bottle_ml"] == ml) & (totals["price_delta"] == dp) & (totals["elasticity"] == el)].iloc[0]
+    m1, m2, m3 = st.columns(3)
+    m1.metric("Revenue", f"${point['revenue']:,.0f}", f"{point['revenue'] - scenario.base_revenue:+,.0f}")
+    m2.metric("Shrinkage gap cost", f"${point['gap_cost']:,.0f}")
+    m3.metric("Net vs this report", f"${point['net_change']:+,.0f}")
+
+    st.caption("Net change by price change and elasticity at the selected bottle size")
+    grid = totals[totals["bottle_ml"] == ml].pivot(index="price_delta", columns="elasticity", values="net_change")
+    st.dataframe(grid.style.format("{:+,.0f}"), use_container_width=True)
+    st.dataframe(scenario.by_drink(dp, el).head(20), use_container_width=True, hide_index=True)
+    if len(scenario.items):
+        st.dataframe(scenario.by_item(ml).head(20), use_container_width=True, hide_index=True)
+
+st.markdown("## Re-run analysis")
+if not upload or not upload.get("sales_hash"):
+    st.caption("This report was saved before uploads were kept for re-analysis. Upload the files again to re-run it.")
+else:
+    st.caption("Rebuilds this report from the saved upload (no re-upload, CSVs are not re-parsed) with a different "
+               "bottle size, COGS method or set of sections.")
+    c_ml, c_cogs, c_run = st.columns([2, 2, 1])
+    ml_default = c_ml.number_input("Assumed ml per purchased unit", min_value=100, max_value=5000, value=750, step=50,
+                                   key="rerun_ml")
+    cogs_method = c_cogs.selectbox("COGS method", ["approx", "fifo", "average"], key="rerun_cogs",
+                                   format_func={"approx": "Approximate", "fifo": "Recipe, FIFO",
+                                                "average": "Recipe, weighted average"}.get)
+    c_anom, c_week, _ = st.columns([2, 2, 1])
+    # default to the sections this report has
+    daily_anomalies = c_anom.checkbox("Daily anomaly screen", value="anomaly_count" in k,
+                                      key=f"rerun_anomalies_{r['id']}")
+    weekly_shrinkage = c_week.checkbox("Weekly shrinkage", value="shrinkage_periods_method" in notes,
+                                       key=f"rerun_weekly_{r['id']}")
+    if c_run.button("Re-run", use_container_width=True):
+        params = {
+            "ml_per_unit_purchased_default": float(ml_default),
+            "perf_enabled": settings["PERF_ENABLED"],
+            "upload_id": upload["id"],
+            "cogs_method": cogs_method,
+            "daily_anomalies": bool(daily_anomalies),
+            "weekly_shrinkage": bool(weekly_shrinkage),
+        }
+        for kind in ("sales", "purchases", "recipes", "counts"):
+            if upload.get(f"{kind}_path"):
+                params[f"{kind}_path"] = upload[f"{kind}_path"]
+                params[f"{kind}_hash"] = upload[f"{kind}_hash"]
+        job_id = get_job_runner(settings["DB_PATH"]).submit(bar_id, f"{upload['label']} ({ml_default:g} ml, {cogs_method})", params)
+        # the Upload & Analyze page polls the job and previews the new report
+        st.session_state["active_job_id"] = job_id
+        st.switch_page("pages/2_📤_Upload_&_Analyze.py")
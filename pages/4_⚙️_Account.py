@@ -1,10 +1,10 @@
 import streamlit as st
 from src.utils import get_settings
-from src.db import init_db
+from src.cache import ensure_db
 from src.auth import signup, login
 
 settings = get_settings()
-init_db(settings["DB_PATH"])
+ensure_db(settings["DB_PATH"])
 
 st.title("⚙️ Account")
 
@@ -0,0 +1,50 @@
+import streamlit as st
+import pandas as pd
+from src.utils import get_settings
+from src.auth import require_login
+from src.db import require_user
+from src.perf import stage_percentiles, slowest_runs, run_events
+
+settings = get_settings()
+require_login()
+user = require_user()
+
+st.title("🩺 Diagnostics")
+
+if user["email"].lower() not in settings["ADMIN_EMAILS"]:
+    st.warning("This page is only available to admins (ADMIN_EMAILS in secrets).")
+    st.stop()
+
+if not settings["PERF_ENABLED"]:
+    st.info("Stage timing is switched off (PERF_ENABLED = false). Showing previously recorded runs only.")
+
+# rss_delta_mb is per span; peak_rss_mb is the server process's high-water mark at the time
+MEMORY_COLUMNS = {
+    "rss_delta_mb": st.column_config.NumberColumn("RSS change (MB)", format="%.1f",
+                                                  help="Resident memory at the end of the stage minus at its start "
+                                                       "(whole process, so concurrent jobs share it)"),
+    "peak_rss_mb": st.column_config.NumberColumn("Process peak RSS (MB)", format="%.0f",
+                                                 help="Highest resident memory of the server process since it "
+                                                      "started, as of this stage; not specific to the stage"),
+}
+
+days = st.slider("Look back (days)", min_value=1, max_value=90, value=30)
+
+st.markdown("## Stage percentiles")
+pct = pd.DataFrame(stage_percentiles(settings["DB_PATH"], since_days=days))
+if len(pct) == 0:
+    st.info("No timings recorded yet. Run an analysis from Upload & Analyze.")
+    st.stop()
+st.dataframe(pct, use_container_width=True, hide_index=True)
+st.bar_chart(pct[pct["stage"] != "total"].set_index("stage")[["p50_ms", "p90_ms"]])
+
+st.markdown("## Slowest recent runs")
+runs = slowest_runs(settings["DB_PATH"])
+st.dataframe(pd.DataFrame(runs), use_container_width=True, hide_index=True, column_config=MEMORY_COLUMNS)
+
+if runs:
+    labels = [f"{r['run_id']} — {r['duration_ms']:,.0f} ms — bar {r['bar_id']} — {r['created_at']}" for r in runs]
+    idx = st.selectbox("Inspect run", range(len(runs)), format_func=lambda i: labels[i])
+    ev = pd.DataFrame(run_events(settings["DB_PATH"], runs[idx]["run_id"]))
+    st.dataframe(ev, use_container_width=True, hide_index=True, column_config=MEMORY_COLUMNS)
+    st.bar_chart(ev[ev["stage"] != "total"].set_index("stage")["duration_ms"])
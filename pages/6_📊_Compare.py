@@ -0,0 +1,62 @@
+import streamlit as st
+from src.utils import get_settings
+from src.auth import require_login
+from src.db import require_user
+from src.cache import cached_comparison, cached_report_list
+from src.compare import DRINK_METRICS, ITEM_METRICS
+
+settings = get_settings()
+require_login()
+user = require_user()
+
+st.title("📊 Compare")
+
+bar_id = st.session_state.get("active_bar_id")
+bar_name = st.session_state.get("active_bar_name")
+
+if not bar_id:
+    st.warning("Go to Dashboard and select/create a bar first.")
+    st.stop()
+
+st.caption(f"Active bar: **{bar_name}**")
+
+rows = cached_report_list(settings["DB_PATH"], bar_id)
+if len(rows) < 2:
+    st.info("Comparing needs at least two reports. Go to Upload & Analyze.")
+    st.stop()
+
+labels = {r["id"]: f"{r['label']} — {r['created_at']}" for r in rows}
+picked = st.multiselect("Reports to compare", list(labels), default=list(labels)[:12],
+                        format_func=labels.__getitem__, key="compare_reports")
+if len(picked) < 2:
+    st.info("Pick at least two reports.")
+    st.stop()
+
+# built from the saved report tables only, ordered by the period each report covers
+cmp = cached_comparison(settings["DB_PATH"], bar_id, tuple(picked))
+
+st.markdown("## Totals")
+st.dataframe(cmp.totals(), use_container_width=True, hide_index=True)
+
+st.markdown("## Biggest movers")
+n = len(cmp.labels)
+c_base, c_other, c_n = st.columns([3, 3, 1])
+base = c_base.selectbox("From", range(n), index=0, format_func=cmp.labels.__getitem__, key="compare_base")
+other = c_other.selectbox("To", range(n), index=n - 1, format_func=cmp.labels.__getitem__, key="compare_other")
+top_n = c_n.number_input("Rows", min_value=5, max_value=100, value=10, step=5, key="compare_n")
+
+titles = {"revenue": "Revenue", "units": "Units sold", "margin": "Margin", "shrink_cost": "Shrinkage gap cost"}
+for metric, tab in zip(DRINK_METRICS + ITEM_METRICS, st.tabs([titles[m] for m in DRINK_METRICS + ITEM_METRICS])):
+    with tab:
+        movers = cmp.movers(metric, base, other, int(top_n))
+        if len(movers) > 0:
+            st.dataframe(movers, use_container_width=True, hide_index=True)
+        else:
+            st.caption("Nothing to compare for this metric in the selected reports.")
+        if metric == "margin":
+            st.caption("Recipe-costed margins where a report has them; otherwise the approximate margin, "
+                       "which is the same for every drink of a report.")
+
+if st.toggle("All drinks and items by report", key="compare_wide"):
+    metric = st.selectbox("Metric", DRINK_METRICS + ITEM_METRICS, format_func=titles.get, key="compare_metric")
+    st.dataframe(cmp.wide(metric), use_container_width=True)
@@ -0,0 +1,81 @@
+import streamlit as st
+import pandas as pd
+from src.utils import get_settings
+from src.auth import require_login
+from src.db import require_user
+from src.cache import cached_match_candidates, invalidate_bar
+from src.matching import delete_name_mappings, load_name_mappings, save_name_mappings
+
+# suggestions at or above this score start out ticked
+PRESELECT_SCORE = 0.9
+KIND_LABELS = {"item": "Purchased items → recipe items", "drink": "Sales drinks → recipe drinks"}
+
+settings = get_settings()
+require_login()
+user = require_user()
+
+st.title("🔗 Name Matching")
+
+bar_id = st.session_state.get("active_bar_id")
+bar_name = st.session_state.get("active_bar_name")
+
+if not bar_id:
+    st.warning("Go to Dashboard and select/create a bar first.")
+    st.stop()
+
+st.caption(f"Active bar: **{bar_name}**")
+st.caption("Shrinkage and recipe costing only see names that match the recipes exactly. Confirm which POS and "
+           "invoice names mean which recipe name; confirmed mappings apply to every later run (re-run a report "
+           "from the Reports page to apply them to it).")
+
+candidates = cached_match_candidates(settings["DB_PATH"], bar_id)
+if not candidates:
+    st.info("No recipes uploaded for this bar yet. Matching compares sales and purchase names with your recipes.")
+
+for kind, tab in zip(KIND_LABELS, st.tabs(list(KIND_LABELS.values()))):
+    with tab:
+        found = candidates.get(kind, pd.DataFrame())
+        if len(found) == 0:
+            st.caption("Every name matches a recipe name or is already mapped (or nothing similar was found).")
+            continue
+        best = found[found["rank"] == 0].sort_values("score", ascending=False)
+        others = (found[found["rank"] > 0]
+                  .assign(alt=lambda d: d["candidate"] + d["score"].map(lambda v: f" ({v:.2f})"))
+                  .groupby("name")["alt"].agg(", ".join))
+        table = pd.DataFrame({
+            "confirm": (best["score"] >= PRESELECT_SCORE).to_numpy(),
+            "name": best["name"].to_numpy(),
+            "recipe_name": best["candidate"].to_numpy(),
+            "score": best["score"].to_numpy(),
+            "other_candidates": best["name"].map(others).fillna("").to_numpy(),
+        })
+        options = sorted(set(found["candidate"]))
+        edited = st.data_editor(
+            table, hide_index=True, use_container_width=True, key=f"match_{kind}",
+            disabled=["name", "score", "other_candidates"],
+            column_config={
+                "confirm": st.column_config.CheckboxColumn("Confirm"),
+                "recipe_name": st.column_config.SelectboxColumn("Recipe name", options=options, required=True),
+                "score": st.column_config.ProgressColumn("Score", min_value=0.0, max_value=1.0, format="%.2f"),
+            },
+        )
+        picked = edited[edited["confirm"]]
+        if st.button(f"Save {len(picked)} mapping(s)", key=f"save_{kind}", disabled=len(picked) == 0):
+            save_name_mappings(settings["DB_PATH"], bar_id, kind, dict(zip(picked["name"], picked["recipe_name"])))
+            invalidate_bar(bar_id)
+            st.rerun()
+
+st.markdown("## Confirmed mappings")
+mappings = load_name_mappings(settings["DB_PATH"], bar_id)
+if not mappings:
+    st.caption("None yet.")
+for kind, pairs in mappings.items():
+    st.markdown(f"**{KIND_LABELS.get(kind, kind)}**")
+    table = pd.DataFrame({"remove": False, "name": list(pairs), "recipe_name": list(pairs.values())})
+    edited = st.data_editor(table, hide_index=True, use_container_width=True, key=f"mapped_{kind}",
+                            disabled=["name", "recipe_name"])
+    drop = edited.loc[edited["remove"], "name"].tolist()
+    if drop and st.button(f"Remove {len(drop)} mapping(s)", key=f"remove_{kind}"):
+        delete_name_mappings(settings["DB_PATH"], bar_id, kind, drop)
+        invalidate_bar(bar_id)
+        st.rerun()
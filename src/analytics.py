@@ -1,14 +1,81 @@
 from __future__ import annotations
 import pandas as pd
 import numpy as np
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, Tuple
+from src.perf import span
+from src.scenarios import price_test_uplift
+from src.recipes import CompiledRecipes, compiled_recipes
+from src.cogs import COGS_METHODS, recipe_cogs
+from src.anomalies import detect_anomalies
+from src.shrinkage import period_shrinkage
+
+# assumed demand elasticity when sizing the price-test suggestion
+PRICE_TEST_ELASTICITY = -0.5
+
+_MENU_PARTIAL_AGG = dict(quantity_sold=("quantity_sold", "sum"),
+                         revenue=("revenue", "sum"),
+                         first_date=("date", "min"),
+                         last_date=("date", "max"))
+_MENU_MERGE_AGG = dict(quantity_sold=("quantity_sold", "sum"),
+                       revenue=("revenue", "sum"),
+                       first_date=("first_date", "min"),
+                       last_date=("last_date", "max"))
+
+def names(s: pd.Series) -> pd.Series:
+    """
+    Name column as a categorical. io_validate already stripped every category, so
+    validated columns pass through untouched; anything else is stripped and
+    interned here (once per distinct name, not per row).
+    """
+    if isinstance(s.dtype, pd.CategoricalDtype):
+        return s
+    codes, uniques = pd.factorize(s)
+    new_codes, categories = pd.factorize(pd.Index(uniques).astype(str).str.strip(), sort=True)
+    return pd.Series(pd.Categorical.from_codes(np.where(codes >= 0, new_codes[codes], -1), categories=categories),
+                     index=s.index, name=s.name)
+
+def map_names(s: pd.Series, mapping: Optional[Dict[str, str]]) -> pd.Series:
+    """
+    names(s) with confirmed name mappings applied (see src/matching.py): one dict lookup
+    per category, and names mapped onto the same target end up in one category.
+    """
+    s = names(s)
+    if not mapping:
+        return s
+    cats = s.cat.categories
+    mapped = pd.Index([mapping.get(c, c) for c in cats.astype(str)], dtype=object)
+    if mapped.equals(cats):
+        return s
+    new_codes, categories = pd.factorize(mapped, sort=True)
+    codes = s.cat.codes.to_numpy()
+    return pd.Series(pd.Categorical.from_codes(np.where(codes >= 0, new_codes[codes], -1), categories=categories),
+                     index=s.index, name=s.name)
+
+def shared_code_space(*cols: pd.Series) -> pd.CategoricalDtype:
+    """One sorted category set covering all given name columns, so merges between them join on integer codes."""
+    cats = pd.Index([])
+    for c in cols:
+        cats = cats.union(pd.Index(names(c).cat.categories))
+    return pd.CategoricalDtype(cats.astype(object).sort_values())
 
 def menu_summary(sales: pd.DataFrame) -> pd.DataFrame:
-    g = (sales.groupby("drink_name", as_index=False)
-         .agg(quantity_sold=("quantity_sold", "sum"),
-              revenue=("revenue", "sum"),
-              first_date=("date", "min"),
-              last_date=("date", "max")))
+    return _finish_menu(menu_partial(sales))
+
+def menu_partial(sales: pd.DataFrame) -> pd.DataFrame:
+    """Mergeable per-drink aggregate (sum / min / max) of a sales frame or chunk."""
+    return sales.groupby("drink_name", as_index=False, observed=True).agg(**_MENU_PARTIAL_AGG)
+
+def merge_menu_partials(a: Optional[pd.DataFrame], b: pd.DataFrame) -> pd.DataFrame:
+    if a is None:
+        return b
+    return (pd.concat([a, b], ignore_index=True)
+            .groupby("drink_name", as_index=False, observed=True)
+            .agg(**_MENU_MERGE_AGG))
+
+def menu_summary_from_partial(partial: pd.DataFrame) -> pd.DataFrame:
+    return _finish_menu(partial.copy())
+
+def _finish_menu(g: pd.DataFrame) -> pd.DataFrame:
     g["rev_per_unit"] = np.where(g["quantity_sold"] > 0, g["revenue"] / g["quantity_sold"], 0.0)
     g = g.sort_values("revenue", ascending=False)
     total_rev = float(g["revenue"].sum()) if len(g) else 0.0
@@ -16,21 +83,47 @@ def menu_summary(sales: pd.DataFrame) -> pd.DataFrame:
     return g
 
 def purchases_summary(purchases: pd.DataFrame) -> pd.DataFrame:
-    g = (purchases.groupby("item_name", as_index=False)
-         .agg(units_purchased=("units_purchased", "sum"),
-              unit_cost=("unit_cost", "mean"),
-              total_spend=("unit_cost", "sum")))
     # Note: unit_cost in purchases is assumed to be "cost per unit purchased" row-wise.
     # total_spend should be units_purchased * unit_cost; if user’s export already has total spend,
     # they can map accordingly — but we keep it simple.
-    g["total_spend"] = purchases["units_purchased"] * purchases["unit_cost"]
-    g = g.groupby("item_name", as_index=False).agg(
-        units_purchased=("units_purchased", "sum"),
-        avg_unit_cost=("unit_cost", "mean"),
-        total_spend=("total_spend", "sum"),
-    )
+    g = (pd.DataFrame({
+            "item_name": names(purchases["item_name"]),
+            "units_purchased": purchases["units_purchased"],
+            "unit_cost": purchases["unit_cost"],
+            "total_spend": purchases["units_purchased"] * purchases["unit_cost"],
+         })
+         .groupby("item_name", as_index=False, observed=True)
+         .agg(units_purchased=("units_purchased", "sum"),
+              avg_unit_cost=("unit_cost", "mean"),
+              total_spend=("total_spend", "sum")))
     return g.sort_values("total_spend", ascending=False)
 
+def _apply_mappings(
+    mappings: Dict[str, Dict[str, str]],
+    menu: pd.DataFrame,
+    purchases: Optional[pd.DataFrame],
+    sales_days: Optional[pd.DataFrame],
+    counts: Optional[pd.DataFrame]
+) -> Tuple[pd.DataFrame, Optional[pd.DataFrame], Optional[pd.DataFrame], Optional[pd.DataFrame]]:
+    # drink mappings rename sales names (merging drinks mapped onto one recipe), item
+    # mappings rename purchased / counted items; recipes are the reference and stay as is
+    drinks, items = mappings.get("drink"), mappings.get("item")
+    if drinks:
+        partial = menu[["drink_name", "quantity_sold", "revenue", "first_date", "last_date"]].assign(
+            drink_name=map_names(menu["drink_name"], drinks))
+        menu = _finish_menu(partial.groupby("drink_name", as_index=False, observed=True).agg(**_MENU_MERGE_AGG))
+        if sales_days is not None:
+            sales_days = sales_days.assign(drink_name=map_names(sales_days["drink_name"], drinks))
+    if items:
+        if purchases is not None:
+            purchases = purchases.assign(item_name=map_names(purchases["item_name"], items))
+        if counts is not None:
+            counts = counts.assign(item_name=map_names(counts["item_name"], items))
+    return menu, purchases, sales_days, counts
+
+def _total_spend(purchases: pd.DataFrame) -> float:
+    return float((purchases["units_purchased"] * purchases["unit_cost"]).sum()) if len(purchases) else 0.0
+
 def approximate_cogs_for_menu(sales: pd.DataFrame, purchases: pd.DataFrame) -> pd.DataFrame:
     """
     Defensible approximation:
@@ -38,8 +131,10 @@ def approximate_cogs_for_menu(sales: pd.DataFrame, purchases: pd.DataFrame) -> p
     - gives a bar owner a "directionally correct" profit leak ranking
     - clearly labeled as 'approximate' in output
     """
-    m = menu_summary(sales)
-    total_spend = float((purchases["units_purchased"] * purchases["unit_cost"]).sum()) if len(purchases) else 0.0
+    return _approx_cogs_from_menu(menu_summary(sales), _total_spend(purchases))
+
+def _approx_cogs_from_menu(menu: pd.DataFrame, total_spend: float) -> pd.DataFrame:
+    m = menu.copy()
     m["approx_cogs_allocated"] = m["revenue_share"] * total_spend
     m["approx_gross_profit"] = m["revenue"] - m["approx_cogs_allocated"]
     m["approx_margin"] = np.where(m["revenue"] > 0, m["approx_gross_profit"] / m["revenue"], 0.0)
@@ -58,26 +153,56 @@ def shrinkage_estimate(
     """
     if recipes is None or len(recipes) == 0:
         return None
-    # normalize names
-    sales2 = sales.copy()
-    sales2["drink_name"] = sales2["drink_name"].astype(str).str.strip()
-    recipes2 = recipes.copy()
-    recipes2["drink_name"] = recipes2["drink_name"].astype(str).str.strip()
-    recipes2["item_name"] = recipes2["item_name"].astype(str).str.strip()
-    purchases2 = purchases.copy()
-    purchases2["item_name"] = purchases2["item_name"].astype(str).str.strip()
-
     # total drinks sold per drink_name
-    sold = sales2.groupby("drink_name", as_index=False).agg(qty=("quantity_sold", "sum"))
-    # join to recipes to get ml used per item
-    use = sold.merge(recipes2, on="drink_name", how="inner")
-    use["ml_expected"] = use["qty"] * use["ml_per_drink"]
-    use_item = use.groupby("item_name", as_index=False).agg(ml_expected=("ml_expected", "sum"))
+    sold = (sales.groupby(names(sales["drink_name"]), observed=True)
+            .agg(qty=("quantity_sold", "sum"))
+            .reset_index())
+    return shrinkage_from_aggregates(sold, _purchases_by_item(purchases), recipes, ml_per_unit_purchased_default)
+
+def _purchases_by_item(purchases: pd.DataFrame) -> pd.DataFrame:
+    return (purchases.groupby(names(purchases["item_name"]), observed=True)
+            .agg(units_purchased=("units_purchased", "sum"),
+                 avg_unit_cost=("unit_cost", "mean"))
+            .reset_index())
+
+def _sold_from_menu(menu: pd.DataFrame) -> pd.DataFrame:
+    # menu is already one row per drink; regrouping only matters if stripping merges names
+    return (menu.groupby(names(menu["drink_name"]), observed=True)
+            .agg(qty=("quantity_sold", "sum"))
+            .reset_index())
+
+def _compiled(recipes: pd.DataFrame) -> CompiledRecipes:
+    return compiled_recipes(pd.DataFrame({
+        "drink_name": names(recipes["drink_name"]),
+        "item_name": names(recipes["item_name"]),
+        "ml_per_drink": recipes["ml_per_drink"],
+    }))
+
+def shrinkage_from_aggregates(
+    sold: pd.DataFrame,
+    purch: pd.DataFrame,
+    recipes: pd.DataFrame,
+    ml_per_unit_purchased_default: float
+) -> pd.DataFrame:
+    """
+    Shrinkage from pre-aggregated inputs: sold has drink_name, qty; purch has
+    item_name, units_purchased, avg_unit_cost (one row per name). Sub-recipes in
+    recipes are expanded down to purchased items (see src/recipes.py).
+    """
+    # expected ml per item: one sparse mat-vec of the compiled recipe matrix over qty sold
+    use_item = _compiled(recipes).expected_usage(names(sold["drink_name"]), sold["qty"])
+
+    # intern item names into one code space so the purchases merge joins on codes
+    items = shared_code_space(use_item["item_name"], purch["item_name"])
+    use_item["item_name"] = names(use_item["item_name"]).astype(items)
 
     # purchased ml available
-    purch = purchases2.groupby("item_name", as_index=False).agg(units_purchased=("units_purchased", "sum"),
-                                                                avg_unit_cost=("unit_cost", "mean"))
-    purch["ml_purchased"] = purch["units_purchased"] * float(ml_per_unit_purchased_default)
+    purch = pd.DataFrame({
+        "item_name": names(purch["item_name"]).astype(items),
+        "units_purchased": purch["units_purchased"],
+        "avg_unit_cost": purch["avg_unit_cost"],
+        "ml_purchased": purch["units_purchased"] * float(ml_per_unit_purchased_default),
+    })
 
     out = use_item.merge(purch, on="item_name", how="left")
     out["ml_purchased"] = out["ml_purchased"].fillna(0.0)
@@ -98,26 +223,112 @@ def build_report(
     sales: pd.DataFrame,
     purchases: Optional[pd.DataFrame] = None,
     recipes: Optional[pd.DataFrame] = None,
-    ml_per_unit_purchased_default: float = 750.0
+    ml_per_unit_purchased_default: float = 750.0,
+    records: bool = True,
+    cogs_method: str = "approx",
+    counts: Optional[pd.DataFrame] = None,
+    mappings: Optional[Dict[str, Dict[str, str]]] = None,
+    daily_anomalies: bool = False,
+    weekly_shrinkage: bool = False
 ) -> Dict[str, Any]:
-    report: Dict[str, Any] = {}
-    menu = menu_summary(sales)
-    report["menu_summary"] = menu.to_dict(orient="records")
+    # Fused engine: each groupby runs once and the per-drink / per-item frames are
+    # shared across the menu, COGS, shrinkage and action stages. Frames stay columnar
+    # until the final to_dict step.
+    with span("menu_summary", rows=len(sales)):
+        menu = menu_summary(sales)
+    return build_report_from_menu(menu, purchases, recipes, ml_per_unit_purchased_default, records,
+                                  sales_days=sales, cogs_method=cogs_method, counts=counts, mappings=mappings,
+                                  daily_anomalies=daily_anomalies, weekly_shrinkage=weekly_shrinkage)
 
-    # core top-line metrics
-    report["kpis"] = {
+def build_report_from_menu(
+    menu: pd.DataFrame,
+    purchases: Optional[pd.DataFrame] = None,
+    recipes: Optional[pd.DataFrame] = None,
+    ml_per_unit_purchased_default: float = 750.0,
+    records: bool = True,
+    sales_days: Optional[pd.DataFrame] = None,
+    cogs_method: str = "approx",
+    counts: Optional[pd.DataFrame] = None,
+    mappings: Optional[Dict[str, Dict[str, str]]] = None,
+    daily_anomalies: bool = False,
+    weekly_shrinkage: bool = False
+) -> Dict[str, Any]:
+    """
+    Same as build_report, starting from a finished menu summary (e.g. a streamed one).
+    With records=False the table sections are left as DataFrames (for report_codec).
+    cogs_method "fifo" / "average" adds recipe-based COGS (src/cogs.py), which needs
+    sales_days (sales rows or a sales_day_rollup) besides purchases and recipes.
+    With sales_days, daily_anomalies adds the daily anomaly screen (src/anomalies.py)
+    and weekly_shrinkage, with purchases and recipes, the week-by-week shrinkage
+    (src/shrinkage.py); inventory counts are reconciled there, so giving counts turns
+    weekly_shrinkage on. Both are off by default: they are the costly sections. mappings (kind -> {name: recipe name}, see
+    src/matching.py) renames sales drinks and purchased / counted items first.
+    """
+    if cogs_method != "approx" and cogs_method not in COGS_METHODS:
+        raise ValueError(f"Unknown COGS method {cogs_method!r}")
+    if mappings:
+        with span("apply_name_mappings", rows=len(menu)):
+            menu, purchases, sales_days, counts = _apply_mappings(mappings, menu, purchases, sales_days, counts)
+    has_purchases = purchases is not None and len(purchases) > 0
+    has_recipes = recipes is not None and len(recipes) > 0
+    precise = cogs_method in COGS_METHODS and has_purchases and has_recipes and sales_days is not None
+
+    kpis: Dict[str, Any] = {
         "total_revenue": float(menu["revenue"].sum()),
         "total_units": float(menu["quantity_sold"].sum()),
         "unique_drinks": int(menu["drink_name"].nunique()),
-        "date_min": str(sales["date"].min().date()) if len(sales) else None,
-        "date_max": str(sales["date"].max().date()) if len(sales) else None,
+        "date_min": str(menu["first_date"].min().date()) if len(menu) else None,
+        "date_max": str(menu["last_date"].max().date()) if len(menu) else None,
     }
 
-    if purchases is not None and len(purchases) > 0:
-        total_spend = float((purchases["units_purchased"] * purchases["unit_cost"]).sum())
-        report["kpis"]["total_purchases_spend"] = total_spend
-        approx = approximate_cogs_for_menu(sales, purchases)
-        report["menu_profit_approx"] = approx.to_dict(orient="records")
+    approx = None
+    shrink = None
+    if has_purchases:
+        total_spend = _total_spend(purchases)
+        kpis["total_purchases_spend"] = total_spend
+        with span("approximate_cogs_for_menu", rows=len(menu)):
+            approx = _approx_cogs_from_menu(menu, total_spend)
+        if has_recipes:
+            with span("shrinkage_estimate", rows=len(purchases)):
+                shrink = shrinkage_from_aggregates(_sold_from_menu(menu), _purchases_by_item(purchases),
+                                                   recipes, ml_per_unit_purchased_default)
+    anomalies = None
+    if sales_days is not None and daily_anomalies:
+        with span("detect_anomalies", rows=len(sales_days)):
+            anomalies = detect_anomalies(sales_days, _compiled(recipes) if has_recipes else None)
+        kpis["anomaly_count"] = len(anomalies)
+
+    periods = None
+    if has_purchases and has_recipes and sales_days is not None and (weekly_shrinkage or counts is not None):
+        with span("period_shrinkage", rows=len(sales_days)):
+            periods = period_shrinkage(sales_days, purchases, _compiled(recipes), counts, ml_per_unit_purchased_default)
+        if counts is not None and len(periods) and periods["counts"].sum() > 0:
+            kpis["counted_shrink_ml"] = float(periods["ml_shrink"].sum())
+            kpis["counted_shrink_cost"] = float(periods["est_cost_of_shrink"].sum())
+
+    true_cogs = None
+    if precise:
+        with span("recipe_cogs", rows=len(sales_days)):
+            true_cogs = recipe_cogs(sales_days, purchases, _compiled(recipes), ml_per_unit_purchased_default, cogs_method)
+        kpis["total_recipe_cogs"] = float(true_cogs["recipe_cogs"].sum())
+        kpis["recipe_gross_profit"] = kpis["total_revenue"] - kpis["total_recipe_cogs"]
+
+    report: Dict[str, Any] = {}
+    if records:
+        with span("report_records"):
+            report["menu_summary"] = menu.to_dict(orient="records")
+            approx_records = approx.to_dict(orient="records") if approx is not None else None
+            shrink_records = shrink.to_dict(orient="records") if shrink is not None else None
+            cogs_records = true_cogs.to_dict(orient="records") if true_cogs is not None else None
+            anomaly_records = anomalies.to_dict(orient="records") if anomalies is not None else None
+            period_records = periods.to_dict(orient="records") if periods is not None else None
+    else:
+        report["menu_summary"], approx_records, shrink_records = menu, approx, shrink
+        cogs_records, anomaly_records, period_records = true_cogs, anomalies, periods
+    # core top-line metrics
+    report["kpis"] = kpis
+    if approx is not None:
+        report["menu_profit_approx"] = approx_records
         report["method_notes"] = {
             "cogs_method": "Approximate allocation of total purchases spend to drinks proportional to revenue share. Directional, not exact."
         }
@@ -126,33 +337,65 @@ def build_report(
             "cogs_method": "Purchases not provided. Profit/leak estimates limited to revenue-side insights until purchases are uploaded."
         }
 
-    if purchases is not None and recipes is not None and len(purchases) > 0 and len(recipes) > 0:
-        shrink = shrinkage_estimate(sales, purchases, recipes, ml_per_unit_purchased_default)
-        report["shrinkage"] = shrink.to_dict(orient="records") if shrink is not None else []
+    if true_cogs is not None:
+        report["menu_profit_recipe"] = cogs_records
+        basis = {"fifo": "FIFO cost layers (oldest purchases consumed first)",
+                 "average": "the weighted average cost of purchases made up to the day of sale"}[cogs_method]
+        report["method_notes"]["recipe_cogs_method"] = (
+            f"Each drink costed through its recipe at {basis}, using {ml_per_unit_purchased_default:g}ml per "
+            "purchased unit. No opening inventory: sales before the first purchase of an item use its first cost. "
+            "Items never purchased are uncosted (see costed_share)."
+        )
+
+    if has_purchases and has_recipes:
+        report["shrinkage"] = shrink_records
         report["method_notes"]["shrinkage_method"] = "Expected usage computed from recipes (ml per drink) vs purchased volume (default 750ml/bottle). Starting/ending inventory not included unless you model it separately."
+        if periods is not None:
+            report["shrinkage_periods"] = period_records
+            report["method_notes"]["shrinkage_periods_method"] = (
+                "Week by week (Monday to Sunday) per recipe item: expected usage vs purchases and the running gap. "
+                "With inventory counts (stock at close of the count date), shrink = previous count + purchases - "
+                "expected usage - this count, booked to the week of the later count; positive means stock went missing. "
+                "Costed at the latest purchase cost."
+            )
     else:
-        report.setdefault("method_notes", {})
         report["method_notes"]["shrinkage_method"] = "Recipes and purchases required for shrinkage estimates."
 
+    if anomalies is not None:
+        report["anomalies"] = anomaly_records
+        report["method_notes"]["anomaly_method"] = (
+            "Daily units sold per drink and recipe ingredient usage compared with the median of the same weekday over "
+            "the previous 8 weeks, scaled by the typical deviation of the previous 8 weeks. Flagged: single days with "
+            "|z| >= 4.5, or several days in a row leaning the same way. revenue_excess is the drink's revenue above "
+            "(or below) that baseline. Ranked by total z over the run."
+        )
+
     # action recommendations (simple, blunt, safe)
-    report["actions"] = _suggest_actions(report)
+    report["actions"] = _suggest_actions(kpis, menu, approx, shrink)
     return report
 
-def _suggest_actions(report: Dict[str, Any]) -> Dict[str, Any]:
+def _suggest_actions(
+    kpis: Dict[str, Any],
+    menu: pd.DataFrame,
+    approx: Optional[pd.DataFrame],
+    shrink: Optional[pd.DataFrame]
+) -> Dict[str, Any]:
+    # menu is sorted by revenue desc, approx by gross profit asc and shrink by gap cost desc,
+    # so the heads below are already the rows we want.
     actions = {"top_3": []}
 
-    kpis = report.get("kpis", {})
     total_rev = float(kpis.get("total_revenue", 0.0) or 0.0)
 
-    menu = pd.DataFrame(report.get("menu_summary", []))
     if len(menu) > 0 and total_rev > 0:
-        top_share = menu.sort_values("revenue", ascending=False).head(5)
-        share = float(top_share["revenue"].sum() / total_rev)
+        share = float(menu["revenue"].head(5).sum() / total_rev)
         if share > 0.60:
+            low, high = price_test_uplift(menu, 2, (0.5, 1.0), PRICE_TEST_ELASTICITY)
             actions["top_3"].append({
                 "title": "Revenue concentration is high",
                 "why": f"Top 5 drinks drive ~{share:.0%} of revenue. A price tweak here moves the needle.",
-                "do_this": "Test +$0.50 to +$1 on your top 1–2 sellers (track volume change for 2 weeks)."
+                "do_this": f"Test +$0.50 to +$1 on your top 1–2 sellers (track volume change for 2 weeks). "
+                           f"At a typical elasticity ({PRICE_TEST_ELASTICITY}) that is worth ~${low:,.0f} to "
+                           f"~${high:,.0f} in revenue over this period."
             })
         else:
             actions["top_3"].append({
@@ -161,16 +404,13 @@ def _suggest_actions(report: Dict[str, Any]) -> Dict[str, Any]:
                 "do_this": "During peak hours, feature a smaller set of high-velocity drinks to increase throughput."
             })
 
-    approx = pd.DataFrame(report.get("menu_profit_approx", []))
-    if len(approx) > 0:
-        worst = approx.sort_values("approx_gross_profit", ascending=True).head(3)
-        if len(worst) > 0:
-            names = ", ".join(worst["drink_name"].astype(str).tolist()[:2])
-            actions["top_3"].append({
-                "title": "Bottom performers to investigate",
-                "why": f"These drinks look weakest on an approximate profit basis: {names}.",
-                "do_this": "Either raise price, simplify recipe, or stop pushing these."
-            })
+    if approx is not None and len(approx) > 0:
+        top_names = ", ".join(approx["drink_name"].head(2).astype(str).tolist())
+        actions["top_3"].append({
+            "title": "Bottom performers to investigate",
+            "why": f"These drinks look weakest on an approximate profit basis: {top_names}.",
+            "do_this": "Either raise price, simplify recipe, or stop pushing these."
+        })
     else:
         actions["top_3"].append({
             "title": "Upload purchases to unlock profit leaks",
@@ -178,17 +418,14 @@ def _suggest_actions(report: Dict[str, Any]) -> Dict[str, Any]:
             "do_this": "Export last 30–90 days of invoice/purchase history and re-run."
         })
 
-    shrink = pd.DataFrame(report.get("shrinkage", []))
-    if len(shrink) > 0:
-        top = shrink.sort_values("est_cost_of_gap", ascending=False).head(1)
-        if len(top) > 0:
-            item = str(top.iloc[0]["item_name"])
-            cost = float(top.iloc[0]["est_cost_of_gap"])
-            actions["top_3"].append({
-                "title": "Possible shrinkage hotspot",
-                "why": f"{item} shows the largest expected-vs-purchased gap (est. cost impact ~${cost:,.0f}).",
-                "do_this": "Reconfirm pour spec + training; spot-check counts weekly for 2 weeks."
-            })
+    if shrink is not None and len(shrink) > 0:
+        item = str(shrink["item_name"].iloc[0])
+        cost = float(shrink["est_cost_of_gap"].iloc[0])
+        actions["top_3"].append({
+            "title": "Possible shrinkage hotspot",
+            "why": f"{item} shows the largest expected-vs-purchased gap (est. cost impact ~${cost:,.0f}).",
+            "do_this": "Reconfirm pour spec + training; spot-check counts weekly for 2 weeks."
+        })
     else:
         actions["top_3"].append({
             "title": "Optional: enable shrinkage detection",
@@ -198,4 +435,3 @@ def _suggest_actions(report: Dict[str, Any]) -> Dict[str, Any]:
 
     actions["top_3"] = actions["top_3"][:3]
     return actions
-
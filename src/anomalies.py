@@ -0,0 +1,306 @@
+from __future__ import annotations
+from functools import lru_cache
+from typing import List, Optional, Tuple
+import numpy as np
+import pandas as pd
+from src.io_validate import day_floor
+from src.recipes import CompiledRecipes
+
+# Daily-series anomaly detection: spikes and drops that whole-period totals hide.
+#
+# Every series (units sold per drink, expected usage per item through recipes) is laid
+# out as one column of a dense days x series matrix, so the statistics run over the whole
+# matrix at once instead of once per drink. Values are first put through the Anscombe
+# transform (stabilize), which gives counts the same noise at 2 a night as at 200; item
+# usage is counted in servings of that item for this. Bars are weekly businesses, so each
+# day is compared with the same weekday of the previous ANOMALY_WEEKS weeks:
+#   med    median of those days
+#   scale  1.2533 * mean |x - med| over the ANOMALY_POOL_DAYS before the day, pooled
+#          across weekdays (eight samples per weekday are far too few for a spread; their
+#          MAD is often ~0), never below MIN_SCALE
+#   z      (x - med) / scale
+# A day is flagged when |z| >= ANOMALY_Z, or when it leans the same way (|z| >= 1) inside
+# a SUSTAIN_DAYS window whose combined z, sum(z) / sqrt(k), reaches ANOMALY_Z; the second
+# rule catches several quietly bad nights in a row (a voided-sales pattern) that no
+# single day would. ANOMALY_Z is set for the number of series-days screened, not one
+# test: on pure Poisson noise z is ~N(0, 1) and the flag rate is a few per 100,000
+# series-days (benchmarks/check_anomaly_noise.py). Consecutive flagged days of one series
+# and direction form one anomaly; for drinks the revenue above / below the units'
+# baseline comes along as context. Days before a series' first sale are left out, so a
+# launch isn't a spike. Purchases aren't a series here: deliveries are lumpy at day grain
+# and every delivery would look like a spike.
+
+ANOMALY_PERIOD = 7
+ANOMALY_WEEKS = 8
+ANOMALY_MIN_WEEKS = 4
+ANOMALY_Z = 4.5
+SUSTAIN_DAYS = 7
+ANOMALY_POOL_DAYS = 56
+ANOMALY_MAX_SERIES = 5000   # busiest series kept per metric, bounds the matrix size
+ANOMALY_BLOCK_CELLS = 4_000_000   # drinks x items of the recipe matrix built at a time
+ANOMALY_MAX_ROWS = 200
+# never read less noise than Poisson counts have (sigma 1 after stabilize)
+MIN_SCALE = 1.0
+
+def _from_start(mat: np.ndarray) -> np.ndarray:
+    """NaN before each column's first non-zero day."""
+    started = np.maximum.accumulate(mat != 0, axis=0)
+    return np.where(started, mat, np.nan)
+
+def day_matrix(day: np.ndarray, series: np.ndarray, values: np.ndarray, n_days: int, n_series: int) -> np.ndarray:
+    """(n_days, n_series) daily sums, NaN before each series' first non-zero day."""
+    mat = np.bincount(day * n_series + series, weights=values, minlength=n_days * n_series)
+    return _from_start(mat.reshape(n_days, n_series))
+
+def item_day_usage(day: np.ndarray, drink_idx: np.ndarray, qty: np.ndarray, n_days: int,
+                   compiled: CompiledRecipes) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    (days, items) expected ml through recipes, the item ids of its columns and drinks sold
+    per item. drink_idx: row of compiled per sale, -1 without a recipe. Drinks are summed
+    per day first, so usage is a (days, drinks) x (drinks, items) product, taken a block
+    of items at a time.
+    """
+    sold = drink_idx >= 0
+    d_codes, d_ids = pd.factorize(drink_idx[sold])
+    n = len(d_ids)
+    dq = np.bincount(day[sold] * n + d_codes, weights=qty[sold], minlength=n_days * n).reshape(n_days, n)
+    # recipe rows of the drinks sold, columns renumbered to the items they use
+    pos = np.full(len(compiled.drinks), -1)
+    pos[d_ids] = np.arange(n)
+    r = pos[compiled.rows]
+    use = r >= 0
+    i_codes, i_ids = pd.factorize(compiled.cols[use], sort=True)
+    r, ml = r[use], compiled.ml[use]
+    m = len(i_ids)
+    usage = np.empty((n_days, m))
+    served = np.bincount(i_codes, weights=dq.sum(axis=0)[r], minlength=m)
+    block = max(1, ANOMALY_BLOCK_CELLS // max(n, 1))
+    for lo in range(0, m, block):
+        at = (i_codes >= lo) & (i_codes < lo + block)
+        width = min(block, m - lo)
+        recipe = np.zeros((n, width))
+        np.add.at(recipe, (r[at], i_codes[at] - lo), ml[at])
+        usage[:, lo:lo + width] = dq @ recipe
+    return usage, np.asarray(i_ids), served
+
+@lru_cache(maxsize=None)
+def _network(n: int) -> Tuple[Tuple[int, int], ...]:
+    """Batcher odd-even merge sorting network for n inputs (19 comparators for 8)."""
+    pairs = []
+    p = 1
+    while p < n:
+        k = p
+        while k >= 1:
+            for j in range(k % p, n - k, 2 * k):
+                for i in range(min(k, n - j - k)):
+                    if (i + j) // (2 * p) == (i + j + k) // (2 * p):
+                        pairs.append((i + j, i + j + k))
+            k //= 2
+        p *= 2
+    return tuple(pairs)
+
+def _sort_planes(planes: List[np.ndarray]) -> None:
+    """
+    Sort a list of equal-shape arrays elementwise, in place: every compare-exchange of
+    the network is one minimum/maximum over the whole matrix.
+    """
+    for i, j in _network(len(planes)):
+        lo = np.minimum(planes[i], planes[j])
+        np.maximum(planes[i], planes[j], out=planes[j])
+        planes[i] = lo
+
+def _median_planes(planes: List[np.ndarray], n: np.ndarray, min_n: int = 1) -> np.ndarray:
+    """Median of sorted planes (missing values sorted last as +inf); n = values present, NaN below min_n."""
+    w = len(planes)
+    med = (planes[(w - 1) // 2] + planes[w // 2]) / 2
+    # cells with missing history (a series' first weeks) take the middle of what they have
+    for k in range(max(min_n, 1), w):
+        at = n == k
+        med[at] = (planes[(k - 1) // 2][at] + planes[k // 2][at]) / 2
+    med[n < min_n] = np.nan
+    return med
+
+def stabilize(mat: np.ndarray, unit: np.ndarray | float = 1.0) -> np.ndarray:
+    """Anscombe transform 2 * sqrt(x / unit + 3/8): counts of servings get a noise sigma of ~1 at any volume."""
+    return 2 * np.sqrt(np.maximum(mat / unit, 0) + 0.375)
+
+def unstabilize(y: np.ndarray, unit: np.ndarray | float = 1.0) -> np.ndarray:
+    return np.maximum((y / 2) ** 2 - 0.375, 0) * unit
+
+def count_unit(mat: np.ndarray, base: np.ndarray | float = 1.0, period: int = ANOMALY_PERIOD) -> np.ndarray:
+    """
+    Per column, what one "count" of the series is: its variance-to-mean ratio (variance
+    from same-weekday differences, so the weekly pattern doesn't count as noise), at
+    least base. Sales that come in rounds of several units are counted in rounds.
+    """
+    if mat.shape[0] <= period:
+        return np.broadcast_to(np.asarray(base, dtype=float), mat.shape[1:]).copy()
+    diff = mat[period:] - mat[:-period]
+    known = np.isfinite(diff)
+    var = np.where(known, diff * diff, 0).sum(axis=0) / np.maximum(2 * known.sum(axis=0), 1)
+    present = np.isfinite(mat)
+    mean = np.where(present, mat, 0).sum(axis=0) / np.maximum(present.sum(axis=0), 1)
+    ratio = np.divide(var, mean, out=np.zeros_like(var), where=mean > 0)
+    return np.fmax(ratio, base)
+
+def robust_z(mat: np.ndarray, min_scale: float = MIN_SCALE, period: int = ANOMALY_PERIOD, weeks: int = ANOMALY_WEEKS,
+             min_weeks: int = ANOMALY_MIN_WEEKS, pool_days: int = ANOMALY_POOL_DAYS) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    (z, baseline median) for every column of a (days, series) matrix of stabilized values.
+    Each day's baseline is the same day of the cycle over the previous `weeks` cycles (NaN
+    until min_weeks of them exist); its scale is pooled over the residuals of the previous
+    pool_days days (NaN until two cycles of them exist).
+    """
+    n_days = mat.shape[0]
+    # one (days, series) plane per lag, float32 (plenty for a z-score, half the memory
+    # traffic); missing history is +inf so it sorts last
+    x = np.where(np.isnan(mat), np.inf, mat).astype(np.float32)
+    planes = []
+    n = np.zeros(x.shape, dtype=np.uint8)
+    for j in range(1, weeks + 1):
+        p = np.empty_like(x)
+        p[:min(j * period, n_days)] = np.inf
+        p[j * period:] = x[:max(n_days - j * period, 0)]
+        n += np.isfinite(p)
+        planes.append(p)
+    _sort_planes(planes)
+    med = _median_planes(planes, n, min_weeks)
+    resid = x - med   # inf - NaN / inf - finite: not a usable day either way
+    # 1.2533 * mean |residual| over the window before each day: residuals already carry the
+    # baseline's own noise, so z comes out with unit spread, and today can't mute itself
+    known = np.isfinite(resid)
+    resid[~known] = np.nan
+    c_abs = np.zeros((n_days + 1, x.shape[1]), dtype=np.float32)
+    c_n = np.zeros((n_days + 1, x.shape[1]), dtype=np.float32)
+    np.cumsum(np.where(known, np.abs(resid), 0), axis=0, out=c_abs[1:])
+    np.cumsum(known, axis=0, out=c_n[1:])
+    lo = np.maximum(np.arange(n_days) - pool_days, 0)
+    count = c_n[:-1] - c_n[lo]
+    scale = 1.2533 * (c_abs[:-1] - c_abs[lo]) / np.maximum(count, 1)
+    scale[count < 2 * period] = np.nan
+    return resid / np.maximum(scale, min_scale), med
+
+def flag_days(z: np.ndarray, threshold: float = ANOMALY_Z, k: int = SUSTAIN_DAYS) -> np.ndarray:
+    """Single-day |z| >= threshold, plus same-signed days inside a k-day window whose sum(z)/sqrt(k) does."""
+    z0 = np.nan_to_num(z).astype(np.float32)
+    hit = np.abs(z0) >= threshold
+    n_days = z0.shape[0]
+    if n_days < k:
+        return hit
+    c = np.cumsum(z0, axis=0)
+    window = c[k - 1:].copy()                 # sum of z over [t - k + 1, t]
+    window[1:] -= c[:n_days - k]
+    limit = threshold * np.sqrt(k)
+    for strong, leaning in ((window >= limit, z0 >= 1.0), (window <= -limit, z0 <= -1.0)):
+        # every day covered by a window over the limit: count windows ending in [t, t + k - 1]
+        # (only for the few series that have such a window at all)
+        cols = np.flatnonzero(strong.any(axis=0))
+        ends = np.zeros((n_days + 1, len(cols)), dtype=np.int32)
+        ends[k - 1:n_days] = strong[:, cols]
+        e = np.cumsum(ends[::-1], axis=0)[::-1]
+        covered = e[:n_days] > e[np.minimum(np.arange(n_days) + k, n_days)]
+        hit[:, cols] |= covered & leaning[:, cols]
+    return hit
+
+def _runs(kind: str, metric: str, labels: np.ndarray, days: pd.DatetimeIndex, mat: np.ndarray, z: np.ndarray,
+          expected: np.ndarray, threshold: float, revenue: Optional[np.ndarray] = None,
+          price: Optional[np.ndarray] = None) -> pd.DataFrame:
+    hit = flag_days(z, threshold)
+    d_idx, s_idx = np.nonzero(hit)
+    if len(s_idx) == 0:
+        return pd.DataFrame()
+    # series-major order so each run is contiguous
+    order = np.argsort(s_idx, kind="stable")
+    d_idx, s_idx = d_idx[order], s_idx[order]
+    sign = np.sign(z[d_idx, s_idx])
+    new = np.ones(len(s_idx), dtype=bool)
+    new[1:] = (s_idx[1:] != s_idx[:-1]) | (d_idx[1:] != d_idx[:-1] + 1) | (sign[1:] != sign[:-1])
+    first = np.flatnonzero(new)
+    days_in = np.diff(np.append(first, len(new)))
+    absz = np.abs(z[d_idx, s_idx])
+    observed = np.add.reduceat(mat[d_idx, s_idx], first)
+    exp = np.add.reduceat(expected[d_idx, s_idx], first)
+    if revenue is not None:
+        # revenue is context, not a second series: the units' baseline at the drink's average price
+        rev_excess = np.add.reduceat(revenue[d_idx, s_idx], first) - exp * price[s_idx[first]]
+    else:
+        rev_excess = np.full(len(first), np.nan)
+    return pd.DataFrame({
+        "kind": kind,
+        "name": labels[s_idx[first]],
+        "metric": metric,
+        "start": days[d_idx[first]],
+        "end": days[d_idx[first + days_in - 1]],
+        "days": days_in,
+        "direction": np.where(sign[first] > 0, "spike", "drop"),
+        "observed": observed,
+        "expected": exp,
+        "excess": observed - exp,
+        "revenue_excess": rev_excess,
+        "peak_z": np.maximum.reduceat(absz, first),
+        "score": np.add.reduceat(absz, first),
+    })
+
+def _busiest(codes: np.ndarray, weights: np.ndarray, n: int, keep: int) -> np.ndarray:
+    """Map codes to 0..k-1 for the `keep` series with the largest absolute volume, -1 for the rest."""
+    if n <= keep:
+        return codes
+    vol = np.bincount(codes, weights=np.abs(weights), minlength=n)
+    top = np.argsort(-vol, kind="stable")[:keep]
+    remap = np.full(n, -1)
+    remap[top] = np.arange(len(top))
+    return remap[codes]
+
+def detect_anomalies(
+    sales: pd.DataFrame,
+    compiled: Optional[CompiledRecipes] = None,
+    threshold: float = ANOMALY_Z,
+    max_rows: int = ANOMALY_MAX_ROWS
+) -> pd.DataFrame:
+    """
+    sales: date, drink_name, quantity_sold, revenue (raw rows or a sales_day_rollup).
+    With compiled recipes, expected item usage per day is screened too. Returns one row
+    per anomaly (kind, name, metric, start, end, days, direction, observed, expected,
+    excess, revenue_excess, peak_z, score), highest score first.
+    """
+    if len(sales) == 0:
+        return pd.DataFrame()
+    day = day_floor(sales["date"]).to_numpy()
+    d0 = day.min()
+    day_idx = (day - d0) // np.timedelta64(1, "D")
+    days = pd.date_range(d0, periods=int(day_idx.max()) + 1, freq="D")
+    codes, drinks = pd.factorize(sales["drink_name"], sort=True)
+    drinks = np.asarray(drinks.astype(str), dtype=object)
+    qty = sales["quantity_sold"].to_numpy(dtype=float)
+
+    found = []
+    keep = _busiest(codes, qty, len(drinks), ANOMALY_MAX_SERIES)
+    kept = keep >= 0
+    labels = np.empty(int(keep.max()) + 1 if kept.any() else 0, dtype=object)
+    labels[keep[kept]] = drinks[codes[kept]]
+    mat = day_matrix(day_idx[kept], keep[kept], qty[kept], len(days), len(labels))
+    unit = count_unit(mat)
+    z, med = robust_z(stabilize(mat, unit))
+    revenue = np.bincount(day_idx[kept] * len(labels) + keep[kept], weights=sales["revenue"].to_numpy(dtype=float)[kept],
+                          minlength=len(days) * len(labels)).reshape(len(days), len(labels))
+    units = np.nansum(mat, axis=0)
+    price = np.divide(revenue.sum(axis=0), units, out=np.zeros(len(labels)), where=units > 0)
+    found.append(_runs("drink", "quantity_sold", labels, days, mat, z, unstabilize(med, unit), threshold, revenue, price))
+
+    if compiled is not None and len(compiled):
+        usage, item_ids, served = item_day_usage(day_idx, compiled._drink_index(sales["drink_name"]), qty,
+                                                 len(days), compiled)
+        top = np.argsort(-np.abs(usage).sum(axis=0), kind="stable")[:ANOMALY_MAX_SERIES]
+        mat = _from_start(usage[:, top])
+        labels = np.asarray(compiled.items, dtype=object)[item_ids[top]]
+        # at least a serving (the item's average ml per drink sold) per count
+        serving = np.divide(np.nansum(mat, axis=0), served[top], out=np.ones(len(top)), where=served[top] > 0)
+        unit = count_unit(mat, np.where(serving > 0, serving, 1.0))
+        z, med = robust_z(stabilize(mat, unit))
+        found.append(_runs("item", "ml_expected", labels, days, mat, z, unstabilize(med, unit), threshold))
+
+    found = [f for f in found if len(f)]
+    if not found:
+        return pd.DataFrame()
+    out = pd.concat(found, ignore_index=True)
+    return out.sort_values("score", ascending=False, kind="stable", ignore_index=True).head(max_rows)
@@ -0,0 +1,290 @@
+"""
+Headless batch analysis: regenerate reports for many bars without the UI.
+
+    python -m src.batch --root exports/ --db app.db --data-dir data
+    python -m src.batch --manifest nightly.csv --workers 8
+
+--root expects one directory per bar, named by bar id, holding sales.csv and
+optionally purchases.csv / recipes.csv / counts.csv (inventory counts).
+--manifest is a CSV with columns bar_id, sales, purchases, recipes[, counts][, label];
+relative paths resolve against the manifest's directory. A manifest row with a bad
+bar_id or a listed file that doesn't exist fails that bar only; directories under
+--root that aren't named by a bar id are listed as skipped.
+
+Parsing and analytics run in a process pool; the parent does all database writes,
+a batch of bars per transaction. A bar that fails (bad CSV, unknown bar id, ...)
+is reported and skipped, the rest of the batch carries on. Exit status is 1 if
+any bar failed.
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+import pandas as pd
+
+from src.analytics import build_report
+from src.cogs import COGS_METHODS
+from src.db import init_db, q_all, write_ctx
+from src.facts import append_purchase_facts, append_sales_facts, sales_day_rollup
+from src.io_validate import SCHEMAS, read_validated
+from src.report_codec import encode_report
+from src.matching import load_name_mappings, name_mappings_hash
+from src.reports import save_report_kpis
+from src.daycube import build_day_cube, encode_day_cube
+from src.storage import (content_hash, day_cube_key, get_cached_report, has_day_cube, load_validated,
+                         put_cached_report, put_day_cube, report_cache_key, store_blob, store_validated)
+
+KINDS = ("sales", "purchases", "recipes", "counts")
+DEFAULT_WORKERS = max(1, (os.cpu_count() or 2) - 1)
+WRITE_BATCH_BARS = 25
+
+@dataclass
+class BarJob:
+    bar_id: Optional[int]  # None when the manifest row's bar_id isn't a number
+    label: str
+    files: Dict[str, str]  # kind -> source path; sales is required
+    error: str = ""        # set for rows rejected before analysis
+
+@dataclass
+class BarResult:
+    bar_id: Optional[int]
+    label: str
+    paths: Dict[str, Optional[str]] = field(default_factory=dict)
+    hashes: Dict[str, Optional[str]] = field(default_factory=dict)
+    cache_key: str = ""
+    report_json: str = ""
+    report_blob: Optional[bytes] = None
+    cached: bool = False
+    cube_key: str = ""
+    cube_blob: Optional[bytes] = None   # only when the store has no cube for these files yet
+    sales_days: Optional[pd.DataFrame] = None
+    purchases: Optional[pd.DataFrame] = None
+    rows: int = 0
+    seconds: float = 0.0
+    error: str = ""
+
+def jobs_from_root(root: str, label: str) -> Tuple[List[BarJob], List[str]]:
+    """Returns (jobs, skipped directory names)."""
+    jobs, skipped = [], []
+    for name in sorted(os.listdir(root)):
+        d = os.path.join(root, name)
+        if not os.path.isdir(d):
+            continue
+        if not name.isdigit():
+            skipped.append(name)
+            continue
+        files = {k: os.path.join(d, f"{k}.csv") for k in KINDS if os.path.exists(os.path.join(d, f"{k}.csv"))}
+        jobs.append(BarJob(int(name), label, files))
+    return jobs, skipped
+
+def jobs_from_manifest(path: str, label: str) -> List[BarJob]:
+    """One job per row; rows that can't run come back with error set."""
+    base = os.path.dirname(os.path.abspath(path))
+    m = pd.read_csv(path, dtype=str, keep_default_na=False)
+    m.columns = [str(c).strip().lower() for c in m.columns]
+    if "bar_id" not in m.columns or "sales" not in m.columns:
+        raise ValueError("Manifest needs at least bar_id and sales columns.")
+    jobs = []
+    for line, r in enumerate(m.to_dict(orient="records"), start=2):   # line 1 is the header
+        files = {k: os.path.join(base, r[k].strip()) for k in KINDS if r.get(k, "").strip()}
+        raw = r["bar_id"].strip()
+        job = BarJob(int(raw) if raw.isdigit() else None, r.get("label", "").strip() or label, files)
+        missing = [k for k, f in files.items() if not os.path.isfile(f)]
+        if job.bar_id is None:
+            job.error = f"manifest line {line}: bar_id {raw!r} is not a bar id"
+        elif "sales" not in files:
+            job.error = f"manifest line {line}: no sales file"
+        elif missing:
+            job.error = f"manifest line {line}: " + ", ".join(f"{k} file not found: {files[k]}" for k in missing)
+        jobs.append(job)
+    return jobs
+
+def analyze_bar(job: BarJob, db_path: str, data_dir: str, ml: float, cogs_method: str = "approx",
+                daily_anomalies: bool = False, weekly_shrinkage: bool = False) -> BarResult:
+    """Worker side: store the files, parse + validate, build the report. No DB writes."""
+    t0 = time.perf_counter()
+    res = BarResult(job.bar_id, job.label)
+    try:
+        if "sales" not in job.files:
+            raise ValueError("no sales CSV")
+        for kind in KINDS:
+            src = job.files.get(kind)
+            if src is None:
+                res.paths[kind] = res.hashes[kind] = None
+                continue
+            with open(src, "rb") as f:
+                data = f.read()
+            res.hashes[kind] = content_hash(data)
+            res.paths[kind] = store_blob(data_dir, res.hashes[kind], data)
+
+        mappings = load_name_mappings(db_path, job.bar_id)
+        res.cache_key = report_cache_key(res.hashes["sales"], res.hashes["purchases"], res.hashes["recipes"], ml,
+                                         cogs_method, res.hashes["counts"], name_mappings_hash(mappings),
+                                         daily_anomalies, weekly_shrinkage)
+        res.cube_key = day_cube_key(res.hashes["sales"], res.hashes["purchases"])
+        cached = get_cached_report(db_path, res.cache_key)
+        need_cube = not has_day_cube(db_path, res.cube_key)
+        if cached is not None:
+            (res.report_json, res.report_blob), res.cached = cached, True
+
+        frames = {}
+        for kind in KINDS:
+            if res.paths[kind] is None:
+                frames[kind] = None
+                continue
+            df = load_validated(res.paths[kind], kind, list(SCHEMAS[kind]))
+            if df is None:
+                df, err = read_validated(res.paths[kind], kind)
+                if err:
+                    raise ValueError(f"{kind}: {err}")
+                store_validated(res.paths[kind], kind, df)
+            frames[kind] = df
+        res.rows = len(frames["sales"])
+        sales_days = sales_day_rollup(frames["sales"])
+        if need_cube:
+            res.cube_blob = encode_day_cube(build_day_cube(sales_days, frames["purchases"]))
+        # facts are per bar, so they're appended even when the report comes from the cache
+        res.sales_days, res.purchases = sales_days, frames["purchases"]
+        if not res.cached:
+            report = build_report(frames["sales"], frames["purchases"], frames["recipes"],
+                                  ml_per_unit_purchased_default=ml, records=False, cogs_method=cogs_method,
+                                  counts=frames["counts"], mappings=mappings, daily_anomalies=daily_anomalies,
+                                  weekly_shrinkage=weekly_shrinkage)
+            res.report_json, res.report_blob = encode_report(report)
+    except Exception as e:
+        res.error = f"{type(e).__name__}: {e}"
+    finally:
+        res.seconds = time.perf_counter() - t0
+    return res
+
+def _save(conn, db_path: str, r: BarResult) -> None:
+    cur = conn.execute(
+        "INSERT INTO uploads (bar_id, label, sales_path, purchases_path, recipes_path, counts_path, "
+        "sales_hash, purchases_hash, recipes_hash, counts_hash) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        (r.bar_id, r.label, r.paths["sales"], r.paths["purchases"], r.paths["recipes"], r.paths["counts"],
+         r.hashes["sales"], r.hashes["purchases"], r.hashes["recipes"], r.hashes["counts"]),
+    )
+    upload_id = int(cur.lastrowid)
+    append_sales_facts(db_path, r.bar_id, upload_id, r.sales_days)
+    if r.purchases is not None:
+        append_purchase_facts(db_path, r.bar_id, upload_id, r.purchases)
+    if not r.cached:
+        put_cached_report(db_path, r.cache_key, r.report_json, r.report_blob)
+    if r.cube_blob is not None:
+        put_day_cube(db_path, r.cube_key, r.cube_blob)
+    report_id = int(conn.execute(
+        "INSERT INTO reports (bar_id, upload_id, label, report_json, report_blob) VALUES (?, ?, ?, ?, ?)",
+        (r.bar_id, upload_id, r.label, r.report_json, r.report_blob),
+    ).lastrowid)
+    save_report_kpis(conn, report_id, r.bar_id, r.report_json, r.report_blob)
+
+def save_results(db_path: str, results: List[BarResult]) -> List[BarResult]:
+    """Write a batch in one transaction; if that fails, retry bar by bar. Returns the bars that failed."""
+    try:
+        with write_ctx(db_path) as conn:
+            for r in results:
+                _save(conn, db_path, r)
+        return []
+    except Exception:
+        failed = []
+        for r in results:
+            try:
+                with write_ctx(db_path) as conn:
+                    _save(conn, db_path, r)
+            except Exception as e:
+                r.error = f"save failed: {type(e).__name__}: {e}"
+                failed.append(r)
+        return failed
+
+def run_batch(
+    db_path: str,
+    data_dir: str,
+    jobs: List[BarJob],
+    workers: int = DEFAULT_WORKERS,
+    ml: float = 750.0,
+    write_batch: int = WRITE_BATCH_BARS,
+    cogs_method: str = "approx",
+    daily_anomalies: bool = False,
+    weekly_shrinkage: bool = False,
+) -> Tuple[List[BarResult], List[BarResult]]:
+    """Returns (saved, failed)."""
+    init_db(db_path)
+    known = {r["id"] for r in q_all(db_path, "SELECT id FROM bars")}
+    saved: List[BarResult] = []
+    failed = [BarResult(j.bar_id, j.label, error=j.error or "unknown bar id")
+              for j in jobs if j.error or j.bar_id not in known]
+    todo = [j for j in jobs if not j.error and j.bar_id in known]
+
+    pending: List[BarResult] = []
+    def flush() -> None:
+        bad = save_results(db_path, pending)
+        failed.extend(bad)
+        bad_ids = {id(r) for r in bad}
+        saved.extend(r for r in pending if id(r) not in bad_ids)
+        pending.clear()
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(analyze_bar, j, db_path, data_dir, ml, cogs_method, daily_anomalies,
+                               weekly_shrinkage): j for j in todo}
+        for fut in as_completed(futures):
+            j = futures[fut]
+            try:
+                r = fut.result()
+            except Exception as e:  # worker crashed / result not picklable
+                r = BarResult(j.bar_id, j.label, error=f"{type(e).__name__}: {e}")
+            if r.error:
+                failed.append(r)
+                continue
+            pending.append(r)
+            if len(pending) >= write_batch:
+                flush()
+    if pending:
+        flush()
+    return saved, failed
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    src = ap.add_mutually_exclusive_group(required=True)
+    src.add_argument("--root", help="directory with one <bar_id>/ folder per bar")
+    src.add_argument("--manifest", help="CSV with bar_id, sales, purchases, recipes[, counts][, label]")
+    ap.add_argument("--db", default=os.environ.get("DB_PATH", "app.db"))
+    ap.add_argument("--data-dir", default=os.environ.get("DATA_DIR", "data"))
+    ap.add_argument("--label", default=f"Batch {time.strftime('%Y-%m-%d')}")
+    ap.add_argument("--ml", type=float, default=750.0, help="default ml per purchased unit")
+    ap.add_argument("--cogs", choices=("approx",) + COGS_METHODS, default="approx",
+                    help="COGS method; fifo / average cost drinks through their recipes")
+    ap.add_argument("--anomalies", action="store_true", help="add the daily anomaly screen to each report")
+    ap.add_argument("--weekly", action="store_true", help="add week-by-week shrinkage (needs purchases and recipes)")
+    ap.add_argument("--workers", type=int, default=DEFAULT_WORKERS)
+    ap.add_argument("--write-batch", type=int, default=WRITE_BATCH_BARS, help="bars per write transaction")
+    args = ap.parse_args(argv)
+
+    if args.root:
+        jobs, skipped = jobs_from_root(args.root, args.label)
+    else:
+        jobs, skipped = jobs_from_manifest(args.manifest, args.label), []
+    os.makedirs(args.data_dir, exist_ok=True)
+    t0 = time.perf_counter()
+    saved, failed = run_batch(args.db, args.data_dir, jobs, workers=args.workers, ml=args.ml,
+                              write_batch=args.write_batch, cogs_method=args.cogs,
+                              daily_anomalies=args.anomalies, weekly_shrinkage=args.weekly)
+    wall = time.perf_counter() - t0
+
+    rows = sum(r.rows for r in saved)
+    print(f"{len(saved)}/{len(jobs)} bars saved, {len(failed)} failed, "
+          f"{sum(r.cached for r in saved)} from report cache"
+          + (f", {len(skipped)} directories skipped" if skipped else ""))
+    print(f"{wall:.1f}s wall, {len(saved) / wall:.2f} bars/s, {rows / wall:,.0f} sales rows/s "
+          f"({args.workers} workers)")
+    for name in skipped:
+        print(f"  skipped {os.path.join(args.root, name)}: directory name is not a bar id", file=sys.stderr)
+    for r in failed:
+        print(f"  bar {r.bar_id}: {r.error}" if r.bar_id is not None else f"  {r.error}", file=sys.stderr)
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,127 @@
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+import pandas as pd
+import streamlit as st
+from src.compare import Comparison, load_comparison
+from src.daycube import DayCube, decode_day_cube, slice_report
+from src.db import init_db, q_one
+from src.matching import match_candidates
+from src.reports import backfill_report_kpis, kpi_trend, list_reports, load_report_section, load_report_frame
+from src.scenarios import ScenarioCube, build_cube
+from src.storage import day_cube_key, get_day_cube, has_day_cube
+
+# Process-wide caches on top of Streamlit's resource/data caches.
+#
+# Report data is keyed by (bar_id, generation): saving a report for a bar bumps its
+# generation, so every cached listing/section for that bar stops matching and ages
+# out through the LRU (max_entries) / TTL limits below. Reports themselves are
+# immutable, which is what makes this cheaper than clearing whole caches.
+REPORT_CACHE_ENTRIES = 256
+REPORT_CACHE_TTL_S = 60 * 60
+DAY_CUBE_CACHE_ENTRIES = 16
+
+_generations: Dict[int, int] = {}
+_generations_lock = threading.Lock()
+
+def bar_generation(bar_id: int) -> int:
+    with _generations_lock:
+        return _generations.get(bar_id, 0)
+
+def invalidate_bar(bar_id: int) -> None:
+    """Call after saving a report for bar_id (safe from worker threads)."""
+    with _generations_lock:
+        _generations[bar_id] = _generations.get(bar_id, 0) + 1
+
+@st.cache_resource
+def ensure_db(db_path: str) -> bool:
+    # schema creation/migration once per process and database
+    init_db(db_path)
+    backfill_report_kpis(db_path)
+    return True
+
+@st.cache_data(max_entries=REPORT_CACHE_ENTRIES, ttl=REPORT_CACHE_TTL_S, show_spinner=False)
+def _report_list(db_path: str, bar_id: int, generation: int, latest_id: int) -> List[Dict[str, Any]]:
+    return list_reports(db_path, bar_id)
+
+@st.cache_data(max_entries=REPORT_CACHE_ENTRIES, ttl=REPORT_CACHE_TTL_S, show_spinner=False)
+def _kpi_trend(db_path: str, bar_id: int, generation: int, latest_id: int) -> pd.DataFrame:
+    return kpi_trend(db_path, bar_id)
+
+@st.cache_data(max_entries=REPORT_CACHE_ENTRIES, ttl=REPORT_CACHE_TTL_S, show_spinner=False)
+def _report_section(db_path: str, bar_id: int, report_id: int, section: str, generation: int) -> Any:
+    return load_report_section(db_path, bar_id, report_id, section)
+
+@st.cache_data(max_entries=REPORT_CACHE_ENTRIES, ttl=REPORT_CACHE_TTL_S, show_spinner=False)
+def _report_frame(db_path: str, bar_id: int, report_id: int, section: str, generation: int) -> pd.DataFrame:
+    return load_report_frame(db_path, bar_id, report_id, section)
+
+@st.cache_data(max_entries=REPORT_CACHE_ENTRIES, ttl=REPORT_CACHE_TTL_S, show_spinner=False)
+def _scenario_cube(db_path: str, bar_id: int, report_id: int, top_n: int, generation: int) -> ScenarioCube:
+    menu = load_report_frame(db_path, bar_id, report_id, "menu_summary")
+    targets = menu["drink_name"].astype(str).head(top_n).tolist() if top_n else None
+    return build_cube(menu,
+                      load_report_frame(db_path, bar_id, report_id, "menu_profit_approx"),
+                      load_report_frame(db_path, bar_id, report_id, "shrinkage"),
+                      targets=targets)
+
+@st.cache_data(max_entries=REPORT_CACHE_ENTRIES, ttl=REPORT_CACHE_TTL_S, show_spinner=False)
+def _comparison(db_path: str, bar_id: int, report_ids: Tuple[int, ...], generation: int) -> Comparison:
+    return load_comparison(db_path, bar_id, report_ids)
+
+@st.cache_data(max_entries=REPORT_CACHE_ENTRIES, ttl=REPORT_CACHE_TTL_S, show_spinner=False)
+def _match_candidates(db_path: str, bar_id: int, generation: int) -> Dict[str, pd.DataFrame]:
+    return match_candidates(db_path, bar_id)
+
+# Day cubes are content-addressed and never change, so they're keyed on cube_key alone and
+# shared (not copied) between sessions; nothing may mutate a cached DayCube.
+@st.cache_resource(max_entries=DAY_CUBE_CACHE_ENTRIES, ttl=REPORT_CACHE_TTL_S, show_spinner=False)
+def _day_cube(db_path: str, cube_key: str) -> DayCube:
+    return decode_day_cube(get_day_cube(db_path, cube_key))
+
+@st.cache_data(max_entries=REPORT_CACHE_ENTRIES, ttl=REPORT_CACHE_TTL_S, show_spinner=False)
+def _day_slice(db_path: str, cube_key: str, start: Any, end: Any, weekdays: Optional[Tuple[int, ...]]) -> Dict[str, Any]:
+    return slice_report(_day_cube(db_path, cube_key), start, end, weekdays)
+
+def _latest_report_id(db_path: str, bar_id: int) -> int:
+    # reports written by other processes (python -m src.batch) don't bump the in-process
+    # generation, so the newest report id is part of the key too (one indexed lookup)
+    row = q_one(db_path, "SELECT MAX(id) AS latest FROM reports WHERE bar_id = ?", (bar_id,))
+    return int(row["latest"] or 0)
+
+def cached_report_list(db_path: str, bar_id: int) -> List[Dict[str, Any]]:
+    """First page of list_reports for the bar."""
+    return _report_list(db_path, bar_id, bar_generation(bar_id), _latest_report_id(db_path, bar_id))
+
+def cached_kpi_trend(db_path: str, bar_id: int) -> pd.DataFrame:
+    """kpi_trend for the bar (report_kpis only, no report decoding)."""
+    return _kpi_trend(db_path, bar_id, bar_generation(bar_id), _latest_report_id(db_path, bar_id))
+
+def cached_report_section(db_path: str, bar_id: int, report_id: int, section: str) -> Any:
+    """Decoded dict/list section (kpis, actions, method_notes)."""
+    return _report_section(db_path, bar_id, report_id, section, bar_generation(bar_id))
+
+def cached_report_frame(db_path: str, bar_id: int, report_id: int, section: str) -> pd.DataFrame:
+    """Table section (menu_summary, menu_profit_approx, shrinkage) rebuilt as a DataFrame."""
+    return _report_frame(db_path, bar_id, report_id, section, bar_generation(bar_id))
+
+def cached_scenario_cube(db_path: str, bar_id: int, report_id: int, top_n: int = 0) -> ScenarioCube:
+    """What-if cube for a saved report; price deltas apply to the top_n sellers (0 = every drink)."""
+    return _scenario_cube(db_path, bar_id, report_id, top_n, bar_generation(bar_id))
+
+def cached_comparison(db_path: str, bar_id: int, report_ids: Tuple[int, ...]) -> Comparison:
+    """load_comparison for a set of the bar's reports (order doesn't matter)."""
+    return _comparison(db_path, bar_id, tuple(sorted(report_ids)), bar_generation(bar_id))
+
+def cached_match_candidates(db_path: str, bar_id: int) -> Dict[str, pd.DataFrame]:
+    """match_candidates for the bar; call invalidate_bar after saving mappings."""
+    return _match_candidates(db_path, bar_id, bar_generation(bar_id))
+
+def cached_day_cube(db_path: str, sales_hash: str, purchases_hash: Optional[str]) -> Optional[DayCube]:
+    """The day cube of an upload's files, or None if it was saved before day cubes existed."""
+    key = day_cube_key(sales_hash, purchases_hash)
+    return _day_cube(db_path, key) if has_day_cube(db_path, key) else None
+
+def cached_day_slice(db_path: str, sales_hash: str, purchases_hash: Optional[str], start: Any = None, end: Any = None,
+                     weekdays: Optional[Tuple[int, ...]] = None) -> Dict[str, Any]:
+    """daycube.slice_report for an upload's cube (which must exist, see cached_day_cube)."""
+    return _day_slice(db_path, day_cube_key(sales_hash, purchases_hash), start, end, weekdays)
@@ -0,0 +1,146 @@
+from __future__ import annotations
+from typing import Tuple
+import numpy as np
+import pandas as pd
+from src.io_validate import day_floor
+from src.recipes import CompiledRecipes
+
+# Recipe-based COGS: each drink is costed through its (compiled) recipe at the cost of
+# the ingredient stock it would have consumed on the day it was sold.
+#
+# Daily usage per item comes from the recipe matrix. Purchases form cost layers per item,
+# ordered by purchase date:
+#   fifo     usage draws on the layers in order. With cumulative ml in/out per item, the
+#            cost of a day's usage is C(out_end) - C(out_start), where C(x) is the cost of
+#            the first x ml bought; C is read off the layers with one as-of merge.
+#   average  usage is costed at the weighted average cost of everything bought up to
+#            and including that day (cumulative spend / cumulative ml, as-of merged on date).
+# There is no opening inventory: usage before the first purchase is costed at the first
+# layer, usage beyond everything bought at the last one. Items never purchased stay
+# uncosted and show up in costed_share.
+
+COGS_METHODS = ("fifo", "average")
+
+def daily_sales(sales: pd.DataFrame) -> pd.DataFrame:
+    """Sales rows (or a sales_day_rollup) as one row per (day, drink)."""
+    return (pd.DataFrame({
+                "date": day_floor(sales["date"]),
+                "drink_name": sales["drink_name"],
+                "quantity_sold": sales["quantity_sold"],
+                "revenue": sales["revenue"],
+            })
+            .groupby(["date", "drink_name"], as_index=False, observed=True, sort=False)
+            .agg(quantity_sold=("quantity_sold", "sum"), revenue=("revenue", "sum")))
+
+def item_usage(sales: pd.DataFrame, compiled: CompiledRecipes) -> Tuple[pd.DataFrame, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    sales: date, drink_name, quantity_sold, one row per (day, drink). Returns the
+    usage frame (item, date, ml_used; sorted by item then date) plus, for every recipe
+    entry behind it, (sales row, usage row, ml used).
+    """
+    day_codes, days = pd.factorize(day_floor(sales["date"]), sort=True)
+    pos, cols, ml = compiled.entries(sales["drink_name"])
+    ml = ml * sales["quantity_sold"].to_numpy(dtype=float)[pos]
+    n_days = max(len(days), 1)
+    uniq, inv = np.unique(cols * n_days + day_codes[pos], return_inverse=True)
+    usage = pd.DataFrame({
+        "item": uniq // n_days,
+        "date": days[uniq % n_days] if len(uniq) else pd.DatetimeIndex([]),
+        "ml_used": np.bincount(inv, weights=ml, minlength=len(uniq)),
+    })
+    return usage, pos, inv, ml
+
+def cost_layers(purchases: pd.DataFrame, compiled: CompiledRecipes, ml_per_unit: float) -> pd.DataFrame:
+    """Purchases of recipe items as layers (item, date, ml_in, cost_per_ml, layer_start, cost_before), by item then date."""
+    item = compiled.items.get_indexer(pd.Index(purchases["item_name"].astype(str)))
+    units = purchases["units_purchased"].to_numpy(dtype=float)
+    keep = (item >= 0) & (units > 0)
+    layers = pd.DataFrame({
+        "item": item[keep],
+        "date": day_floor(purchases["date"]).to_numpy()[keep],
+        "ml_in": units[keep] * float(ml_per_unit),
+        "cost_per_ml": purchases["unit_cost"].to_numpy(dtype=float)[keep] / float(ml_per_unit),
+    }).sort_values(["item", "date"], kind="stable", ignore_index=True)
+    spend = layers["ml_in"] * layers["cost_per_ml"]
+    by_item = layers.groupby("item", sort=False)
+    layers["layer_start"] = by_item["ml_in"].cumsum() - layers["ml_in"]
+    layers["cost_before"] = spend.groupby(layers["item"], sort=False).cumsum() - spend
+    return layers
+
+def _cost_at(x: pd.DataFrame, layers: pd.DataFrame) -> np.ndarray:
+    """C(x) for x's (item, pos) rows: cost of the first pos ml of the item's layers."""
+    x = x.assign(_row=np.arange(len(x))).sort_values("pos", kind="stable")
+    right = layers[["item", "layer_start", "cost_before", "cost_per_ml"]].sort_values("layer_start", kind="stable")
+    m = pd.merge_asof(x, right, left_on="pos", right_on="layer_start", by="item", direction="backward")
+    cost = m["cost_before"] + (m["pos"] - m["layer_start"]) * m["cost_per_ml"]
+    out = np.empty(len(x))
+    out[m["_row"].to_numpy()] = cost.to_numpy()
+    return out
+
+def fifo_cost(usage: pd.DataFrame, layers: pd.DataFrame) -> np.ndarray:
+    """Cost of each usage row under FIFO; NaN for items with no purchases."""
+    out_end = usage.groupby("item", sort=False)["ml_used"].cumsum().to_numpy()
+    out_start = out_end - usage["ml_used"].to_numpy()
+    n = len(usage)
+    ends = _cost_at(pd.DataFrame({"item": np.concatenate([usage["item"].to_numpy()] * 2),
+                                  "pos": np.concatenate([out_end, out_start])}), layers)
+    return ends[:n] - ends[n:]
+
+def average_cost(usage: pd.DataFrame, layers: pd.DataFrame) -> np.ndarray:
+    """Cost of each usage row at the weighted average cost of purchases up to its date."""
+    avg = layers.assign(spend=layers["ml_in"] * layers["cost_per_ml"])
+    avg = avg.groupby(["item", "date"], as_index=False, sort=True)[["ml_in", "spend"]].sum()
+    by_item = avg.groupby("item", sort=False)
+    avg["avg_cost_per_ml"] = by_item["spend"].cumsum() / by_item["ml_in"].cumsum()
+    u = usage[["item", "date"]].assign(_row=np.arange(len(usage))).sort_values("date", kind="stable")
+    m = pd.merge_asof(u, avg[["item", "date", "avg_cost_per_ml"]].sort_values("date", kind="stable"),
+                      on="date", by="item", direction="backward")
+    # usage before an item's first purchase is costed at that first purchase
+    first = avg.drop_duplicates("item").set_index("item")["avg_cost_per_ml"]
+    cpm = m["avg_cost_per_ml"].fillna(m["item"].map(first)).to_numpy()
+    out = np.empty(len(usage))
+    out[m["_row"].to_numpy()] = cpm
+    return out * usage["ml_used"].to_numpy()
+
+def recipe_cogs(
+    sales: pd.DataFrame,
+    purchases: pd.DataFrame,
+    compiled: CompiledRecipes,
+    ml_per_unit: float = 750.0,
+    method: str = "fifo"
+) -> pd.DataFrame:
+    """
+    Per-drink COGS through recipes: drink_name, quantity_sold, revenue, recipe_cogs,
+    cost_per_drink, gross_profit, margin and costed_share (share of the drink's recipe
+    ml with a known cost; 0 for drinks without a recipe). Worst gross profit first.
+    """
+    if method not in COGS_METHODS:
+        raise ValueError(f"Unknown COGS method {method!r}; expected one of {', '.join(COGS_METHODS)}")
+    sales = daily_sales(sales)
+    usage, pos, inv, ml = item_usage(sales, compiled)
+    layers = cost_layers(purchases, compiled, ml_per_unit)
+    cost = fifo_cost(usage, layers) if method == "fifo" else average_cost(usage, layers)
+    used = usage["ml_used"].to_numpy()
+    cpm = np.divide(cost, used, out=np.zeros_like(cost), where=used > 0)   # NaN stays NaN: uncosted
+
+    # back from (item, day) to the sales rows that used it, then to drinks
+    entry_cost = ml * cpm[inv]
+    costed = ~np.isnan(entry_cost)
+    drink_codes, drinks = pd.factorize(sales["drink_name"].astype(str), sort=True)
+    n = len(drinks)
+    entry_drink = drink_codes[pos]
+    out = pd.DataFrame({
+        "drink_name": drinks,
+        "quantity_sold": np.bincount(drink_codes, weights=sales["quantity_sold"].to_numpy(dtype=float), minlength=n),
+        "revenue": np.bincount(drink_codes, weights=sales["revenue"].to_numpy(dtype=float), minlength=n),
+        "recipe_cogs": np.bincount(entry_drink[costed], weights=entry_cost[costed], minlength=n),
+    })
+    recipe_ml = np.bincount(entry_drink, weights=ml, minlength=n)
+    costed_ml = np.bincount(entry_drink[costed], weights=ml[costed], minlength=n)
+    qty = out["quantity_sold"].to_numpy()
+    rev = out["revenue"].to_numpy()
+    out["cost_per_drink"] = np.divide(out["recipe_cogs"], qty, out=np.zeros(n), where=qty > 0)
+    out["gross_profit"] = out["revenue"] - out["recipe_cogs"]
+    out["margin"] = np.divide(out["gross_profit"], rev, out=np.zeros(n), where=rev > 0)
+    out["costed_share"] = np.divide(costed_ml, recipe_ml, out=np.zeros(n), where=recipe_ml > 0)
+    return out.sort_values("gross_profit", ascending=True, kind="stable", ignore_index=True)
@@ -0,0 +1,128 @@
+from __future__ import annotations
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence, Tuple
+import numpy as np
+import pandas as pd
+from src.db import q_all
+from src.reports import load_report_frame
+
+# Side-by-side comparison of saved reports, built from their stored table sections only
+# (menu_summary, menu_profit_recipe / menu_profit_approx, shrinkage); nothing is re-analyzed.
+#
+# The rows of every report are stacked once, names are factorized over the whole stack,
+# and each metric is scattered into a dense (reports, names) matrix in a single fancy
+# assignment. Deltas and movers are then plain array arithmetic between two rows.
+#
+# A drink or item missing from a report counts as 0 for revenue, units and shrinkage
+# cost (nothing sold / no gap) and as unknown for margin.
+
+COMPARE_SECTIONS = ("menu_summary", "menu_profit_approx", "menu_profit_recipe", "shrinkage")
+DRINK_METRICS = ("revenue", "units", "margin")
+ITEM_METRICS = ("shrink_cost",)
+# metrics where a missing row means zero rather than unknown
+_ZERO_FILL = ("revenue", "units", "shrink_cost")
+
+@dataclass
+class Comparison:
+    labels: List[str]             # (N,) oldest first
+    drinks: pd.Index              # (D,)
+    items: pd.Index               # (I,)
+    values: Dict[str, np.ndarray] # metric -> (N, D) or (N, I)
+
+    def _names(self, metric: str) -> pd.Index:
+        return self.items if metric in ITEM_METRICS else self.drinks
+
+    def wide(self, metric: str) -> pd.DataFrame:
+        """One row per drink (or item), one column per report."""
+        return pd.DataFrame(self.values[metric].T, index=self._names(metric), columns=self.labels)
+
+    def totals(self) -> pd.DataFrame:
+        """Per-report revenue, units and shrinkage cost, with the change from the previous report."""
+        out = pd.DataFrame({
+            "report": self.labels,
+            "revenue": self.values["revenue"].sum(axis=1),
+            "units": self.values["units"].sum(axis=1),
+            "shrink_cost": self.values["shrink_cost"].sum(axis=1),
+        })
+        for c in ("revenue", "units", "shrink_cost"):
+            out[f"{c}_change"] = out[c].diff()
+        return out
+
+    def movers(self, metric: str, base: int = 0, other: int = -1, n: int = 10) -> pd.DataFrame:
+        """
+        Largest changes in `metric` from report `base` to report `other` (indices into
+        labels), by absolute change; names missing from either side are skipped for margin.
+        """
+        v = self.values[metric]
+        a, b = v[base], v[other]
+        delta = b - a
+        known = ~np.isnan(delta)
+        # argpartition keeps this linear in the number of names
+        idx = np.flatnonzero(known)
+        if len(idx) > n:
+            idx = idx[np.argpartition(-np.abs(delta[idx]), n)[:n]]
+        idx = idx[np.argsort(-np.abs(delta[idx]), kind="stable")]
+        return pd.DataFrame({
+            "name": self._names(metric)[idx],
+            "before": a[idx],
+            "after": b[idx],
+            "change": delta[idx],
+            "change_pct": np.divide(delta[idx], np.abs(a[idx]), out=np.full(len(idx), np.nan), where=a[idx] != 0),
+        })
+
+def _align(frames: Sequence[Optional[pd.DataFrame]], key: str,
+           cols: Dict[str, str]) -> Tuple[pd.Index, Dict[str, np.ndarray]]:
+    """Scatter `cols` (metric -> column) of every frame into (len(frames), names) matrices keyed on `key`."""
+    n = len(frames)
+    present = [(i, f) for i, f in enumerate(frames) if f is not None and len(f) and key in f.columns]
+    if not present:
+        return pd.Index([]), {m: np.zeros((n, 0)) for m in cols}
+    rep = np.concatenate([np.full(len(f), i) for i, f in present])
+    codes, names = pd.factorize(np.concatenate([f[key].astype(str).to_numpy(dtype=object) for _, f in present]),
+                                sort=True)
+    out = {}
+    for metric, col in cols.items():
+        mat = np.full((n, len(names)), 0.0 if metric in _ZERO_FILL else np.nan)
+        vals = [f[col].to_numpy(dtype=float) if col in f.columns else np.full(len(f), np.nan) for _, f in present]
+        mat[rep, codes] = np.concatenate(vals)
+        out[metric] = mat
+    return pd.Index(names), out
+
+def _margins(recipe: Optional[pd.DataFrame], approx: Optional[pd.DataFrame]) -> Optional[pd.DataFrame]:
+    # recipe-costed margins where the report has them; the approximate margin is the same
+    # for every drink of a report, so it only moves when the report's overall cost ratio does
+    if recipe is not None and len(recipe):
+        return pd.DataFrame({"drink_name": recipe["drink_name"], "margin": recipe["margin"]})
+    if approx is not None and len(approx):
+        return pd.DataFrame({"drink_name": approx["drink_name"], "margin": approx["approx_margin"]})
+    return None
+
+def compare_reports(labels: Sequence[str], sections: Sequence[Dict[str, Optional[pd.DataFrame]]]) -> Comparison:
+    """
+    labels / sections: one entry per report, oldest first. sections maps a table section
+    name (menu_summary, menu_profit_approx, menu_profit_recipe, shrinkage) to its frame,
+    or None when the report doesn't have it.
+    """
+    drinks, drink_vals = _align([s.get("menu_summary") for s in sections], "drink_name",
+                                {"revenue": "revenue", "units": "quantity_sold"})
+    margins = [_margins(s.get("menu_profit_recipe"), s.get("menu_profit_approx")) for s in sections]
+    m_names, m_vals = _align(margins, "drink_name", {"margin": "margin"})
+    # margins onto the menu's drink axis (every costed drink is on the menu)
+    margin = np.full((len(sections), len(drinks)), np.nan)
+    pos = drinks.get_indexer(m_names)
+    margin[:, pos[pos >= 0]] = m_vals["margin"][:, pos >= 0]
+    items, item_vals = _align([s.get("shrinkage") for s in sections], "item_name", {"shrink_cost": "est_cost_of_gap"})
+    return Comparison(list(labels), drinks, items, {**drink_vals, "margin": margin, **item_vals})
+
+def load_comparison(db_path: str, bar_id: int, report_ids: Sequence[int]) -> Comparison:
+    """compare_reports over saved reports of the bar, ordered by the period they cover."""
+    ids = [int(i) for i in report_ids]
+    rows = q_all(
+        db_path,
+        "SELECT r.id, r.label, k.date_min, k.date_max FROM reports r LEFT JOIN report_kpis k ON k.report_id = r.id "
+        f"WHERE r.bar_id = ? AND r.id IN ({', '.join('?' * len(ids))}) ORDER BY k.date_min, k.date_max, r.id",
+        (bar_id, *ids),
+    )
+    labels = [f"#{r['id']} {r['label']} ({r['date_min']} – {r['date_max']})" for r in rows]
+    sections = [{name: load_report_frame(db_path, bar_id, r["id"], name) for name in COMPARE_SECTIONS} for r in rows]
+    return compare_reports(labels, sections)
@@ -0,0 +1,161 @@
+from __future__ import annotations
+from dataclasses import dataclass
+from typing import Any, Dict, Optional, Sequence
+import numpy as np
+import pandas as pd
+from src.analytics import build_report_from_menu, menu_summary_from_partial
+from src.io_validate import day_floor
+from src.report_codec import decode_section, encode_tables
+
+# Drink x day sales and item x day purchases of one upload, kept next to its reports so a
+# saved report can be re-cut by date range or weekday without the original files.
+#
+# Sales rows are sorted by drink then day. A filter is a boolean over days; the kept rows
+# of each drink stay contiguous, so the menu summary is a reduceat over run boundaries and
+# each drink's date range is its first and last kept row. KPIs, approximate COGS and the
+# actions then come from build_report_from_menu, exactly as for a full report.
+#
+# Stored with the report codec (src/report_codec.py), content-addressed on the sales and
+# purchases hashes (see storage.day_cube_key).
+
+WEEKDAYS = ("Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun")
+
+@dataclass
+class DayCube:
+    days: pd.DatetimeIndex   # day index -> date, every day from the first to the last
+    drinks: pd.Index         # drink code -> name
+    s_day: np.ndarray        # sales: one row per (drink, day), sorted by drink then day
+    s_drink: np.ndarray
+    qty: np.ndarray
+    revenue: np.ndarray
+    items: pd.Index          # item code -> name
+    p_day: np.ndarray        # purchases: one row per (item, day)
+    p_item: np.ndarray
+    units: np.ndarray
+    spend: np.ndarray
+    purchased: bool          # the upload had a purchases file
+
+    def day_mask(self, start: Any = None, end: Any = None, weekdays: Optional[Sequence[int]] = None) -> np.ndarray:
+        """Days inside [start, end] (inclusive) and, if given, on those weekdays (0 = Monday)."""
+        keep = np.ones(len(self.days), dtype=bool)
+        if start is not None:
+            keep &= self.days >= pd.Timestamp(start)
+        if end is not None:
+            keep &= self.days <= pd.Timestamp(end)
+        if weekdays is not None:
+            keep &= np.isin(self.days.weekday, list(weekdays))
+        return keep
+
+    def menu(self, days: np.ndarray) -> pd.DataFrame:
+        """menu_summary over the kept days."""
+        m = days[self.s_day]
+        d, s = self.s_day[m], self.s_drink[m]
+        if len(s) == 0:
+            # no sales on the kept days: an empty menu with the usual columns
+            return menu_summary_from_partial(pd.DataFrame({
+                "drink_name": pd.Categorical.from_codes(np.array([], dtype=np.int64), categories=self.drinks),
+                "quantity_sold": np.array([]),
+                "revenue": np.array([]),
+                "first_date": pd.DatetimeIndex([]),
+                "last_date": pd.DatetimeIndex([]),
+            }))
+        start = np.flatnonzero(np.r_[True, s[1:] != s[:-1]])
+        end = np.r_[start[1:], len(s)] - 1
+        g = pd.DataFrame({
+            "drink_name": pd.Categorical.from_codes(s[start], categories=self.drinks),
+            "quantity_sold": np.add.reduceat(self.qty[m], start),
+            "revenue": np.add.reduceat(self.revenue[m], start),
+            "first_date": self.days[d[start]],
+            "last_date": self.days[d[end]],
+        })
+        return menu_summary_from_partial(g)
+
+    def purchases(self, days: np.ndarray) -> Optional[pd.DataFrame]:
+        """Purchases on the kept days (date, item_name, units_purchased, unit_cost); None without a purchases file."""
+        if not self.purchased:
+            return None
+        m = days[self.p_day]
+        units, spend = self.units[m], self.spend[m]
+        return pd.DataFrame({
+            "date": self.days[self.p_day[m]],
+            "item_name": pd.Categorical.from_codes(self.p_item[m], categories=self.items),
+            "units_purchased": units,
+            "unit_cost": np.divide(spend, units, out=np.zeros_like(spend), where=units > 0),
+        })
+
+def _make(s_date: pd.Series, drink: pd.Series, qty: np.ndarray, revenue: np.ndarray,
+          p_date: Optional[pd.Series], item: Optional[pd.Series], units: np.ndarray, spend: np.ndarray) -> DayCube:
+    purchased = p_date is not None
+    if not purchased:
+        p_date, item = pd.Series(pd.DatetimeIndex([])), pd.Series([], dtype=object)
+    s_date, p_date = day_floor(s_date).to_numpy(), day_floor(p_date).to_numpy()
+    both = np.concatenate([s_date, p_date])
+    d0 = both.min() if len(both) else np.datetime64("1970-01-01", "ns")
+    n_days = int((both.max() - d0) // np.timedelta64(1, "D")) + 1 if len(both) else 0
+    s_day = (s_date - d0) // np.timedelta64(1, "D")
+    s_drink, drinks = pd.factorize(drink.astype(str), sort=True)
+    order = np.lexsort((s_day, s_drink))
+    p_item, items = pd.factorize(item.astype(str), sort=True)
+    return DayCube(
+        days=pd.date_range(d0, periods=n_days, freq="D"),
+        drinks=pd.Index(drinks),
+        s_day=s_day[order], s_drink=s_drink[order], qty=qty[order], revenue=revenue[order],
+        items=pd.Index(items),
+        p_day=(p_date - d0) // np.timedelta64(1, "D"), p_item=p_item, units=units, spend=spend,
+        purchased=purchased,
+    )
+
+def build_day_cube(sales_days: pd.DataFrame, purchases: Optional[pd.DataFrame] = None) -> DayCube:
+    """sales_days: a sales_day_rollup; purchases: validated purchases (rolled up to item x day here)."""
+    p = None
+    if purchases is not None:
+        p = (pd.DataFrame({
+                "date": day_floor(purchases["date"]),
+                "item_name": purchases["item_name"].astype(str),
+                "units_purchased": purchases["units_purchased"],
+                "total_spend": purchases["units_purchased"] * purchases["unit_cost"],
+             })
+             .groupby(["date", "item_name"], as_index=False, sort=False)
+             .agg(units_purchased=("units_purchased", "sum"), total_spend=("total_spend", "sum")))
+    return _make(sales_days["date"], sales_days["drink_name"],
+                 sales_days["quantity_sold"].to_numpy(dtype=float), sales_days["revenue"].to_numpy(dtype=float),
+                 p["date"] if p is not None else None, p["item_name"] if p is not None else None,
+                 p["units_purchased"].to_numpy(dtype=float) if p is not None else np.array([]),
+                 p["total_spend"].to_numpy(dtype=float) if p is not None else np.array([]))
+
+def encode_day_cube(cube: DayCube) -> bytes:
+    tables = {"sales": pd.DataFrame({
+        "date": cube.days[cube.s_day],
+        "drink_name": pd.Categorical.from_codes(cube.s_drink, categories=cube.drinks),
+        "quantity_sold": cube.qty,
+        "revenue": cube.revenue,
+    })}
+    if cube.purchased:
+        tables["purchases"] = pd.DataFrame({
+            "date": cube.days[cube.p_day],
+            "item_name": pd.Categorical.from_codes(cube.p_item, categories=cube.items),
+            "units_purchased": cube.units,
+            "total_spend": cube.spend,
+        })
+    return encode_tables(tables)
+
+def decode_day_cube(blob: bytes) -> DayCube:
+    s = decode_section(blob, "sales")
+    p = decode_section(blob, "purchases")
+    return _make(s["date"], s["drink_name"], s["quantity_sold"].to_numpy(), s["revenue"].to_numpy(),
+                 p["date"] if p is not None else None, p["item_name"] if p is not None else None,
+                 p["units_purchased"].to_numpy() if p is not None else np.array([]),
+                 p["total_spend"].to_numpy() if p is not None else np.array([]))
+
+def slice_report(cube: DayCube, start: Any = None, end: Any = None,
+                 weekdays: Optional[Sequence[int]] = None) -> Dict[str, Any]:
+    """
+    kpis, menu_summary, menu_profit_approx and actions over the kept days (tables as
+    DataFrames). With no sales on the kept days the tables are empty and there are no actions.
+    """
+    days = cube.day_mask(start, end, weekdays)
+    menu = cube.menu(days)
+    report = build_report_from_menu(menu, cube.purchases(days), records=False)
+    if len(menu) == 0:
+        report["actions"] = {"top_3": []}
+    return report
@@ -1,20 +1,70 @@
 import sqlite3
+import threading
 from contextlib import contextmanager
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Any, Dict, Iterable, List, Optional, Tuple
 import streamlit as st
 
+BUSY_TIMEOUT_MS = 5000
+STATEMENT_CACHE_SIZE = 256
+
+# one connection per (thread, db_path); sqlite3 connections are cheap to keep but
+# expensive to open, and must not be shared across threads mid-transaction
+_local = threading.local()
+
+def get_conn(db_path: str) -> sqlite3.Connection:
+    conns = getattr(_local, "conns", None)
+    if conns is None:
+        conns = _local.conns = {}
+    conn = conns.get(db_path)
+    if conn is None:
+        # isolation_level=None: we issue BEGIN/COMMIT ourselves (see write_ctx)
+        conn = sqlite3.connect(
+            db_path,
+            timeout=BUSY_TIMEOUT_MS / 1000,
+            isolation_level=None,
+            check_same_thread=False,
+            cached_statements=STATEMENT_CACHE_SIZE,
+        )
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL;")
+        conn.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS};")
+        conn.execute("PRAGMA synchronous=NORMAL;")
+        conns[db_path] = conn
+    return conn
+
+def close_thread_connections() -> None:
+    for conn in getattr(_local, "conns", {}).values():
+        conn.close()
+    _local.conns = {}
+
+@contextmanager
+def read_ctx(db_path: str):
+    # autocommit mode: every SELECT runs in its own implicit read transaction,
+    # which under WAL never blocks (or is blocked by) writers
+    yield get_conn(db_path)
+
 @contextmanager
-def conn_ctx(db_path: str):
-    conn = sqlite3.connect(db_path, check_same_thread=False)
-    conn.row_factory = sqlite3.Row
+def write_ctx(db_path: str):
+    conn = get_conn(db_path)
+    if conn.in_transaction:
+        # nested use joins the outer transaction
+        yield conn
+        return
+    # take the write lock up front so busy_timeout applies here instead of
+    # failing with "database is locked" when a read transaction is upgraded
+    conn.execute("BEGIN IMMEDIATE")
     try:
         yield conn
-        conn.commit()
-    finally:
-        conn.close()
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    conn.execute("COMMIT")
+
+# kept for existing callers
+conn_ctx = write_ctx
 
 def init_db(db_path: str) -> None:
-    with conn_ctx(db_path) as conn:
+    with write_ctx(db_path) as conn:
         cur = conn.cursor()
         cur.execute("""
         CREATE TABLE IF NOT EXISTS users (
@@ -59,25 +109,159 @@ def init_db(db_path: str) -> None:
             FOREIGN KEY(upload_id) REFERENCES uploads(id)
         );
         """)
+        cur.execute("""
+        CREATE TABLE IF NOT EXISTS jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            bar_id INTEGER NOT NULL,
+            label TEXT NOT NULL,
+            status TEXT NOT NULL,
+            stage TEXT,
+            progress REAL NOT NULL DEFAULT 0,
+            error TEXT,
+            params_json TEXT NOT NULL,
+            upload_id INTEGER,
+            report_id INTEGER,
+            owner TEXT,
+            created_at TEXT NOT NULL DEFAULT (datetime('now')),
+            updated_at TEXT NOT NULL DEFAULT (datetime('now')),
+            FOREIGN KEY(bar_id) REFERENCES bars(id)
+        );
+        """)
+        # stage timings per analysis run (see src/perf.py)
+        cur.execute("""
+        CREATE TABLE IF NOT EXISTS perf_events (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            run_id TEXT NOT NULL,
+            bar_id INTEGER,
+            stage TEXT NOT NULL,
+            duration_ms REAL NOT NULL,
+            rows INTEGER,
+            rss_delta_mb REAL,
+            peak_rss_mb REAL,
+            created_at TEXT NOT NULL DEFAULT (datetime('now'))
+        );
+        """)
+        # memoized build_report output keyed on input content hashes (see src/storage.py)
+        cur.execute("""
+        CREATE TABLE IF NOT EXISTS report_cache (
+            cache_key TEXT PRIMARY KEY,
+            report_json TEXT NOT NULL,
+            created_at TEXT NOT NULL DEFAULT (datetime('now'))
+        );
+        """)
+        # day-grain fact tables, appended incrementally from validated uploads (see src/facts.py)
+        cur.execute("""
+        CREATE TABLE IF NOT EXISTS sales_facts (
+            bar_id INTEGER NOT NULL,
+            date TEXT NOT NULL,
+            drink_name TEXT NOT NULL,
+            quantity_sold REAL NOT NULL,
+            revenue REAL NOT NULL,
+            upload_id INTEGER,
+            PRIMARY KEY (bar_id, date, drink_name),
+            FOREIGN KEY(bar_id) REFERENCES bars(id),
+            FOREIGN KEY(upload_id) REFERENCES uploads(id)
+        );
+        """)
+        cur.execute("""
+        CREATE TABLE IF NOT EXISTS purchase_facts (
+            bar_id INTEGER NOT NULL,
+            date TEXT NOT NULL,
+            item_name TEXT NOT NULL,
+            units_purchased REAL NOT NULL,
+            total_spend REAL NOT NULL,
+            unit_cost_sum REAL NOT NULL,
+            line_count INTEGER NOT NULL,
+            upload_id INTEGER,
+            PRIMARY KEY (bar_id, date, item_name),
+            FOREIGN KEY(bar_id) REFERENCES bars(id),
+            FOREIGN KEY(upload_id) REFERENCES uploads(id)
+        );
+        """)
+        # one row of headline numbers per report, written alongside it (see src/reports.py),
+        # so trend views never decode report_json
+        cur.execute("""
+        CREATE TABLE IF NOT EXISTS report_kpis (
+            report_id INTEGER PRIMARY KEY,
+            bar_id INTEGER NOT NULL,
+            created_at TEXT NOT NULL DEFAULT (datetime('now')),
+            date_min TEXT,
+            date_max TEXT,
+            total_revenue REAL,
+            total_units REAL,
+            total_purchases_spend REAL,
+            top_leak_item TEXT,
+            top_leak_cost REAL,
+            FOREIGN KEY(report_id) REFERENCES reports(id),
+            FOREIGN KEY(bar_id) REFERENCES bars(id)
+        );
+        """)
+        # drink x day / item x day aggregates of an upload's files, for re-cutting its reports
+        # by date (see src/daycube.py); keyed on the sales + purchases content hashes
+        cur.execute("""
+        CREATE TABLE IF NOT EXISTS day_cubes (
+            cube_key TEXT PRIMARY KEY,
+            cube_blob BLOB NOT NULL,
+            created_at TEXT NOT NULL DEFAULT (datetime('now'))
+        );
+        """)
+        # confirmed name matches per bar: sales / purchases names -> recipe names (see src/matching.py)
+        cur.execute("""
+        CREATE TABLE IF NOT EXISTS name_mappings (
+            bar_id INTEGER NOT NULL,
+            kind TEXT NOT NULL,
+            source_name TEXT NOT NULL,
+            target_name TEXT NOT NULL,
+            created_at TEXT NOT NULL DEFAULT (datetime('now')),
+            PRIMARY KEY (bar_id, kind, source_name),
+            FOREIGN KEY(bar_id) REFERENCES bars(id)
+        );
+        """)
+        _ensure_columns(conn, "uploads", {"sales_hash": "TEXT", "purchases_hash": "TEXT", "recipes_hash": "TEXT",
+                                          "counts_path": "TEXT", "counts_hash": "TEXT"})
+        # columnar table sections (see src/report_codec.py); NULL for JSON-only reports
+        _ensure_columns(conn, "reports", {"report_blob": "BLOB"})
+        _ensure_columns(conn, "report_cache", {"report_blob": "BLOB"})
+        # host:pid:token of the JobRunner running a job (see src/jobs.py)
+        _ensure_columns(conn, "jobs", {"owner": "TEXT"})
+        _ensure_columns(conn, "perf_events", {"rss_delta_mb": "REAL"})
         cur.execute("CREATE INDEX IF NOT EXISTS idx_bars_user_id ON bars(user_id);")
         cur.execute("CREATE INDEX IF NOT EXISTS idx_uploads_bar_id ON uploads(bar_id);")
         cur.execute("CREATE INDEX IF NOT EXISTS idx_reports_bar_id ON reports(bar_id);")
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_jobs_bar_status ON jobs(bar_id, status);")
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_perf_events_created ON perf_events(created_at);")
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_perf_events_run ON perf_events(run_id);")
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_reports_bar_created ON reports(bar_id, created_at, id);")
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_report_kpis_bar_period ON report_kpis(bar_id, date_max, report_id);")
+
+def _ensure_columns(conn: sqlite3.Connection, table: str, columns: Dict[str, str]) -> None:
+    # CREATE TABLE IF NOT EXISTS won't add columns to databases created by older versions
+    existing = {r["name"] for r in conn.execute(f"PRAGMA table_info({table});").fetchall()}
+    for name, decl in columns.items():
+        if name not in existing:
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN {name} {decl};")
 
 def q_one(db_path: str, sql: str, params: Tuple[Any, ...] = ()) -> Optional[Dict[str, Any]]:
-    with conn_ctx(db_path) as conn:
+    with read_ctx(db_path) as conn:
         row = conn.execute(sql, params).fetchone()
         return dict(row) if row else None
 
 def q_all(db_path: str, sql: str, params: Tuple[Any, ...] = ()) -> List[Dict[str, Any]]:
-    with conn_ctx(db_path) as conn:
+    with read_ctx(db_path) as conn:
         rows = conn.execute(sql, params).fetchall()
         return [dict(r) for r in rows]
 
 def exec_one(db_path: str, sql: str, params: Tuple[Any, ...] = ()) -> int:
-    with conn_ctx(db_path) as conn:
+    with write_ctx(db_path) as conn:
         cur = conn.execute(sql, params)
         return int(cur.lastrowid)
 
+def exec_many(db_path: str, sql: str, seq_of_params: Iterable[Tuple[Any, ...]]) -> int:
+    """Run one statement for many parameter rows in a single write transaction."""
+    with write_ctx(db_path) as conn:
+        cur = conn.executemany(sql, seq_of_params)
+        return int(cur.rowcount)
+
 def require_user() -> Dict[str, Any]:
     u = st.session_state.get("user")
     if not u:
@@ -0,0 +1,125 @@
+from __future__ import annotations
+import pandas as pd
+from typing import Optional
+from src.db import read_ctx, write_ctx
+from src.analytics import menu_summary_from_partial, shrinkage_from_aggregates
+
+# Day-grain fact tables keyed on (bar_id, date, drink_name) / (bar_id, date, item_name).
+# An upload replaces whatever the bar already had inside the upload's date range, so
+# re-uploading an overlapping export never double counts.
+
+def _day(s: pd.Series) -> pd.Series:
+    return s.dt.strftime("%Y-%m-%d")
+
+def sales_day_rollup(sales: pd.DataFrame) -> pd.DataFrame:
+    """Validated sales (or a chunk of them) rolled up to one row per (day, drink)."""
+    s = pd.DataFrame({
+        "date": _day(sales["date"]),
+        "drink_name": sales["drink_name"],
+        "quantity_sold": sales["quantity_sold"],
+        "revenue": sales["revenue"],
+    })
+    return (s.groupby(["date", "drink_name"], as_index=False, observed=True)
+            .agg(quantity_sold=("quantity_sold", "sum"), revenue=("revenue", "sum")))
+
+def merge_sales_day_rollups(a: Optional[pd.DataFrame], b: pd.DataFrame) -> pd.DataFrame:
+    if a is None:
+        return b
+    return (pd.concat([a, b], ignore_index=True)
+            .groupby(["date", "drink_name"], as_index=False, observed=True)
+            .agg(quantity_sold=("quantity_sold", "sum"), revenue=("revenue", "sum")))
+
+def append_sales_facts(db_path: str, bar_id: int, upload_id: Optional[int], day: pd.DataFrame) -> int:
+    """Insert a sales_day_rollup, replacing the bar's existing facts in the same date range."""
+    if len(day) == 0:
+        return 0
+    d0, d1 = day["date"].min(), day["date"].max()
+    rows = ((bar_id, d, n, q, r, upload_id)
+            for d, n, q, r in day[["date", "drink_name", "quantity_sold", "revenue"]].itertuples(index=False, name=None))
+    with write_ctx(db_path) as conn:
+        conn.execute("DELETE FROM sales_facts WHERE bar_id = ? AND date BETWEEN ? AND ?", (bar_id, d0, d1))
+        conn.executemany(
+            "INSERT INTO sales_facts (bar_id, date, drink_name, quantity_sold, revenue, upload_id) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            rows,
+        )
+    return len(day)
+
+def append_purchase_facts(db_path: str, bar_id: int, upload_id: Optional[int], purchases: pd.DataFrame) -> int:
+    if len(purchases) == 0:
+        return 0
+    p = pd.DataFrame({
+        "date": _day(purchases["date"]),
+        "item_name": purchases["item_name"],
+        "units_purchased": purchases["units_purchased"],
+        "total_spend": purchases["units_purchased"] * purchases["unit_cost"],
+        "unit_cost": purchases["unit_cost"],
+    })
+    # unit_cost_sum / line_count keep the row-level mean unit cost recoverable after rollup
+    day = (p.groupby(["date", "item_name"], as_index=False, observed=True)
+           .agg(units_purchased=("units_purchased", "sum"),
+                total_spend=("total_spend", "sum"),
+                unit_cost_sum=("unit_cost", "sum"),
+                line_count=("unit_cost", "size")))
+    d0, d1 = day["date"].min(), day["date"].max()
+    rows = ((bar_id, *t, upload_id) for t in day.itertuples(index=False, name=None))
+    with write_ctx(db_path) as conn:
+        conn.execute("DELETE FROM purchase_facts WHERE bar_id = ? AND date BETWEEN ? AND ?", (bar_id, d0, d1))
+        conn.executemany(
+            "INSERT INTO purchase_facts (bar_id, date, item_name, units_purchased, total_spend, "
+            "unit_cost_sum, line_count, upload_id) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            rows,
+        )
+    return len(day)
+
+def _window(start: Optional[str], end: Optional[str]) -> tuple:
+    # open-ended bounds are expressed as sentinels so one statement covers every case
+    return (start or "0000-00-00", end or "9999-99-99")
+
+def menu_summary_sql(db_path: str, bar_id: int, start: Optional[str] = None, end: Optional[str] = None) -> pd.DataFrame:
+    """menu_summary over the bar's sales facts for dates in [start, end] ('YYYY-MM-DD')."""
+    with read_ctx(db_path) as conn:
+        g = pd.read_sql_query(
+            "SELECT drink_name, SUM(quantity_sold) AS quantity_sold, SUM(revenue) AS revenue, "
+            "MIN(date) AS first_date, MAX(date) AS last_date "
+            "FROM sales_facts WHERE bar_id = ? AND date BETWEEN ? AND ? "
+            "GROUP BY drink_name ORDER BY drink_name",
+            conn, params=(bar_id, *_window(start, end)),
+        )
+    g["first_date"] = pd.to_datetime(g["first_date"], format="%Y-%m-%d")
+    g["last_date"] = pd.to_datetime(g["last_date"], format="%Y-%m-%d")
+    return menu_summary_from_partial(g)
+
+def purchases_spend_sql(db_path: str, bar_id: int, start: Optional[str] = None, end: Optional[str] = None) -> float:
+    with read_ctx(db_path) as conn:
+        row = conn.execute(
+            "SELECT COALESCE(SUM(total_spend), 0.0) FROM purchase_facts WHERE bar_id = ? AND date BETWEEN ? AND ?",
+            (bar_id, *_window(start, end)),
+        ).fetchone()
+    return float(row[0])
+
+def shrinkage_estimate_sql(
+    db_path: str,
+    bar_id: int,
+    recipes: pd.DataFrame,
+    ml_per_unit_purchased_default: float = 750.0,
+    start: Optional[str] = None,
+    end: Optional[str] = None
+) -> Optional[pd.DataFrame]:
+    """shrinkage_estimate over the bar's sales and purchase facts for dates in [start, end]."""
+    if recipes is None or len(recipes) == 0:
+        return None
+    window = (bar_id, *_window(start, end))
+    with read_ctx(db_path) as conn:
+        sold = pd.read_sql_query(
+            "SELECT drink_name, SUM(quantity_sold) AS qty FROM sales_facts "
+            "WHERE bar_id = ? AND date BETWEEN ? AND ? GROUP BY drink_name ORDER BY drink_name",
+            conn, params=window,
+        )
+        purch = pd.read_sql_query(
+            "SELECT item_name, SUM(units_purchased) AS units_purchased, "
+            "SUM(unit_cost_sum) / SUM(line_count) AS avg_unit_cost FROM purchase_facts "
+            "WHERE bar_id = ? AND date BETWEEN ? AND ? GROUP BY item_name ORDER BY item_name",
+            conn, params=window,
+        )
+    return shrinkage_from_aggregates(sold, purch, recipes, ml_per_unit_purchased_default)
@@ -1,15 +1,68 @@
 from __future__ import annotations
+import numpy as np
 import pandas as pd
-from typing import Dict, Tuple, Optional
+from typing import Any, Dict, Iterator, Tuple, Optional
+
+try:
+    from pandas.tseries.api import guess_datetime_format
+except ImportError:  # pragma: no cover - older pandas
+    from pandas._libs.tslibs.parsing import guess_datetime_format
+
+try:
+    import pyarrow  # noqa: F401
+    CSV_ENGINE = "pyarrow"
+except ImportError:
+    CSV_ENGINE = "c"
 
 SALES_REQUIRED = ["date", "drink_name", "quantity_sold", "revenue"]
 PURCHASES_REQUIRED = ["date", "item_name", "units_purchased", "unit_cost"]
 RECIPES_REQUIRED = ["drink_name", "item_name", "ml_per_drink"]
+# stock on hand at close of `date`, in purchase units (0.4 = four tenths of a bottle)
+COUNTS_REQUIRED = ["date", "item_name", "units_on_hand"]
+
+# declared dtypes per file type for the fast reader; dates and names are read as
+# text and converted once in validate_* (dates via a single inferred format, names
+# into categoricals)
+SCHEMAS: Dict[str, Dict[str, str]] = {
+    "sales": {"date": "category", "drink_name": "category", "quantity_sold": "float64", "revenue": "float64"},
+    "purchases": {"date": "category", "item_name": "category", "units_purchased": "float64", "unit_cost": "float64"},
+    "recipes": {"drink_name": "category", "item_name": "category", "ml_per_drink": "float64"},
+    "counts": {"date": "category", "item_name": "category", "units_on_hand": "float64"},
+}
+
+# rows per chunk when streaming very large sales exports
+SALES_CHUNK_ROWS = 250_000
 
 def _normalize_cols(df: pd.DataFrame) -> pd.DataFrame:
-    df = df.copy()
-    df.columns = [str(c).strip().lower() for c in df.columns]
-    return df
+    # relabel without copying the column data; validate_* only ever replaces columns
+    return df.set_axis([str(c).strip().lower() for c in df.columns], axis=1, copy=False)
+
+def _parse_dates(s: pd.Series) -> pd.Series:
+    # POS exports repeat the same few hundred dates, so parse each distinct value
+    # once, with a format inferred from the first one, and broadcast back by code
+    codes, uniques = pd.factorize(s)
+    uniques = pd.Index(uniques).astype(str)
+    fmt = guess_datetime_format(uniques[0]) if len(uniques) else None
+    if fmt is not None:
+        parsed = pd.to_datetime(uniques, format=fmt, errors="coerce")
+    else:
+        parsed = pd.to_datetime(uniques, errors="coerce")
+    return pd.Series(parsed.array.take(codes, allow_fill=True), index=s.index, name=s.name)
+
+def day_floor(s: pd.Series) -> pd.Series:
+    """Dates as midnight timestamps; takes validated datetimes or ISO date strings (a sales_day_rollup)."""
+    if s.dtype.kind != "M":
+        s = pd.to_datetime(s.astype(str), format="%Y-%m-%d")
+    return s.dt.floor("D")
+
+def _clean_names(s: pd.Series) -> pd.Series:
+    # strip each distinct name once and return a categorical with sorted categories
+    codes, uniques = pd.factorize(s)
+    stripped = pd.Index(uniques).astype(str).str.strip()
+    new_codes, categories = pd.factorize(stripped, sort=True)
+    # blanks (code -1) stay missing
+    return pd.Series(pd.Categorical.from_codes(np.where(codes >= 0, new_codes[codes], -1), categories=categories),
+                     index=s.index, name=s.name)
 
 def validate_sales(df: pd.DataFrame) -> Tuple[Optional[pd.DataFrame], str]:
     df = _normalize_cols(df)
@@ -17,13 +70,13 @@ def validate_sales(df: pd.DataFrame) -> Tuple[Optional[pd.DataFrame], str]:
     if missing:
         return None, f"Sales file missing columns: {missing}"
     # clean
-    df["date"] = pd.to_datetime(df["date"], errors="coerce")
+    df["date"] = _parse_dates(df["date"])
     df = df.dropna(subset=["date", "drink_name"])
-    df["drink_name"] = df["drink_name"].astype(str).str.strip()
+    df["drink_name"] = _clean_names(df["drink_name"])
     df["quantity_sold"] = pd.to_numeric(df["quantity_sold"], errors="coerce").fillna(0.0)
     df["revenue"] = pd.to_numeric(df["revenue"], errors="coerce").fillna(0.0)
-    df = df[df["quantity_sold"] >= 0]
-    df = df[df["revenue"] >= 0]
+    df = df[(df["quantity_sold"] >= 0) & (df["revenue"] >= 0)]
+    df["drink_name"] = df["drink_name"].cat.remove_unused_categories()
     return df, ""
 
 def validate_purchases(df: pd.DataFrame) -> Tuple[Optional[pd.DataFrame], str]:
@@ -31,12 +84,13 @@ def validate_purchases(df: pd.DataFrame) -> Tuple[Optional[pd.DataFrame], str]:
     missing = [c for c in PURCHASES_REQUIRED if c not in df.columns]
     if missing:
         return None, f"Purchases file missing columns: {missing}"
-    df["date"] = pd.to_datetime(df["date"], errors="coerce")
+    df["date"] = _parse_dates(df["date"])
     df = df.dropna(subset=["date", "item_name"])
-    df["item_name"] = df["item_name"].astype(str).str.strip()
+    df["item_name"] = _clean_names(df["item_name"])
     df["units_purchased"] = pd.to_numeric(df["units_purchased"], errors="coerce").fillna(0.0)
     df["unit_cost"] = pd.to_numeric(df["unit_cost"], errors="coerce").fillna(0.0)
     df = df[(df["units_purchased"] >= 0) & (df["unit_cost"] >= 0)]
+    df["item_name"] = df["item_name"].cat.remove_unused_categories()
     return df, ""
 
 def validate_recipes(df: pd.DataFrame) -> Tuple[Optional[pd.DataFrame], str]:
@@ -44,9 +98,73 @@ def validate_recipes(df: pd.DataFrame) -> Tuple[Optional[pd.DataFrame], str]:
     missing = [c for c in RECIPES_REQUIRED if c not in df.columns]
     if missing:
         return None, f"Recipes file missing columns: {missing}"
-    df["drink_name"] = df["drink_name"].astype(str).str.strip()
-    df["item_name"] = df["item_name"].astype(str).str.strip()
+    df = df.dropna(subset=["drink_name", "item_name"])
+    df["drink_name"] = _clean_names(df["drink_name"])
+    df["item_name"] = _clean_names(df["item_name"])
+    # a row without a drink or an item can't be placed in the usage matrix
+    df = df[(df["drink_name"] != "") & (df["item_name"] != "")]
     df["ml_per_drink"] = pd.to_numeric(df["ml_per_drink"], errors="coerce").fillna(0.0)
     df = df[df["ml_per_drink"] > 0]
+    df["drink_name"] = df["drink_name"].cat.remove_unused_categories()
+    df["item_name"] = df["item_name"].cat.remove_unused_categories()
     return df, ""
 
+def validate_counts(df: pd.DataFrame) -> Tuple[Optional[pd.DataFrame], str]:
+    df = _normalize_cols(df)
+    missing = [c for c in COUNTS_REQUIRED if c not in df.columns]
+    if missing:
+        return None, f"Inventory counts file missing columns: {missing}"
+    df["date"] = _parse_dates(df["date"])
+    # a blank count is no count, not an empty shelf
+    df["units_on_hand"] = pd.to_numeric(df["units_on_hand"], errors="coerce")
+    df = df.dropna(subset=["date", "item_name", "units_on_hand"])
+    df["item_name"] = _clean_names(df["item_name"])
+    df = df[df["units_on_hand"] >= 0]
+    df["item_name"] = df["item_name"].cat.remove_unused_categories()
+    return df, ""
+
+VALIDATORS = {"sales": validate_sales, "purchases": validate_purchases, "recipes": validate_recipes,
+              "counts": validate_counts}
+
+def _rewind(file: Any) -> None:
+    if hasattr(file, "seek"):
+        file.seek(0)
+
+def read_typed_csv(file: Any, kind: str) -> pd.DataFrame:
+    """
+    Fast reader: only the schema's columns, with declared dtypes, through the pyarrow
+    engine when available. Falls back to text columns (coerced later by validate_*)
+    if a numeric column holds values the typed reader rejects.
+    """
+    schema = SCHEMAS[kind]
+    header = pd.read_csv(file, nrows=0)
+    _rewind(file)
+    raw = {str(c).strip().lower(): c for c in header.columns}
+    if any(c not in raw for c in schema):
+        # validate_* reports the missing columns
+        return header
+    dtype = {raw[c]: t for c, t in schema.items()}
+    try:
+        return pd.read_csv(file, engine=CSV_ENGINE, usecols=list(dtype), dtype=dtype)
+    except Exception:
+        _rewind(file)
+        return pd.read_csv(file, usecols=list(dtype), dtype={c: "string" for c in dtype})
+
+def read_validated(file: Any, kind: str) -> Tuple[Optional[pd.DataFrame], str]:
+    """read_typed_csv + validate_* for kind in ("sales", "purchases", "recipes", "counts")."""
+    return VALIDATORS[kind](read_typed_csv(file, kind))
+
+def iter_sales_chunks(file: Any, chunksize: int = SALES_CHUNK_ROWS) -> Iterator[Tuple[Optional[pd.DataFrame], str]]:
+    """
+    Streaming variant of validate_sales: reads the CSV in bounded chunks and yields
+    each chunk cleaned exactly like validate_sales would. Only the required columns
+    are parsed, so wide POS dumps don't cost memory for columns we never use.
+    Stops after the first error.
+    """
+    reader = pd.read_csv(file, chunksize=chunksize,
+                         usecols=lambda c: str(c).strip().lower() in SALES_REQUIRED)
+    for raw in reader:
+        df, err = validate_sales(raw)
+        yield df, err
+        if err:
+            return
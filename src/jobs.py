@@ -0,0 +1,152 @@
+import json
+import os
+import socket
+import threading
+import time
+import uuid
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Deque, Dict, List, Optional
+from src.db import exec_one, q_all, q_one
+from src.pipeline import AnalysisError, run_analysis
+
+# Process-wide worker pool for analysis jobs. Job state lives in the `jobs` table so
+# a page rerun (or a different session) can pick up progress; the pool itself lives
+# as long as the Streamlit server process.
+#
+# Several server processes can share one database, so each runner stamps its jobs with
+# an owner (host:pid:token) and keeps their updated_at fresh while it holds them. A
+# starting runner only fails active jobs that are orphaned: no owner (older rows), an
+# owner process on this host that is gone, or no heartbeat for STALE_AFTER_SECONDS.
+MAX_WORKERS = 4
+MAX_JOBS_PER_BAR = 1
+HEARTBEAT_SECONDS = 30
+STALE_AFTER_SECONDS = 180
+
+ACTIVE_STATUSES = ("queued", "running")
+
+class JobRunner:
+    def __init__(self, db_path: str, max_workers: int = MAX_WORKERS, per_bar: int = MAX_JOBS_PER_BAR):
+        self.db_path = db_path
+        self.per_bar = per_bar
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="analysis")
+        self._lock = threading.Lock()
+        self._running: Dict[int, int] = defaultdict(int)
+        self._waiting: Dict[int, Deque[int]] = defaultdict(deque)
+        # file contents handed over by submit(data=...), kept in memory until the job runs
+        self._data: Dict[int, Dict[str, bytes]] = {}
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:12]}"
+        threading.Thread(target=self._heartbeat, name="analysis-heartbeat", daemon=True).start()
+
+    def submit(self, bar_id: int, label: str, params: Dict[str, Any],
+               data: Optional[Dict[str, bytes]] = None) -> int:
+        """
+        params are run_analysis keyword arguments (JSON-serializable, stored with the job).
+        data maps kind -> contents of files not yet written to their *_path; the job
+        stores them itself while it parses.
+        """
+        job_id = exec_one(
+            self.db_path,
+            "INSERT INTO jobs (bar_id, label, status, stage, progress, params_json, owner) "
+            "VALUES (?, ?, 'queued', 'queued', 0, ?, ?)",
+            (bar_id, label, json.dumps(params), self.owner),
+        )
+        with self._lock:
+            if data:
+                self._data[job_id] = data
+            # a bar over its cap waits in its own queue so it can't fill the shared pool
+            if self._running[bar_id] < self.per_bar:
+                self._running[bar_id] += 1
+                self._pool.submit(self._run, bar_id, job_id)
+            else:
+                self._waiting[bar_id].append(job_id)
+        return job_id
+
+    def _update(self, job_id: int, **fields: Any) -> None:
+        cols = ", ".join(f"{k} = ?" for k in fields)
+        exec_one(self.db_path, f"UPDATE jobs SET {cols}, updated_at = datetime('now') WHERE id = ?",
+                 (*fields.values(), job_id))
+
+    def _heartbeat(self) -> None:
+        # waiting jobs count too: they are held in this process's memory
+        while True:
+            time.sleep(HEARTBEAT_SECONDS)
+            try:
+                exec_one(self.db_path, "UPDATE jobs SET updated_at = datetime('now') "
+                         "WHERE owner = ? AND status IN ('queued', 'running')", (self.owner,))
+            except Exception:
+                pass   # a busy database just skips a beat
+
+    def _run(self, bar_id: int, job_id: int) -> None:
+        try:
+            with self._lock:
+                data = self._data.pop(job_id, None)
+            row = q_one(self.db_path, "SELECT label, params_json FROM jobs WHERE id = ?", (job_id,))
+            self._update(job_id, status="running", stage="starting")
+            upload_id, report_id = run_analysis(
+                self.db_path, bar_id, row["label"],
+                run_id=f"job:{job_id}",
+                data=data,
+                progress=lambda stage, p: self._update(job_id, stage=stage, progress=p),
+                **json.loads(row["params_json"]),
+            )
+            self._update(job_id, status="done", stage="done", progress=1.0,
+                         upload_id=upload_id, report_id=report_id)
+        except AnalysisError as e:
+            self._update(job_id, status="failed", error=str(e))
+        except Exception as e:
+            self._update(job_id, status="failed", error=f"Analysis failed: {e}")
+        finally:
+            with self._lock:
+                if self._waiting[bar_id]:
+                    self._pool.submit(self._run, bar_id, self._waiting[bar_id].popleft())
+                else:
+                    self._running[bar_id] -= 1
+
+_runners: Dict[str, JobRunner] = {}
+_runners_lock = threading.Lock()
+
+def _owner_alive(owner: str) -> Optional[bool]:
+    """Whether the owner's process is still running; None when that can't be told from here."""
+    host, _, rest = owner.partition(":")
+    pid = rest.partition(":")[0]
+    if host != socket.gethostname() or not pid.isdigit() or os.name != "posix":
+        return None
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+def fail_orphaned_jobs(db_path: str) -> int:
+    """Mark active jobs whose runner is gone as failed; returns how many."""
+    rows = q_all(db_path,
+                 "SELECT id, owner, (julianday('now') - julianday(updated_at)) * 86400 AS idle_seconds "
+                 "FROM jobs WHERE status IN ('queued', 'running')")
+    orphaned = [r["id"] for r in rows
+                if not r["owner"] or _owner_alive(r["owner"]) is False or r["idle_seconds"] > STALE_AFTER_SECONDS]
+    for job_id in orphaned:
+        exec_one(db_path,
+                 "UPDATE jobs SET status = 'failed', error = 'Interrupted: the server running it stopped. Please re-run.', "
+                 "updated_at = datetime('now') WHERE id = ? AND status IN ('queued', 'running')", (job_id,))
+    return len(orphaned)
+
+def get_job_runner(db_path: str) -> JobRunner:
+    with _runners_lock:
+        runner = _runners.get(db_path)
+        if runner is None:
+            fail_orphaned_jobs(db_path)
+            runner = _runners[db_path] = JobRunner(db_path)
+        return runner
+
+def get_job(db_path: str, job_id: int) -> Optional[Dict[str, Any]]:
+    return q_one(db_path,
+                 "SELECT id, bar_id, label, status, stage, progress, error, report_id, created_at, updated_at "
+                 "FROM jobs WHERE id = ?", (job_id,))
+
+def active_jobs(db_path: str, bar_id: int) -> List[Dict[str, Any]]:
+    return q_all(db_path,
+                 "SELECT id, label, status, stage, progress FROM jobs WHERE bar_id = ? AND status IN ('queued', 'running') "
+                 "ORDER BY id", (bar_id,))
@@ -0,0 +1,222 @@
+from __future__ import annotations
+import json
+import re
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Sequence
+import numpy as np
+import pandas as pd
+from src.db import q_all, q_one, write_ctx
+from src.io_validate import SCHEMAS, read_validated
+from src.recipes import _spmm, compiled_recipes
+from src.storage import content_hash, load_validated
+
+# Fuzzy matching of the names in sales / purchases exports against the recipe names, and
+# the per-bar table of mappings a user has confirmed.
+#
+# Names are normalized (case, apostrophes, bottle sizes, punctuation) and broken into
+# features: whole words plus character trigrams of each padded word. Target names go into
+# an inverted index (feature -> names, CSR layout). Scoring a batch of source names is a
+# sparse product of their features with the index, so only pairs sharing a feature are
+# ever looked at, never every source x target pair. The score is a weighted Dice overlap,
+# 2 * shared / (source + target), with idf weights (a rare trigram says more than "vod").
+# Features carried by more than MATCH_MAX_POSTINGS targets only count towards the norms;
+# they are too common to pick candidates and would blow up the pair count. Scores stay
+# sparse (one per pair that shares a feature), and the top k per source is a sort of those
+# pairs; sources are taken in chunks of about MATCH_BLOCK_PAIRS pairs, so memory stays bounded.
+#
+# Confirmed mappings (kind "drink": sales drink -> recipe drink, kind "item": purchased /
+# counted item -> recipe item) are applied by the analytics as a lookup over the distinct
+# names of a column (see analytics.map_names), and are part of the report cache key.
+
+MAPPING_KINDS = ("drink", "item")
+MATCH_TOP_K = 3
+MATCH_MIN_SCORE = 0.4
+MATCH_MAX_POSTINGS = 1000
+MATCH_BLOCK_PAIRS = 4_000_000   # candidate (source, target) feature hits per chunk
+
+_SIZE = re.compile(r"\b\d+(?:[.,]\d+)?\s*(?:ml|cl|l|ltr|lt|liter|litre|oz)\b")
+_APOSTROPHE = re.compile(r"['’`]")
+_NON_WORD = re.compile(r"[^a-z0-9]+")
+
+def normalize_name(name: str) -> str:
+    """'TITOS VODKA 1L' and "Tito's Vodka" both -> 'titos vodka'."""
+    s = _APOSTROPHE.sub("", str(name).lower()).replace("&", " and ")
+    s = _SIZE.sub(" ", s)
+    return " ".join(_NON_WORD.sub(" ", s).split())
+
+def _features(norm: str) -> List[str]:
+    out = []
+    for word in norm.split():
+        out.append(f"w:{word}")
+        padded = f"#{word}#"
+        out.extend(padded[i:i + 3] for i in range(len(padded) - 2))
+    return list(dict.fromkeys(out))
+
+def _feature_rows(norms: Sequence[str]) -> pd.DataFrame:
+    """One (row, feature) per distinct feature of each normalized name, ordered by row."""
+    feats = [_features(n) for n in norms]
+    return pd.DataFrame({"row": np.repeat(np.arange(len(feats)), [len(f) for f in feats]),
+                         "feature": [f for fs in feats for f in fs]})
+
+@dataclass
+class NameIndex:
+    names: pd.Index          # target names, by id
+    features: pd.Index       # feature vocabulary, by id
+    indptr: np.ndarray       # feature id -> slice of postings
+    postings: np.ndarray     # target ids, grouped by feature
+    weights: np.ndarray      # idf per feature id
+    norms: np.ndarray        # summed feature weight per target
+    unseen_weight: float     # weight of a feature no target has
+
+    def query(self, names: Sequence[str], k: int = MATCH_TOP_K, min_score: float = MATCH_MIN_SCORE) -> pd.DataFrame:
+        """Best k targets per source name with score >= min_score: name, candidate, score, rank (0 = best)."""
+        names = pd.Index(list(names), dtype=object).astype(str)
+        n_t = len(self.names)
+        k = min(k, n_t)
+        if len(names) == 0 or k == 0:
+            return pd.DataFrame({"name": [], "candidate": [], "score": [], "rank": []})
+        # names that normalize alike ("TITOS VODKA 1L", "Titos Vodka 750ml") are scored once
+        code, norms = pd.factorize(pd.Index([normalize_name(n) for n in names], dtype=object))
+        fr = _feature_rows(norms)
+        fid = self.features.get_indexer(fr["feature"])
+        row = fr["row"].to_numpy()
+        w = np.where(fid >= 0, self.weights[np.maximum(fid, 0)], self.unseen_weight)
+        q_norm = np.bincount(row, weights=w, minlength=len(norms))
+        # unseen and too-common features only count towards the norm
+        use = (fid >= 0) & (np.diff(self.indptr)[np.maximum(fid, 0)] <= MATCH_MAX_POSTINGS)
+        row, fid, w = row[use], fid[use], w[use]
+
+        # sources in chunks of about MATCH_BLOCK_PAIRS candidate pairs, so memory stays bounded
+        pairs = np.cumsum(np.bincount(row, weights=np.diff(self.indptr)[fid], minlength=len(norms)))
+        cuts = np.unique(np.searchsorted(pairs, np.arange(MATCH_BLOCK_PAIRS, pairs[-1] if len(pairs) else 0,
+                                                          MATCH_BLOCK_PAIRS), side="right"))
+        bounds = np.searchsorted(row, np.concatenate([[0], cuts, [len(norms)]]))
+        found = []
+        for a, b in zip(bounds[:-1], bounds[1:]):
+            if a == b:
+                continue
+            q, t, shared = _spmm(row[a:b], fid[a:b], w[a:b], self.indptr, self.postings, np.ones(len(self.postings)))
+            # shared weight per (source, target) pair that has a feature in common
+            pair, inv = np.unique(q * n_t + t, return_inverse=True)
+            q, t = pair // n_t, pair % n_t
+            score = 2 * np.bincount(inv, weights=shared, minlength=len(pair)) / (q_norm[q] + self.norms[t])
+            keep = score >= min_score
+            q, t, score = q[keep], t[keep], score[keep]
+            # best first within each source, ties to the lower target id; rank = place in its group
+            order = np.lexsort((t, -score, q))
+            q, t, score = q[order], t[order], score[order]
+            start = np.flatnonzero(np.r_[True, q[1:] != q[:-1]])
+            rank = np.arange(len(q)) - np.repeat(start, np.diff(np.r_[start, len(q)]))
+            top = rank < k
+            found.append(pd.DataFrame({"row": q[top], "target": t[top], "score": score[top], "rank": rank[top]}))
+        if not found:
+            found.append(pd.DataFrame({"row": np.array([], dtype=np.int64), "target": np.array([], dtype=np.int64),
+                                       "score": np.array([]), "rank": np.array([], dtype=np.int64)}))
+        hits = pd.concat(found, ignore_index=True)
+        out = pd.DataFrame({"name": names, "row": code}).merge(hits, on="row")
+        return pd.DataFrame({
+            "name": out["name"].to_numpy(dtype=object),
+            "candidate": np.asarray(self.names, dtype=object)[out["target"].to_numpy()],
+            "score": out["score"].to_numpy(),
+            "rank": out["rank"].to_numpy(),
+        })
+
+def build_name_index(names: Iterable[str]) -> NameIndex:
+    names = pd.Index(pd.unique(pd.Index(list(names), dtype=object).astype(str)))
+    fr = _feature_rows([normalize_name(n) for n in names])
+    fid, features = pd.factorize(fr["feature"])
+    target = fr["row"].to_numpy()
+    order = np.argsort(fid, kind="stable")
+    df = np.bincount(fid, minlength=len(features))
+    n = max(len(names), 1)
+    weights = np.log1p(n / np.maximum(df, 1))
+    return NameIndex(
+        names=names,
+        features=pd.Index(features),
+        indptr=np.concatenate([[0], np.cumsum(df)]),
+        postings=target[order],
+        weights=weights,
+        norms=np.bincount(target, weights=weights[fid], minlength=len(names)),
+        unseen_weight=float(np.log1p(n)),
+    )
+
+def suggest_matches(sources: Iterable[str], targets: Iterable[str], k: int = MATCH_TOP_K,
+                    min_score: float = MATCH_MIN_SCORE) -> pd.DataFrame:
+    """NameIndex.query for the sources that aren't already a target name."""
+    index = build_name_index(targets)
+    sources = pd.Index(pd.unique(pd.Index(list(sources), dtype=object).astype(str)))
+    return index.query(sources[~sources.isin(index.names)], k, min_score)
+
+# ---- confirmed mappings -------------------------------------------------------------
+
+def load_name_mappings(db_path: str, bar_id: int) -> Dict[str, Dict[str, str]]:
+    """kind -> {source name: target name}; kinds without mappings are left out."""
+    out: Dict[str, Dict[str, str]] = {}
+    for r in q_all(db_path, "SELECT kind, source_name, target_name FROM name_mappings WHERE bar_id = ?", (bar_id,)):
+        out.setdefault(r["kind"], {})[r["source_name"]] = r["target_name"]
+    return out
+
+def save_name_mappings(db_path: str, bar_id: int, kind: str, pairs: Dict[str, str]) -> int:
+    """Insert or replace source -> target mappings; a source mapped to itself removes its mapping."""
+    if kind not in MAPPING_KINDS:
+        raise ValueError(f"Unknown mapping kind: {kind}")
+    with write_ctx(db_path) as conn:
+        conn.executemany(
+            "INSERT INTO name_mappings (bar_id, kind, source_name, target_name) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT(bar_id, kind, source_name) DO UPDATE SET target_name = excluded.target_name, "
+            "created_at = datetime('now')",
+            [(bar_id, kind, s, t) for s, t in pairs.items() if s != t],
+        )
+        conn.executemany("DELETE FROM name_mappings WHERE bar_id = ? AND kind = ? AND source_name = ?",
+                         [(bar_id, kind, s) for s, t in pairs.items() if s == t])
+    return len(pairs)
+
+def delete_name_mappings(db_path: str, bar_id: int, kind: str, sources: Iterable[str]) -> None:
+    with write_ctx(db_path) as conn:
+        conn.executemany("DELETE FROM name_mappings WHERE bar_id = ? AND kind = ? AND source_name = ?",
+                         [(bar_id, kind, s) for s in sources])
+
+def name_mappings_hash(mappings: Optional[Dict[str, Dict[str, str]]]) -> Optional[str]:
+    """Stable digest of a bar's mappings for the report cache key; None when there are none."""
+    if not mappings or not any(mappings.values()):
+        return None
+    return content_hash(json.dumps(mappings, sort_keys=True).encode("utf-8"))
+
+# ---- candidates for a bar -----------------------------------------------------------
+
+def latest_recipes(db_path: str, bar_id: int) -> Optional[pd.DataFrame]:
+    """Validated recipes of the bar's newest upload that had a recipes file."""
+    row = q_one(db_path, "SELECT recipes_path FROM uploads WHERE bar_id = ? AND recipes_path IS NOT NULL "
+                         "ORDER BY id DESC LIMIT 1", (bar_id,))
+    if not row:
+        return None
+    df = load_validated(row["recipes_path"], "recipes", list(SCHEMAS["recipes"]))
+    if df is None:
+        try:
+            df, err = read_validated(row["recipes_path"], "recipes")
+        except OSError:
+            return None
+        if err:
+            return None
+    return df
+
+def match_candidates(db_path: str, bar_id: int, k: int = MATCH_TOP_K) -> Dict[str, pd.DataFrame]:
+    """
+    kind -> suggest_matches of the bar's sales drink names (kind "drink") / purchased item
+    names (kind "item") against the latest recipes, leaving out names already mapped.
+    Empty when the bar has no recipes.
+    """
+    recipes = latest_recipes(db_path, bar_id)
+    if recipes is None or len(recipes) == 0:
+        return {}
+    compiled = compiled_recipes(recipes)
+    mapped = load_name_mappings(db_path, bar_id)
+    sources = {
+        "drink": ("SELECT DISTINCT drink_name AS name FROM sales_facts WHERE bar_id = ?", compiled.drinks),
+        "item": ("SELECT DISTINCT item_name AS name FROM purchase_facts WHERE bar_id = ?", compiled.items),
+    }
+    out = {}
+    for kind, (sql, targets) in sources.items():
+        names = [r["name"] for r in q_all(db_path, sql, (bar_id,)) if r["name"] not in mapped.get(kind, {})]
+        out[kind] = suggest_matches(names, targets, k)
+    return out
@@ -28,4 +28,5 @@ class Report:
     created_at: str
     label: str
     report_json: str
+    report_blob: Optional[bytes] = None
 
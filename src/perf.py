@@ -0,0 +1,148 @@
+import os
+import sys
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional
+import pandas as pd
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+try:
+    import psutil
+except ImportError:  # optional; /proc covers Linux without it
+    psutil = None
+
+# Lightweight stage timing. A PerfRun is bound to the current thread/context with
+# perf_run(); code anywhere below it calls span(...) and pays one ContextVar lookup
+# when no run is active (or perf is switched off).
+#
+# src.db is imported lazily so analytics can use span() without pulling in the
+# database / Streamlit layer.
+#
+# Memory per span is rss_delta_mb: resident set size at the end of the span minus at
+# its start. It is process-wide, so spans of jobs running side by side share it.
+# peak_rss_mb is the process-lifetime high-water mark (ru_maxrss), not the span's.
+
+_PAGE_BYTES = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+def rss_mb() -> Optional[float]:
+    """Current resident set size of this process."""
+    try:
+        with open("/proc/self/statm", "rb") as f:
+            return int(f.read().split()[1]) * _PAGE_BYTES / 2**20
+    except (OSError, IndexError, ValueError):
+        pass
+    if psutil is not None:
+        return psutil.Process().memory_info().rss / 2**20
+    return None
+
+def peak_rss_mb() -> Optional[float]:
+    """Highest resident set size over the life of the process."""
+    if resource is None:
+        return None
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    scale = 2**20 if sys.platform == "darwin" else 2**10
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale
+
+class PerfRun:
+    def __init__(self, bar_id: Optional[int] = None, run_id: Optional[str] = None):
+        self.bar_id = bar_id
+        self.run_id = run_id or uuid.uuid4().hex
+        self.events: List[Dict[str, Any]] = []
+
+    def record(self, stage: str, duration_ms: float, rows: Optional[int] = None,
+               rss_delta_mb: Optional[float] = None) -> None:
+        self.events.append({"stage": stage, "duration_ms": duration_ms, "rows": rows,
+                            "rss_delta_mb": rss_delta_mb, "peak_rss_mb": peak_rss_mb()})
+
+    def flush(self, db_path: str) -> None:
+        if not self.events:
+            return
+        from src.db import exec_many
+        exec_many(
+            db_path,
+            "INSERT INTO perf_events (run_id, bar_id, stage, duration_ms, rows, rss_delta_mb, peak_rss_mb) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            [(self.run_id, self.bar_id, e["stage"], e["duration_ms"], e["rows"], e["rss_delta_mb"], e["peak_rss_mb"])
+             for e in self.events],
+        )
+        self.events = []
+
+_current: ContextVar[Optional[PerfRun]] = ContextVar("perf_run", default=None)
+
+@contextmanager
+def perf_run(db_path: str, bar_id: Optional[int] = None, enabled: bool = True, run_id: Optional[str] = None):
+    """Collect spans for one pipeline run and write them to perf_events when it ends."""
+    if not enabled:
+        yield None
+        return
+    run = PerfRun(bar_id, run_id)
+    token = _current.set(run)
+    try:
+        with span("total"):
+            yield run
+    finally:
+        _current.reset(token)
+        run.flush(db_path)
+
+class _Span:
+    __slots__ = ("rows",)
+
+    def __init__(self) -> None:
+        self.rows: Optional[int] = None
+
+@contextmanager
+def span(stage: str, rows: Optional[int] = None):
+    """Time a stage; set `.rows` on the yielded object if the count is only known inside."""
+    run = _current.get()
+    s = _Span()
+    s.rows = rows
+    if run is None:
+        yield s
+        return
+    rss0 = rss_mb()
+    t0 = time.perf_counter()
+    try:
+        yield s
+    finally:
+        ms = (time.perf_counter() - t0) * 1000.0
+        rss1 = rss_mb()
+        run.record(stage, ms, s.rows, rss1 - rss0 if rss0 is not None and rss1 is not None else None)
+
+def stage_percentiles(db_path: str, since_days: int = 30) -> List[Dict[str, Any]]:
+    from src.db import q_all
+    rows = q_all(
+        db_path,
+        "SELECT stage, duration_ms FROM perf_events WHERE created_at >= datetime('now', ?)",
+        (f"-{int(since_days)} days",),
+    )
+    if not rows:
+        return []
+    df = pd.DataFrame(rows)
+    g = df.groupby("stage")["duration_ms"]
+    out = g.quantile([0.5, 0.9, 0.99]).unstack()
+    out.columns = ["p50_ms", "p90_ms", "p99_ms"]
+    out["runs"] = g.size()
+    out["max_ms"] = g.max()
+    return out.reset_index().sort_values("p90_ms", ascending=False).to_dict(orient="records")
+
+def slowest_runs(db_path: str, limit: int = 20) -> List[Dict[str, Any]]:
+    from src.db import q_all
+    return q_all(
+        db_path,
+        "SELECT p.run_id, p.bar_id, p.duration_ms, p.rss_delta_mb, p.peak_rss_mb, p.created_at, "
+        "(SELECT MAX(rows) FROM perf_events s WHERE s.run_id = p.run_id) AS max_rows "
+        "FROM perf_events p WHERE p.stage = 'total' ORDER BY p.duration_ms DESC LIMIT ?",
+        (limit,),
+    )
+
+def run_events(db_path: str, run_id: str) -> List[Dict[str, Any]]:
+    from src.db import q_all
+    return q_all(db_path,
+                 "SELECT stage, duration_ms, rows, rss_delta_mb, peak_rss_mb FROM perf_events WHERE run_id = ? ORDER BY id",
+                 (run_id,))
@@ -0,0 +1,302 @@
+import contextvars
+import io
+import os
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import pandas as pd
+from src.db import exec_one, write_ctx
+from src.io_validate import SCHEMAS, VALIDATORS, read_typed_csv, iter_sales_chunks
+from src.analytics import build_report, build_report_from_menu, menu_partial, merge_menu_partials, menu_summary_from_partial
+from src.storage import (report_cache_key, get_cached_report, put_cached_report, has_validated, load_validated,
+                         store_validated, iter_validated, write_blob, day_cube_key, has_day_cube, put_day_cube)
+from src.daycube import build_day_cube, encode_day_cube
+from src.matching import load_name_mappings, name_mappings_hash
+from src.report_codec import encode_report
+from src.reports import save_report_kpis
+from src.cache import invalidate_bar
+from src.perf import perf_run, span
+from src.facts import sales_day_rollup, merge_sales_day_rollups, append_sales_facts, append_purchase_facts
+
+ProgressFn = Callable[[str, float], None]
+
+# The input files are independent until build_report, so they are parsed and validated
+# side by side (the CSV readers spend most of their time outside the GIL). Writes to the
+# content store go to a separate pool and overlap the rest of the run. Both pools are
+# shared by every job in the process, which bounds the total thread count.
+INGEST_WORKERS = 4
+PERSIST_WORKERS = 2
+_ingest_pool = ThreadPoolExecutor(max_workers=INGEST_WORKERS, thread_name_prefix="ingest")
+_persist_pool = ThreadPoolExecutor(max_workers=PERSIST_WORKERS, thread_name_prefix="persist")
+
+class AnalysisError(Exception):
+    """Problem with the uploaded files; the message is shown to the user as-is."""
+
+def _noop(stage: str, progress: float) -> None:
+    pass
+
+def _submit(pool: ThreadPoolExecutor, fn: Callable[..., Any], *args: Any) -> Future:
+    # run in a copy of the caller's context so perf spans land in the caller's run
+    return pool.submit(contextvars.copy_context().run, fn, *args)
+
+def _require_stored(path: str, kind: str) -> None:
+    if not os.path.exists(path):
+        raise AnalysisError(f"The stored {kind} file is no longer available. Please upload it again.")
+
+def _source(path: str, kind: str, data: Optional[bytes]) -> Any:
+    # files handed over in memory are parsed from there while their blob is still being written
+    if data is not None:
+        return io.BytesIO(data)
+    _require_stored(path, kind)
+    return path
+
+def _store_validated(path: str, kind: str, df: pd.DataFrame) -> None:
+    with span(f"write_{kind}_parquet", rows=len(df)):
+        store_validated(path, kind, df)
+
+def _read_validated(path: str, kind: str, data: Optional[bytes], persist: List[Future]) -> pd.DataFrame:
+    # a typed Parquet copy from an earlier run skips CSV parsing and validation entirely
+    if has_validated(path, kind):
+        with span(f"load_{kind}_parquet") as sp:
+            df = load_validated(path, kind, list(SCHEMAS[kind]))
+            sp.rows = len(df)
+        return df
+    src = _source(path, kind, data)
+    try:
+        with span(f"parse_{kind}") as sp:
+            raw = read_typed_csv(src, kind)
+            sp.rows = len(raw)
+        with span(f"validate_{kind}", rows=len(raw)):
+            df, err = VALIDATORS[kind](raw)
+    except Exception as e:
+        raise AnalysisError(f"Could not read {kind} CSV: {e}")
+    if err:
+        raise AnalysisError(err)
+    persist.append(_submit(_persist_pool, _store_validated, path, kind, df))
+    return df
+
+def _stream_sales(path: str, data: Optional[bytes]) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """Chunked sales ingest: (menu partial, day rollup) without materializing the file."""
+    # a typed copy from an earlier run is read back a row group at a time, not whole
+    if has_validated(path, "sales"):
+        stage = "load_sales_parquet_streaming"
+        chunks = ((df, "") for df in iter_validated(path, "sales", list(SCHEMAS["sales"])))
+    else:
+        stage = "parse_validate_sales_streaming"
+        chunks = iter_sales_chunks(_source(path, "sales", data))
+    partial = None
+    days = None
+    try:
+        with span(stage) as sp:
+            sp.rows = 0
+            for chunk, err in chunks:
+                if err:
+                    raise AnalysisError(err)
+                sp.rows += len(chunk)
+                partial = merge_menu_partials(partial, menu_partial(chunk))
+                days = merge_sales_day_rollups(days, sales_day_rollup(chunk))
+    except AnalysisError:
+        raise
+    except Exception as e:
+        raise AnalysisError(f"Could not read sales CSV: {e}")
+    return partial, days
+
+def _ingest(
+    paths: Dict[str, Optional[str]],
+    data: Dict[str, bytes],
+    streaming: bool,
+    persist: List[Future]
+) -> Dict[str, Any]:
+    """Parse + validate every given file concurrently; errors from all of them are reported together."""
+    tasks: Dict[str, Future] = {}
+    for kind, path in paths.items():
+        if path is None:
+            continue
+        if kind == "sales" and streaming:
+            tasks[kind] = _submit(_ingest_pool, _stream_sales, path, data.get(kind))
+        else:
+            tasks[kind] = _submit(_ingest_pool, _read_validated, path, kind, data.get(kind), persist)
+    out: Dict[str, Any] = {}
+    errors = []
+    for kind, fut in tasks.items():
+        try:
+            out[kind] = fut.result()
+        except AnalysisError as e:
+            errors.append(str(e))
+    if errors:
+        raise AnalysisError("\n\n".join(errors))
+    return out
+
+def _wait(futures: List[Future]) -> None:
+    for f in futures:
+        f.result()
+
+def run_analysis(
+    db_path: str,
+    bar_id: int,
+    label: str,
+    sales_path: str,
+    sales_hash: str,
+    purchases_path: Optional[str] = None,
+    purchases_hash: Optional[str] = None,
+    recipes_path: Optional[str] = None,
+    recipes_hash: Optional[str] = None,
+    ml_per_unit_purchased_default: float = 750.0,
+    streaming: bool = False,
+    perf_enabled: bool = True,
+    run_id: Optional[str] = None,
+    upload_id: Optional[int] = None,
+    data: Optional[Dict[str, bytes]] = None,
+    progress: ProgressFn = _noop,
+    cogs_method: str = "approx",
+    counts_path: Optional[str] = None,
+    counts_hash: Optional[str] = None,
+    daily_anomalies: bool = False,
+    weekly_shrinkage: bool = False
+) -> Tuple[int, int]:
+    """
+    Full upload pipeline over files in the content store: parse + validate, append
+    facts, build (or reuse) the report and save it. Returns (upload_id, report_id).
+    Stage timings go to perf_events unless perf_enabled is False.
+
+    data maps kind -> file contents not yet written to its *_path; those are parsed
+    from memory and stored while the analysis runs.
+
+    Pass upload_id to re-run an existing upload (e.g. with a different ml default):
+    the upload row is reused and the bar's facts are left alone.
+
+    cogs_method "fifo" / "average" adds recipe-based COGS to the report (needs
+    purchases and recipes); "approx" keeps the revenue-share allocation only.
+
+    counts_path is an optional inventory counts CSV; it reconciles the weekly
+    shrinkage against counted stock.
+
+    daily_anomalies / weekly_shrinkage add those report sections (see
+    analytics.build_report_from_menu); they are off unless asked for.
+    """
+    with perf_run(db_path, bar_id, enabled=perf_enabled, run_id=run_id):
+        return _run_analysis(db_path, bar_id, label, sales_path, sales_hash, purchases_path, purchases_hash,
+                             recipes_path, recipes_hash, float(ml_per_unit_purchased_default), streaming,
+                             upload_id, data or {}, progress, cogs_method, counts_path, counts_hash,
+                             daily_anomalies, weekly_shrinkage)
+
+def _run_analysis(
+    db_path: str,
+    bar_id: int,
+    label: str,
+    sales_path: str,
+    sales_hash: str,
+    purchases_path: Optional[str],
+    purchases_hash: Optional[str],
+    recipes_path: Optional[str],
+    recipes_hash: Optional[str],
+    ml: float,
+    streaming: bool,
+    upload_id: Optional[int],
+    data: Dict[str, bytes],
+    progress: ProgressFn,
+    cogs_method: str,
+    counts_path: Optional[str],
+    counts_hash: Optional[str],
+    daily_anomalies: bool,
+    weekly_shrinkage: bool
+) -> Tuple[int, int]:
+    paths = {"sales": sales_path, "purchases": purchases_path, "recipes": recipes_path, "counts": counts_path}
+    blobs = [_submit(_persist_pool, write_blob, paths[kind], b) for kind, b in data.items()]
+    typed: List[Future] = []
+
+    # the bar's confirmed name mappings are an input like the files (see src/matching.py)
+    mappings = load_name_mappings(db_path, bar_id)
+    cache_key = report_cache_key(sales_hash, purchases_hash, recipes_hash, ml, cogs_method, counts_hash,
+                                 name_mappings_hash(mappings), daily_anomalies, weekly_shrinkage)
+    cube_key = day_cube_key(sales_hash, purchases_hash)
+    with span("report_cache_lookup"):
+        cached = get_cached_report(db_path, cache_key)
+        # uploads from before day cubes existed are parsed once more to build theirs
+        need_cube = not has_day_cube(db_path, cube_key)
+
+    rerun = upload_id is not None
+    # a new upload always gets its facts (the report cache is shared by every bar), so
+    # only a re-run with a cached report and day cube skips parsing
+    if cached is None or need_cube or not rerun:
+        progress("parse files", 0.05)
+        ingested = _ingest(paths, data, streaming, typed)
+        sales_df = None
+        sales_partial = None
+        sales_days = None
+        if isinstance(ingested["sales"], tuple):
+            sales_partial, sales_days = ingested["sales"]
+        else:
+            sales_df = ingested["sales"]
+        purchases_df = ingested.get("purchases")
+        recipes_df = ingested.get("recipes")
+        counts_df = ingested.get("counts")
+
+    # the upload row points at the stored files, so they must be on disk from here on
+    if blobs:
+        with span("wait_store_files"):
+            _wait(blobs)
+
+    if not rerun:
+        progress("save upload", 0.45)
+        with span("db_insert_upload"):
+            upload_id = exec_one(
+                db_path,
+                "INSERT INTO uploads (bar_id, label, sales_path, purchases_path, recipes_path, counts_path, "
+                "sales_hash, purchases_hash, recipes_hash, counts_hash) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (bar_id, label, sales_path, purchases_path, recipes_path, counts_path,
+                 sales_hash, purchases_hash, recipes_hash, counts_hash),
+            )
+        # Append validated rows to the bar's fact tables
+        progress("append facts", 0.50)
+        if sales_days is None:
+            with span("sales_day_rollup", rows=len(sales_df)):
+                sales_days = sales_day_rollup(sales_df)
+        with span("db_append_facts", rows=len(sales_days)):
+            append_sales_facts(db_path, bar_id, upload_id, sales_days)
+            if purchases_df is not None:
+                append_purchase_facts(db_path, bar_id, upload_id, purchases_df)
+
+    if cached is None:
+        progress("build report", 0.65)
+        if sales_df is None:
+            report = build_report_from_menu(menu_summary_from_partial(sales_partial), purchases_df, recipes_df,
+                                            ml_per_unit_purchased_default=ml, records=False,
+                                            sales_days=sales_days, cogs_method=cogs_method, counts=counts_df,
+                                            mappings=mappings, daily_anomalies=daily_anomalies,
+                                            weekly_shrinkage=weekly_shrinkage)
+        else:
+            report = build_report(sales_df, purchases_df, recipes_df, ml_per_unit_purchased_default=ml, records=False,
+                                  cogs_method=cogs_method, counts=counts_df, mappings=mappings,
+                                  daily_anomalies=daily_anomalies, weekly_shrinkage=weekly_shrinkage)
+        progress("serialize report", 0.85)
+        with span("serialize_report"):
+            cached = encode_report(report)
+        with span("db_insert_report_cache"):
+            put_cached_report(db_path, cache_key, *cached)
+    if need_cube:
+        with span("build_day_cube"):
+            if sales_days is None:
+                sales_days = sales_day_rollup(sales_df)
+            cube_blob = encode_day_cube(build_day_cube(sales_days, purchases_df))
+        with span("db_insert_day_cube"):
+            put_day_cube(db_path, cube_key, cube_blob)
+    report_json, report_blob = cached
+
+    progress("save report", 0.95)
+    with span("db_insert_report"), write_ctx(db_path) as conn:
+        report_id = int(conn.execute(
+            "INSERT INTO reports (bar_id, upload_id, label, report_json, report_blob) VALUES (?, ?, ?, ?, ?)",
+            (bar_id, upload_id, label, report_json, report_blob),
+        ).lastrowid)
+        save_report_kpis(conn, report_id, bar_id, report_json, report_blob)
+    invalidate_bar(bar_id)
+    # typed copies only speed up later runs; the report is saved either way
+    if typed:
+        with span("wait_store_typed"):
+            for f in typed:
+                try:
+                    f.result()
+                except Exception:
+                    pass
+    progress("done", 1.0)
+    return upload_id, report_id
@@ -0,0 +1,158 @@
+from __future__ import annotations
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Tuple
+import numpy as np
+import pandas as pd
+
+# Recipes compiled into a sparse drinks x items usage matrix.
+#
+# A recipe row (drink_name, item_name, ml_per_drink) whose item_name is itself the
+# drink_name of other rows refers to a sub-recipe (house syrup, pre-batched mix, ...).
+# A sub-recipe's rows describe one batch; using x ml of it consumes each of its
+# ingredients in proportion to the batch volume (the sum of its rows). A row naming its
+# own drink ("Guinness" -> "Guinness") is a plain item. Sub-recipes are resolved by
+# transitive closure, so the compiled matrix only has leaf items (the ones you buy) and
+# expected usage is a single mat-vec over quantities sold.
+#
+# The matrix is kept as COO triplets (numpy only); the mat-vec is a bincount.
+
+COMPILED_CACHE_ENTRIES = 64
+
+@dataclass
+class CompiledRecipes:
+    drinks: pd.Index      # row labels
+    items: pd.Index       # column labels (leaf items only)
+    rows: np.ndarray      # int64
+    cols: np.ndarray      # int64
+    ml: np.ndarray        # float64, ml of item per drink sold
+    depth: int            # longest sub-recipe chain resolved
+
+    def __len__(self) -> int:
+        return len(self.ml)
+
+    def _drink_index(self, drink_names: pd.Series) -> np.ndarray:
+        # categorical names (validated frames) are looked up once per category, not per row
+        if isinstance(drink_names.dtype, pd.CategoricalDtype):
+            cat_idx = self.drinks.get_indexer(pd.Index(drink_names.cat.categories.astype(str)))
+            codes = drink_names.cat.codes.to_numpy()
+            return np.where(codes >= 0, cat_idx[codes], -1)
+        return self.drinks.get_indexer(pd.Index(drink_names.astype(str)))
+
+    def expected_usage(self, drink_names: pd.Series, qty: pd.Series) -> pd.DataFrame:
+        """
+        ml_expected per item for the given sold quantities. Only items used by at least
+        one of the given drinks are returned (even if that drink sold 0).
+        """
+        idx = self._drink_index(drink_names)
+        known = idx >= 0
+        sold = np.bincount(idx[known], weights=np.asarray(qty, dtype=float)[known], minlength=len(self.drinks))
+        present = np.zeros(len(self.drinks), dtype=bool)
+        present[idx[known]] = True
+        usage = np.bincount(self.cols, weights=self.ml * sold[self.rows], minlength=len(self.items))
+        touched = np.bincount(self.cols, weights=present[self.rows], minlength=len(self.items)) > 0
+        return pd.DataFrame({"item_name": self.items[touched], "ml_expected": usage[touched]})
+
+    def entries(self, drink_names: pd.Series) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Recipe rows for each position of drink_names, as (position, item column, ml per
+        drink) triplets. Drinks without a recipe contribute nothing.
+        """
+        idx = self._drink_index(drink_names)
+        pos = np.flatnonzero(idx >= 0)
+        indptr = np.concatenate([[0], np.cumsum(np.bincount(self.rows, minlength=len(self.drinks)))])
+        # rows are sorted (compile_recipes coalesces), so the COO arrays already are CSR order
+        return _spmm(pos, idx[pos], np.ones(len(pos)), indptr, self.cols, self.ml)
+
+def _coalesce(rows: np.ndarray, cols: np.ndarray, vals: np.ndarray, n_cols: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    # sum duplicate (row, col) entries
+    key = rows * n_cols + cols
+    uniq, inv = np.unique(key, return_inverse=True)
+    return uniq // n_cols, uniq % n_cols, np.bincount(inv, weights=vals)
+
+def _spmm(a_rows: np.ndarray, a_cols: np.ndarray, a_vals: np.ndarray,
+          b_indptr: np.ndarray, b_cols: np.ndarray, b_vals: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """COO A times CSR B, as (uncoalesced) COO triplets."""
+    counts = b_indptr[a_cols + 1] - b_indptr[a_cols]
+    total = int(counts.sum())
+    starts = np.repeat(b_indptr[a_cols], counts)
+    offsets = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+    j = starts + offsets
+    return np.repeat(a_rows, counts), b_cols[j], np.repeat(a_vals, counts) * b_vals[j]
+
+def _csr(rows: np.ndarray, cols: np.ndarray, vals: np.ndarray, n_rows: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    order = np.argsort(rows, kind="stable")
+    indptr = np.concatenate([[0], np.cumsum(np.bincount(rows, minlength=n_rows))])
+    return indptr, cols[order], vals[order]
+
+def compile_recipes(recipes: pd.DataFrame) -> CompiledRecipes:
+    """Validated recipes (drink_name, item_name, ml_per_drink) -> CompiledRecipes."""
+    drink = recipes["drink_name"].astype(str).to_numpy()
+    item = recipes["item_name"].astype(str).to_numpy()
+    ml = recipes["ml_per_drink"].to_numpy(dtype=float)
+
+    drinks = pd.Index(pd.unique(drink)).sort_values()
+    r = drinks.get_indexer(drink)
+    # an ingredient naming another recipe is a sub-recipe reference, anything else is a leaf item
+    sub = drinks.get_indexer(item)
+    is_sub = (sub >= 0) & (item != drink)
+    items = pd.Index(pd.unique(item[~is_sub])).sort_values()
+    leaf_col = items.get_indexer(item)
+
+    n = len(drinks)
+    # per-ml expansion of each sub-recipe: its rows scaled by 1 / batch volume
+    batch = np.bincount(r, weights=ml, minlength=n)
+    s_rows, s_cols = r[is_sub], sub[is_sub]
+    s_indptr, s_cols_sorted, s_vals = _csr(s_rows, s_cols, ml[is_sub], n)
+    leaf = ~is_sub
+    l_indptr, l_cols, l_vals = _csr(r[leaf], leaf_col[leaf], ml[leaf], n)
+
+    # T = L + (S N) L + (S N)^2 L + ... where N = diag(1 / batch); walk the sub-recipe edges
+    # level by level until nothing is left. More than n levels means a cycle.
+    t_rows, t_cols, t_vals = [r[leaf]], [leaf_col[leaf]], [ml[leaf]]
+    f_rows, f_cols, f_vals = r[is_sub], sub[is_sub], ml[is_sub]   # pending usage of sub-recipes
+    depth = 0
+    while len(f_rows):
+        depth += 1
+        if depth > n:
+            names = sorted(set(drinks[f_cols]))[:5]
+            raise ValueError(f"Recipes contain a cycle of sub-recipes involving: {', '.join(names)}")
+        per_ml = np.divide(f_vals, batch[f_cols], out=np.zeros_like(f_vals), where=batch[f_cols] > 0)
+        # leaf ingredients of the referenced sub-recipes
+        lr, lc, lv = _spmm(f_rows, f_cols, per_ml, l_indptr, l_cols, l_vals)
+        t_rows.append(lr)
+        t_cols.append(lc)
+        t_vals.append(lv)
+        # their own sub-recipe references become the next level
+        f_rows, f_cols, f_vals = _spmm(f_rows, f_cols, per_ml, s_indptr, s_cols_sorted, s_vals)
+        if len(f_rows):
+            f_rows, f_cols, f_vals = _coalesce(f_rows, f_cols, f_vals, n)
+
+    rows, cols, vals = _coalesce(np.concatenate(t_rows), np.concatenate(t_cols), np.concatenate(t_vals), max(len(items), 1))
+    return CompiledRecipes(drinks, items, rows, cols, vals, depth)
+
+_compiled: "OrderedDict[Tuple[int, int], CompiledRecipes]" = OrderedDict()
+_compiled_lock = threading.Lock()
+
+def recipes_fingerprint(recipes: pd.DataFrame) -> Tuple[int, int]:
+    cols = recipes[["drink_name", "item_name", "ml_per_drink"]]
+    return len(cols), int(pd.util.hash_pandas_object(cols, index=False).sum())
+
+def compiled_recipes(recipes: pd.DataFrame) -> CompiledRecipes:
+    """
+    compile_recipes with a process-wide LRU keyed on the recipes' content, so a bar's
+    matrix is compiled once and recompiled only when its recipes change.
+    """
+    key = recipes_fingerprint(recipes)
+    with _compiled_lock:
+        hit = _compiled.get(key)
+        if hit is not None:
+            _compiled.move_to_end(key)
+            return hit
+    compiled = compile_recipes(recipes)
+    with _compiled_lock:
+        _compiled[key] = compiled
+        while len(_compiled) > COMPILED_CACHE_ENTRIES:
+            _compiled.popitem(last=False)
+    return compiled
@@ -0,0 +1,177 @@
+import json
+import struct
+import zlib
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+import pandas as pd
+
+# Columnar encoding for the table sections of a report.
+#
+# A report is stored as two parts: report_json keeps the small dict sections (kpis,
+# actions, method_notes) as plain JSON, so json_extract still works on them, and
+# report_blob holds the table sections column by column:
+#
+#   b"RPTC" | u8 version | u8 flags | u32 header length | header JSON | section payloads
+#
+# The header maps each section to its (offset, length) in the payload area plus the
+# column layout. Each section is compressed on its own, so one table can be decoded
+# without touching the others. Reports saved before this format have no blob and keep
+# their tables as records inside report_json; readers handle both.
+#
+# Version 2 adds nullable columns (Int64, Float64, boolean: values plus a missing mask),
+# keeps numeric columns at their own width and JSON columns at the string dtype; version
+# 1 blobs still decode.
+# benchmarks/check_report_codec.py checks that every column type round-trips.
+
+MAGIC = b"RPTC"
+CODEC_VERSION = 2
+FLAG_ZLIB = 1
+ZLIB_LEVEL = 1
+TABLE_SECTIONS = ("menu_summary", "menu_profit_approx", "menu_profit_recipe", "shrinkage", "anomalies",
+                  "shrinkage_periods")
+_PREFIX = struct.Struct("<4sBBI")
+
+def _encode_column(s: pd.Series) -> Tuple[Dict[str, Any], List[bytes]]:
+    if isinstance(s.dtype, pd.CategoricalDtype):
+        s = s.cat.remove_unused_categories()
+        cats = json.dumps(s.cat.categories.tolist(), default=str).encode("utf-8")
+        codes = s.cat.codes.to_numpy().astype("<i4").tobytes()
+        return {"type": "cat", "len": [len(cats), len(codes)]}, [cats, codes]
+    kind = s.dtype.kind
+    if isinstance(s.dtype, pd.api.extensions.ExtensionDtype) and kind in "iufb":
+        # nullable: the values with missing ones zeroed, then the mask
+        code = s.dtype.numpy_dtype.newbyteorder("<").str
+        mask = s.isna().to_numpy()
+        buf = s.to_numpy(dtype=code, na_value=0).tobytes()
+        return {"type": code, "dtype": s.dtype.name, "len": [len(buf), len(mask)]}, [buf, mask.tobytes()]
+    if kind == "M" and getattr(s.dtype, "tz", None) is None:
+        buf = s.to_numpy("datetime64[ns]").view("<i8").tobytes()
+        return {"type": "M8[ns]", "len": [len(buf)]}, [buf]
+    if kind in "fiub":
+        code = s.dtype.newbyteorder("<").str
+        buf = s.to_numpy().astype(code).tobytes()
+        return {"type": code, "len": [len(buf)]}, [buf]
+    vals = s.astype(object).where(s.notna(), None).tolist()
+    buf = json.dumps(vals, default=str).encode("utf-8")
+    spec = {"type": "json", "len": [len(buf)]}
+    if isinstance(s.dtype, pd.StringDtype):
+        spec["dtype"] = s.dtype.name
+    return spec, [buf]
+
+def _decode_column(spec: Dict[str, Any], parts: List[bytes]) -> Any:
+    t = spec["type"]
+    if t == "cat":
+        cats = json.loads(parts[0])
+        codes = np.frombuffer(parts[1], dtype="<i4")
+        return pd.Categorical.from_codes(codes, categories=cats)
+    if t == "M8[ns]":
+        return np.frombuffer(parts[0], dtype="<i8").view("datetime64[ns]")
+    if t == "json":
+        vals = json.loads(parts[0])
+        if "dtype" in spec:
+            return pd.array(vals, dtype=spec["dtype"])
+        # an empty list would otherwise come back as a float column
+        return vals if vals else np.array([], dtype=object)
+    if "dtype" in spec:
+        arr = pd.array(np.frombuffer(parts[0], dtype=t), dtype=spec["dtype"])
+        arr[np.frombuffer(parts[1], dtype=bool)] = pd.NA
+        return arr
+    # frombuffer is a read-only view over the payload; copy so callers can mutate
+    return np.frombuffer(parts[0], dtype=t).copy()
+
+def encode_table(df: pd.DataFrame) -> Tuple[Dict[str, Any], bytes]:
+    cols = []
+    bufs: List[bytes] = []
+    for name in df.columns:
+        spec, parts = _encode_column(df[name])
+        spec["name"] = str(name)
+        cols.append(spec)
+        bufs.extend(parts)
+    return {"rows": len(df), "columns": cols}, b"".join(bufs)
+
+def decode_table(layout: Dict[str, Any], payload: bytes) -> pd.DataFrame:
+    data = {}
+    pos = 0
+    for spec in layout["columns"]:
+        parts = []
+        for n in spec["len"]:
+            parts.append(payload[pos:pos + n])
+            pos += n
+        data[spec["name"]] = _decode_column(spec, parts)
+    return pd.DataFrame(data, index=pd.RangeIndex(layout["rows"]), columns=[c["name"] for c in layout["columns"]])
+
+def encode_report(report: Dict[str, Any], compress: bool = True) -> Tuple[str, bytes]:
+    """
+    Split a build_report dict into (report_json, report_blob). Table sections may be
+    DataFrames (build_report(..., records=False)) or lists of records.
+    """
+    rest = {}
+    tables: Dict[str, pd.DataFrame] = {}
+    for key, value in report.items():
+        if key not in TABLE_SECTIONS or value is None:
+            rest[key] = value
+            continue
+        tables[key] = value if isinstance(value, pd.DataFrame) else pd.DataFrame(value)
+    return json.dumps(rest, default=str), encode_tables(tables, compress)
+
+def encode_tables(tables: Dict[str, pd.DataFrame], compress: bool = True) -> bytes:
+    """Named DataFrames as one blob in the report_blob format (read back with decode_section)."""
+    sections: Dict[str, Any] = {}
+    payloads: List[bytes] = []
+    offset = 0
+    for key, df in tables.items():
+        layout, body = encode_table(df)
+        if compress:
+            body = zlib.compress(body, ZLIB_LEVEL)
+        layout.update(offset=offset, length=len(body))
+        sections[key] = layout
+        payloads.append(body)
+        offset += len(body)
+    header = json.dumps({"sections": sections}).encode("utf-8")
+    flags = FLAG_ZLIB if compress else 0
+    return _PREFIX.pack(MAGIC, CODEC_VERSION, flags, len(header)) + header + b"".join(payloads)
+
+def _read_header(blob: bytes) -> Tuple[Dict[str, Any], int, int]:
+    magic, version, flags, hlen = _PREFIX.unpack_from(blob)
+    if magic != MAGIC or version > CODEC_VERSION:
+        raise ValueError(f"Unsupported report encoding (version {version})")
+    start = _PREFIX.size + hlen
+    return json.loads(blob[_PREFIX.size:start]), flags, start
+
+def blob_sections(blob: bytes) -> List[str]:
+    return list(_read_header(blob)[0]["sections"])
+
+def decode_section(blob: bytes, section: str) -> Optional[pd.DataFrame]:
+    """One table section as a DataFrame, or None if the report doesn't have it."""
+    header, flags, start = _read_header(blob)
+    layout = header["sections"].get(section)
+    if layout is None:
+        return None
+    body = bytes(blob[start + layout["offset"]:start + layout["offset"] + layout["length"]])
+    if flags & FLAG_ZLIB:
+        body = zlib.decompress(body)
+    return decode_table(layout, body)
+
+def frame_records(df: pd.DataFrame) -> List[Dict[str, Any]]:
+    """Records in the same shape the JSON-only format stored (dates as strings)."""
+    out = df.copy()
+    for c in out.columns:
+        if out[c].dtype.kind == "M":
+            out[c] = out[c].dt.strftime("%Y-%m-%d %H:%M:%S").astype(object).where(out[c].notna(), None)
+    return out.to_dict(orient="records")
+
+def decode_report(report_json: str, report_blob: Optional[bytes] = None, frames: bool = False) -> Dict[str, Any]:
+    """
+    Full report dict from either storage format. Table sections come back as lists of
+    records, or as DataFrames with frames=True.
+    """
+    report = json.loads(report_json)
+    if report_blob is not None:
+        for section in blob_sections(report_blob):
+            df = decode_section(report_blob, section)
+            report[section] = df if frames else frame_records(df)
+    elif frames:
+        for section in TABLE_SECTIONS:
+            if report.get(section) is not None:
+                report[section] = pd.DataFrame(report[section])
+    return report
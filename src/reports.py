@@ -0,0 +1,150 @@
+import json
+import sqlite3
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+import pandas as pd
+from src.db import q_all, q_one, write_ctx
+from src.report_codec import TABLE_SECTIONS, decode_section, frame_records
+
+REPORT_PAGE_SIZE = 50
+KPI_BACKFILL_BATCH = 200
+KPI_COLUMNS = ("date_min", "date_max", "total_revenue", "total_units", "total_purchases_spend",
+               "top_leak_item", "top_leak_cost")
+# top-level keys of a report dict that can be loaded on their own
+REPORT_SECTIONS = ("kpis", "actions", "method_notes", "menu_summary", "menu_profit_approx", "menu_profit_recipe",
+                   "shrinkage", "anomalies", "shrinkage_periods")
+
+def list_reports(
+    db_path: str,
+    bar_id: int,
+    after: Optional[Tuple[str, int]] = None,
+    limit: int = REPORT_PAGE_SIZE
+) -> List[Dict[str, Any]]:
+    """
+    Metadata only (id, upload_id, label, created_at), newest first. Pass the (created_at, id)
+    of the last row seen as `after` to fetch the next page (keyset pagination).
+    """
+    if after is None:
+        return q_all(
+            db_path,
+            "SELECT id, upload_id, label, created_at FROM reports WHERE bar_id = ? "
+            "ORDER BY created_at DESC, id DESC LIMIT ?",
+            (bar_id, limit),
+        )
+    return q_all(
+        db_path,
+        "SELECT id, upload_id, label, created_at FROM reports WHERE bar_id = ? AND (created_at, id) < (?, ?) "
+        "ORDER BY created_at DESC, id DESC LIMIT ?",
+        (bar_id, after[0], after[1], limit),
+    )
+
+def _load_section_row(db_path: str, bar_id: int, report_id: int, section: str) -> Optional[Dict[str, Any]]:
+    if section not in REPORT_SECTIONS:
+        raise ValueError(f"Unknown report section: {section}")
+    # table sections live in report_blob for reports saved with report_codec and
+    # inside report_json for older ones; only the part that's needed is fetched
+    blob = "report_blob" if section in TABLE_SECTIONS else "NULL"
+    try:
+        return q_one(
+            db_path,
+            f"SELECT json_extract(report_json, ?) AS section, {blob} AS blob FROM reports WHERE id = ? AND bar_id = ?",
+            (f"$.{section}", report_id, bar_id),
+        )
+    except sqlite3.OperationalError:
+        # older reports can hold the bare NaN that json.dumps writes, which SQLite's JSON
+        # functions reject; Python's json accepts it, so parse that row here instead
+        row = q_one(db_path, f"SELECT report_json, {blob} AS blob FROM reports WHERE id = ? AND bar_id = ?",
+                    (report_id, bar_id))
+        if not row:
+            return None
+        value = json.loads(row["report_json"]).get(section)
+        return {"section": json.dumps(value) if value is not None else None, "blob": row["blob"]}
+
+def load_report_section(db_path: str, bar_id: int, report_id: int, section: str) -> Any:
+    """Decode a single top-level section of a stored report without parsing the rest."""
+    row = _load_section_row(db_path, bar_id, report_id, section)
+    if not row:
+        return None
+    if row["blob"] is not None:
+        df = decode_section(row["blob"], section)
+        return frame_records(df) if df is not None else None
+    if row["section"] is None:
+        return None
+    return json.loads(row["section"])
+
+def load_report_frame(db_path: str, bar_id: int, report_id: int, section: str) -> pd.DataFrame:
+    """A table section as a DataFrame (empty if the report doesn't have it)."""
+    row = _load_section_row(db_path, bar_id, report_id, section)
+    if row and row["blob"] is not None:
+        df = decode_section(row["blob"], section)
+        return df if df is not None else pd.DataFrame()
+    if not row or row["section"] is None:
+        return pd.DataFrame()
+    return pd.DataFrame(json.loads(row["section"]))
+
+def report_kpi_values(report_json: str, report_blob: Optional[bytes] = None) -> Tuple[Any, ...]:
+    """The KPI_COLUMNS values of a stored report (either format)."""
+    report = json.loads(report_json)
+    k = report.get("kpis") or {}
+    if report_blob is not None:
+        shrink = decode_section(report_blob, "shrinkage")
+        rows = [] if shrink is None or len(shrink) == 0 else [shrink.loc[shrink["est_cost_of_gap"].idxmax()]]
+    else:
+        rows = sorted(report.get("shrinkage") or [], key=lambda r: r.get("est_cost_of_gap") or 0.0, reverse=True)[:1]
+    top = rows[0] if rows else None
+    return (k.get("date_min"), k.get("date_max"), k.get("total_revenue"), k.get("total_units"),
+            k.get("total_purchases_spend"),
+            str(top["item_name"]) if top is not None else None,
+            float(top["est_cost_of_gap"]) if top is not None else None)
+
+_KPI_INSERT = (f"INSERT OR REPLACE INTO report_kpis (report_id, bar_id, created_at, {', '.join(KPI_COLUMNS)}) "
+               f"VALUES (?, ?, COALESCE(?, datetime('now')), {', '.join('?' * len(KPI_COLUMNS))})")
+
+def save_report_kpis(conn: sqlite3.Connection, report_id: int, bar_id: int, report_json: str,
+                     report_blob: Optional[bytes] = None, created_at: Optional[str] = None) -> None:
+    """Write the report's report_kpis row; call inside the transaction that inserts the report."""
+    conn.execute(_KPI_INSERT, (report_id, bar_id, created_at, *report_kpi_values(report_json, report_blob)))
+
+def backfill_report_kpis(db_path: str, batch: int = KPI_BACKFILL_BATCH) -> int:
+    """Add report_kpis rows for reports saved before the table existed. Returns rows written."""
+    done = 0
+    while True:
+        rows = q_all(
+            db_path,
+            "SELECT r.id, r.bar_id, r.created_at, r.report_json, r.report_blob FROM reports r "
+            "LEFT JOIN report_kpis k ON k.report_id = r.id WHERE k.report_id IS NULL ORDER BY r.id LIMIT ?",
+            (batch,),
+        )
+        if not rows:
+            return done
+        with write_ctx(db_path) as conn:
+            for r in rows:
+                try:
+                    values = report_kpi_values(r["report_json"], r["report_blob"])
+                except (ValueError, KeyError):
+                    # unreadable report: keep an empty row so it isn't retried on every start
+                    values = (None,) * len(KPI_COLUMNS)
+                conn.execute(_KPI_INSERT, (r["id"], r["bar_id"], r["created_at"], *values))
+        done += len(rows)
+
+def kpi_trend(db_path: str, bar_id: int) -> pd.DataFrame:
+    """
+    report_kpis for the bar, one row per reporting period (the newest report when several
+    cover the same date range), oldest period first. date_min / date_max are datetimes.
+    A report whose range spans other reports' ranges (a yearly report next to monthly ones)
+    is left out, so the series doesn't mix granularities.
+    """
+    rows = q_all(
+        db_path,
+        f"SELECT report_id, created_at, {', '.join(KPI_COLUMNS)} FROM report_kpis "
+        "WHERE bar_id = ? AND date_max IS NOT NULL ORDER BY date_max, report_id",
+        (bar_id,),
+    )
+    df = pd.DataFrame(rows, columns=["report_id", "created_at", *KPI_COLUMNS])
+    df = df.drop_duplicates(["date_min", "date_max"], keep="last").reset_index(drop=True)
+    df["date_min"] = pd.to_datetime(df["date_min"])
+    df["date_max"] = pd.to_datetime(df["date_max"])
+    lo, hi = df["date_min"].to_numpy(), df["date_max"].to_numpy()
+    spans = (lo[:, None] <= lo[None, :]) & (hi[None, :] <= hi[:, None])
+    np.fill_diagonal(spans, False)
+    return df[~spans.any(axis=1)].reset_index(drop=True)
@@ -0,0 +1,162 @@
+from __future__ import annotations
+from dataclasses import dataclass
+from typing import Mapping, Optional, Sequence, Union
+import numpy as np
+import pandas as pd
+
+# What-if grid over a finished report: bottle sizes x price deltas x demand elasticities,
+# evaluated in one broadcast pass over the per-drink and per-item aggregates. Nothing here
+# touches raw sales; the inputs are the report's menu and shrinkage tables, so a cube can
+# be built for any saved report and sliced by the UI without recomputation.
+#
+# Demand model (linear, per drink): qty' = qty * max(0, 1 + e * dp / price), where price
+# is the drink's average revenue per unit. Drink cost scales with volume at the report's
+# approximate unit cost (approx_cogs_allocated / quantity_sold) when purchases were given.
+#
+# Price deltas are one axis shared by all drinks: grid step p moves drink d's price by
+# price_deltas[p] * price_weight[d]. The weights are the per-drink delta vector (1 for
+# every drink, 1/0 for a target list, or any per-drink mix); a full grid per drink
+# would be P ** D points, so independent per-drink axes are not enumerated.
+
+DEFAULT_BOTTLE_SIZES = (700.0, 750.0, 1000.0, 1750.0)
+DEFAULT_PRICE_DELTAS = (-1.0, -0.5, 0.0, 0.5, 1.0, 1.5, 2.0)
+DEFAULT_ELASTICITIES = (0.0, -0.25, -0.5, -1.0, -1.5)
+
+@dataclass
+class ScenarioCube:
+    bottle_sizes: np.ndarray   # (B,)
+    price_deltas: np.ndarray   # (P,)
+    elasticities: np.ndarray   # (E,)
+    drinks: np.ndarray         # (D,)
+    items: np.ndarray          # (I,)
+    targeted: np.ndarray       # (D,) bool, drinks the price delta applies to
+    price_weight: np.ndarray   # (D,) each drink's share of the grid's price delta
+    quantity: np.ndarray       # (P, E, D)
+    revenue: np.ndarray        # (P, E, D)
+    drink_cost: np.ndarray     # (P, E, D), zeros without purchases
+    gap_cost: np.ndarray       # (B, I) estimated cost of the purchased-vs-expected gap
+    base_bottle_ml: float      # bottle size the report itself was built with
+    base_revenue: float
+    base_drink_cost: float
+
+    def _at(self, axis: np.ndarray, value: float) -> int:
+        # nearest grid point, so UI values that don't sit exactly on the grid still work
+        return int(np.abs(axis - value).argmin())
+
+    def totals(self) -> pd.DataFrame:
+        """
+        One row per (bottle size, price delta, elasticity). net_change is against the report
+        as built (no price change, the report's bottle size).
+        """
+        rev = self.revenue.sum(axis=2)                      # (P, E)
+        gross = rev - self.drink_cost.sum(axis=2)           # (P, E)
+        gap = self.gap_cost.sum(axis=1)                     # (B,)
+        net = gross[None, :, :] - gap[:, None, None]        # (B, P, E)
+        base_net = (self.base_revenue - self.base_drink_cost) - gap[self._at(self.bottle_sizes, self.base_bottle_ml)]
+        b, p, e = np.meshgrid(self.bottle_sizes, self.price_deltas, self.elasticities, indexing="ij")
+        return pd.DataFrame({
+            "bottle_ml": b.ravel(),
+            "price_delta": p.ravel(),
+            "elasticity": e.ravel(),
+            "revenue": np.broadcast_to(rev, net.shape).ravel(),
+            "gross_profit": np.broadcast_to(gross, net.shape).ravel(),
+            "gap_cost": np.broadcast_to(gap[:, None, None], net.shape).ravel(),
+            "net_profit": net.ravel(),
+            "net_change": net.ravel() - base_net,
+        })
+
+    def by_drink(self, price_delta: float, elasticity: float) -> pd.DataFrame:
+        """Per-drink slice at one (price delta, elasticity) point."""
+        p, e = self._at(self.price_deltas, price_delta), self._at(self.elasticities, elasticity)
+        base = self.revenue[self._at(self.price_deltas, 0.0), e]
+        out = pd.DataFrame({
+            "drink_name": self.drinks,
+            "targeted": self.targeted,
+            "price_change": self.price_deltas[p] * self.price_weight,
+            "quantity": self.quantity[p, e],
+            "revenue": self.revenue[p, e],
+            "revenue_change": self.revenue[p, e] - base,
+            "gross_profit": self.revenue[p, e] - self.drink_cost[p, e],
+        })
+        return out.sort_values("revenue_change", ascending=False, kind="stable")
+
+    def by_item(self, bottle_ml: float) -> pd.DataFrame:
+        """Per-item shrinkage gap cost at one bottle size."""
+        b = self._at(self.bottle_sizes, bottle_ml)
+        out = pd.DataFrame({"item_name": self.items, "gap_cost": self.gap_cost[b]})
+        return out.sort_values("gap_cost", ascending=False, kind="stable")
+
+def build_cube(
+    menu: pd.DataFrame,
+    approx: Optional[pd.DataFrame] = None,
+    shrink: Optional[pd.DataFrame] = None,
+    bottle_sizes: Sequence[float] = DEFAULT_BOTTLE_SIZES,
+    price_deltas: Sequence[float] = DEFAULT_PRICE_DELTAS,
+    elasticities: Sequence[float] = DEFAULT_ELASTICITIES,
+    targets: Optional[Union[Sequence[str], Mapping[str, float]]] = None
+) -> ScenarioCube:
+    """
+    menu: menu_summary (drink_name, quantity_sold, revenue); approx: menu_profit_approx
+    (adds approx_cogs_allocated); shrink: shrinkage (item_name, ml_expected,
+    units_purchased, avg_unit_cost, ml_purchased). targets limits the price delta to those
+    drinks, or maps drink -> weight so each drink moves by price_delta * weight (e.g.
+    {"Negroni": 1.0, "House Lager": 0.5}); unlisted drinks keep their price.
+    """
+    has_shrink = shrink is not None and len(shrink) > 0
+    base_ml = 750.0
+    if has_shrink:
+        # the shrinkage table carries ml_purchased = units * the bottle size the report used
+        units = shrink["units_purchased"].fillna(0.0).to_numpy(dtype=float)
+        bought = units > 0
+        if bought.any():
+            base_ml = float(np.median(shrink["ml_purchased"].to_numpy(dtype=float)[bought] / units[bought]))
+    # the report's own bottle size is always on the grid so net_change has an exact baseline
+    B = np.union1d(np.asarray(bottle_sizes, dtype=float), [base_ml])
+    P = np.asarray(price_deltas, dtype=float)
+    E = np.asarray(elasticities, dtype=float)
+
+    drinks = menu["drink_name"].astype(str).to_numpy()
+    qty = menu["quantity_sold"].to_numpy(dtype=float)
+    rev = menu["revenue"].to_numpy(dtype=float)
+    price = np.divide(rev, qty, out=np.zeros_like(rev), where=qty > 0)
+    if approx is not None and len(approx) > 0:
+        cogs = pd.Series(approx["approx_cogs_allocated"].to_numpy(dtype=float),
+                         index=approx["drink_name"].astype(str)).reindex(drinks).fillna(0.0).to_numpy()
+    else:
+        cogs = np.zeros_like(rev)
+    unit_cost = np.divide(cogs, qty, out=np.zeros_like(cogs), where=qty > 0)
+    if targets is None:
+        weight = np.ones(len(drinks))
+    elif isinstance(targets, Mapping):
+        weight = pd.Series(targets, dtype=float).reindex(drinks).fillna(0.0).to_numpy()
+    else:
+        weight = np.isin(drinks, list(targets)).astype(float)
+    weight = np.where(price > 0, weight, 0.0)   # no price to move without sales
+    targeted = weight != 0
+
+    # (P, 1, D) price change per drink
+    dp = (P[:, None] * weight)[:, None, :]
+    rel = np.divide(dp, price, out=np.zeros(dp.shape), where=price > 0)
+    q = qty * np.maximum(0.0, 1.0 + E[None, :, None] * rel)   # (P, E, D)
+    r = q * (price + dp)
+    c = q * unit_cost
+
+    if has_shrink:
+        items = shrink["item_name"].astype(str).to_numpy()
+        expected = shrink["ml_expected"].to_numpy(dtype=float)
+        cost = shrink["avg_unit_cost"].fillna(0.0).to_numpy(dtype=float)
+        bottles_gap = (units[None, :] * B[:, None] - expected[None, :]) / B[:, None]   # (B, I)
+        gap_cost = np.where(bottles_gap > 0, bottles_gap * cost[None, :], 0.0)
+    else:
+        items = np.array([], dtype=object)
+        gap_cost = np.zeros((len(B), 0))
+
+    return ScenarioCube(B, P, E, drinks, items, targeted, weight, q, r, c, gap_cost, base_bottle_ml=base_ml,
+                        base_revenue=float(rev.sum()), base_drink_cost=float(cogs.sum()))
+
+def price_test_uplift(menu: pd.DataFrame, top_n: int, price_deltas: Sequence[float], elasticity: float) -> np.ndarray:
+    """Revenue change from raising the top_n sellers' prices by each delta (menu sorted by revenue desc)."""
+    top = menu.head(top_n)
+    cube = build_cube(top, price_deltas=(0.0, *price_deltas), elasticities=(elasticity,))
+    rev = cube.revenue[:, 0, :].sum(axis=1)
+    return rev[1:] - rev[0]
@@ -0,0 +1,144 @@
+from __future__ import annotations
+from typing import Optional
+import numpy as np
+import pandas as pd
+from src.recipes import CompiledRecipes
+from src.cogs import cost_layers, daily_sales, item_usage
+from src.io_validate import day_floor
+
+# Time-phased shrinkage: expected usage vs purchases per item and period (weekly by
+# default), optionally reconciled against inventory counts.
+#
+# Usage (through recipes) and purchases go into one per-item ledger of cumulative ml in
+# and out by day. Anything "as of" a date -- a period end, a count -- is then a single
+# as-of merge against that ledger, and any window is a difference of two cumulative
+# values, so every period of every item comes out of one pass.
+#
+# A count dated d is the stock at close of day d. Between two counts of an item:
+#   book stock  = previous count + ml purchased since - ml expected since
+#   shrink      = book stock - counted stock   (positive: missing, negative: overage)
+# and the shrink is booked to the period holding the later count. Without counts there
+# is no stock figure, only the purchased-vs-expected gap per period and its running total
+# (a delivery shows up as a positive week followed by negative ones; a leak keeps the
+# running total climbing).
+
+SHRINK_FREQ = "W-SUN"
+PERIOD_COLUMNS = ["item_name", "period_start", "period_end", "ml_expected", "ml_purchased", "ml_gap", "ml_gap_cum",
+                  "counts", "ml_shrink", "on_hand_ml_est", "cost_per_ml", "est_cost_of_gap", "est_cost_of_shrink"]
+
+def _ledger(usage: pd.DataFrame, layers: pd.DataFrame) -> pd.DataFrame:
+    """Per (item, day): cumulative ml purchased (cum_in) and expected to be used (cum_out), sorted by date."""
+    moves = pd.concat([
+        pd.DataFrame({"item": usage["item"], "date": usage["date"], "ml_in": 0.0, "ml_out": usage["ml_used"]}),
+        pd.DataFrame({"item": layers["item"], "date": layers["date"], "ml_in": layers["ml_in"], "ml_out": 0.0}),
+    ], ignore_index=True)
+    led = moves.groupby(["item", "date"], as_index=False, sort=True)[["ml_in", "ml_out"]].sum()
+    by_item = led.groupby("item", sort=False)
+    led["cum_in"] = by_item["ml_in"].cumsum()
+    led["cum_out"] = by_item["ml_out"].cumsum()
+    return led[["item", "date", "cum_in", "cum_out"]].sort_values("date", kind="stable")
+
+def _asof(left: pd.DataFrame, right: pd.DataFrame) -> pd.DataFrame:
+    """right's last row per item on or before each left (item, date), in left's row order."""
+    m = pd.merge_asof(left[["item", "date"]].assign(_row=np.arange(len(left))).sort_values("date", kind="stable"),
+                      right, on="date", by="item", direction="backward")
+    return m.sort_values("_row", kind="stable").drop(columns=["item", "date", "_row"]).reset_index(drop=True)
+
+def period_ends(first: pd.Timestamp, last: pd.Timestamp, freq: str = SHRINK_FREQ) -> pd.DatetimeIndex:
+    """Period end dates covering [first, last]; the last end is on or after `last`."""
+    ends = pd.date_range(first, last + pd.tseries.frequencies.to_offset(freq), freq=freq)
+    return ends[:ends.searchsorted(last) + 1]
+
+def period_shrinkage(
+    sales: pd.DataFrame,
+    purchases: pd.DataFrame,
+    compiled: CompiledRecipes,
+    counts: Optional[pd.DataFrame] = None,
+    ml_per_unit: float = 750.0,
+    freq: str = SHRINK_FREQ
+) -> pd.DataFrame:
+    """
+    One row per (recipe item, period) with any activity: item_name, period_start,
+    period_end, ml_expected, ml_purchased, ml_gap, ml_gap_cum, counts (counts that closed
+    a counted interval in the period), ml_shrink, on_hand_ml_est, cost_per_ml,
+    est_cost_of_gap, est_cost_of_shrink. ml_shrink and on_hand_ml_est stay NaN until an
+    item has been counted. counts: validated inventory counts (date, item_name, units_on_hand).
+    """
+    usage, _, _, _ = item_usage(daily_sales(sales), compiled)
+    layers = cost_layers(purchases, compiled, ml_per_unit)
+    led = _ledger(usage, layers)
+
+    has_counts = counts is not None and len(counts) > 0
+    if has_counts:
+        item = compiled.items.get_indexer(pd.Index(counts["item_name"].astype(str)))
+        known = item >= 0
+        cnt = (pd.DataFrame({"item": item[known], "date": day_floor(counts["date"]).to_numpy()[known],
+                             "ml": counts["units_on_hand"].to_numpy(dtype=float)[known] * float(ml_per_unit)})
+               .drop_duplicates(["item", "date"], keep="last")
+               .sort_values(["item", "date"], kind="stable", ignore_index=True))
+        has_counts = len(cnt) > 0
+    if not has_counts:
+        cnt = pd.DataFrame({"item": np.array([], dtype=np.int64), "date": pd.DatetimeIndex([]), "ml": np.array([])})
+
+    dates = pd.concat([led["date"], cnt["date"]])
+    if len(dates) == 0:
+        return pd.DataFrame(columns=PERIOD_COLUMNS)
+    ends = period_ends(dates.min(), dates.max(), freq)
+    n_p = len(ends)
+    active = np.union1d(led["item"].unique(), cnt["item"].unique()).astype(np.int64)
+    n_i = len(active)
+    slot = np.full(len(compiled.items), -1)
+    slot[active] = np.arange(n_i)
+
+    # cumulative in / out at every (item, period end): one as-of merge, then diff along periods
+    grid = pd.DataFrame({"item": np.repeat(active, n_p), "date": np.tile(ends.to_numpy(), n_i)})
+    at_end = _asof(grid, led).fillna(0.0)
+    cum_in = at_end["cum_in"].to_numpy().reshape(n_i, n_p)
+    cum_out = at_end["cum_out"].to_numpy().reshape(n_i, n_p)
+    purchased = np.diff(cum_in, axis=1, prepend=0.0)
+    expected = np.diff(cum_out, axis=1, prepend=0.0)
+    gap = purchased - expected
+
+    shrink = np.full((n_i, n_p), np.nan)
+    on_hand = np.full((n_i, n_p), np.nan)
+    n_counts = np.zeros((n_i, n_p), dtype=np.int64)
+    if has_counts:
+        at_count = _asof(cnt, led).fillna(0.0)
+        cnt["cum_in"], cnt["cum_out"] = at_count["cum_in"].to_numpy(), at_count["cum_out"].to_numpy()
+        # previous count of the same item (cnt is sorted by item, date)
+        prev = cnt.shift(1)
+        same = (cnt["item"] == prev["item"]).to_numpy()
+        book = prev["ml"] + (cnt["cum_in"] - prev["cum_in"]) - (cnt["cum_out"] - prev["cum_out"])
+        var = (book - cnt["ml"]).to_numpy()[same]
+        cell = slot[cnt["item"].to_numpy()[same]] * n_p + ends.searchsorted(cnt["date"].to_numpy()[same])
+        n_counts = np.bincount(cell, minlength=n_i * n_p).reshape(n_i, n_p)
+        shrink = np.bincount(cell, weights=var, minlength=n_i * n_p).reshape(n_i, n_p)
+        shrink = np.where(n_counts > 0, shrink, np.nan)
+        # book stock at each period end, rolled forward from the latest count
+        last = _asof(grid, cnt.sort_values("date", kind="stable"))
+        on_hand = (last["ml"] + (cum_in.ravel() - last["cum_in"]) - (cum_out.ravel() - last["cum_out"]))
+        on_hand = on_hand.to_numpy().reshape(n_i, n_p)
+
+    # cost per ml as of the period end: the latest purchase, else the item's first one
+    price = _asof(grid, layers[["item", "date", "cost_per_ml"]].sort_values("date", kind="stable"))["cost_per_ml"]
+    first = layers.drop_duplicates("item").set_index("item")["cost_per_ml"]
+    cpm = price.fillna(grid["item"].map(first)).to_numpy().reshape(n_i, n_p)
+
+    starts = np.concatenate([[dates.min().to_datetime64()], (ends[:-1] + pd.Timedelta(days=1)).to_numpy()])
+    out = pd.DataFrame({
+        "item_name": np.asarray(compiled.items, dtype=object)[np.repeat(active, n_p)],
+        "period_start": np.tile(starts, n_i),
+        "period_end": grid["date"].to_numpy(),
+        "ml_expected": expected.ravel(),
+        "ml_purchased": purchased.ravel(),
+        "ml_gap": gap.ravel(),
+        "ml_gap_cum": np.cumsum(gap, axis=1).ravel(),
+        "counts": n_counts.ravel(),
+        "ml_shrink": shrink.ravel(),
+        "on_hand_ml_est": on_hand.ravel(),
+        "cost_per_ml": cpm.ravel(),
+    })
+    out["est_cost_of_gap"] = np.where(out["ml_gap"] > 0, out["ml_gap"] * out["cost_per_ml"].fillna(0.0), 0.0)
+    out["est_cost_of_shrink"] = out["ml_shrink"] * out["cost_per_ml"].fillna(0.0)
+    busy = (out["ml_expected"] != 0) | (out["ml_purchased"] != 0) | (out["counts"] > 0)
+    return out[busy].reset_index(drop=True)
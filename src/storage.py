@@ -0,0 +1,129 @@
+import hashlib
+import os
+import threading
+from typing import Iterator, List, Optional, Tuple
+import pandas as pd
+from src.db import q_one, exec_one
+
+try:
+    import pyarrow  # noqa: F401
+    PARQUET_ENABLED = True
+except ImportError:
+    PARQUET_ENABLED = False
+
+# bump when build_report output changes so memoized reports are recomputed
+REPORT_ENGINE_VERSION = 9
+# bump when validate_* output changes so stale typed copies are ignored
+VALIDATED_FORMAT_VERSION = 2
+# rows per Parquet row group, so a typed copy can be read back a bounded slice at a time
+VALIDATED_ROW_GROUP_ROWS = 250_000
+# bump when the day cube layout changes (see src/daycube.py)
+DAY_CUBE_VERSION = 1
+
+def content_hash(data) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+def _tmp_path(path: str) -> str:
+    # unique per process and thread: job threads may write the same file concurrently
+    return f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+
+def blob_path(data_dir: str, digest: str, ext: str = ".csv") -> str:
+    return os.path.join(data_dir, "blobs", digest[:2], f"{digest}{ext}")
+
+def store_blob(data_dir: str, digest: str, data, ext: str = ".csv") -> str:
+    """Write data under its content hash unless an identical file is already stored."""
+    return write_blob(blob_path(data_dir, digest, ext), data)
+
+def write_blob(path: str, data) -> str:
+    """store_blob for a path already computed with blob_path."""
+    if os.path.exists(path):
+        return path
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # write-then-rename so a concurrent reader never sees a partial file
+    tmp = _tmp_path(path)
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+    return path
+
+def validated_path(csv_path: str, kind: str) -> str:
+    """Typed Parquet copy of a stored CSV, kept next to it in the content store."""
+    return f"{os.path.splitext(csv_path)[0]}.{kind}.v{VALIDATED_FORMAT_VERSION}.parquet"
+
+def has_validated(csv_path: str, kind: str) -> bool:
+    return PARQUET_ENABLED and os.path.exists(validated_path(csv_path, kind))
+
+def store_validated(csv_path: str, kind: str, df: pd.DataFrame) -> Optional[str]:
+    """Write the validated frame for a stored CSV (no-op without pyarrow)."""
+    if not PARQUET_ENABLED:
+        return None
+    path = validated_path(csv_path, kind)
+    if os.path.exists(path):
+        return path
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = _tmp_path(path)
+    df.to_parquet(tmp, engine="pyarrow", compression="zstd", index=False, row_group_size=VALIDATED_ROW_GROUP_ROWS)
+    os.replace(tmp, path)
+    return path
+
+def load_validated(csv_path: str, kind: str, columns: List[str]) -> Optional[pd.DataFrame]:
+    """The validated frame saved by store_validated (only `columns`), or None if there isn't one."""
+    if not has_validated(csv_path, kind):
+        return None
+    return pd.read_parquet(validated_path(csv_path, kind), engine="pyarrow", columns=columns, memory_map=True)
+
+def iter_validated(csv_path: str, kind: str, columns: List[str],
+                   batch_rows: int = VALIDATED_ROW_GROUP_ROWS) -> Iterator[pd.DataFrame]:
+    """load_validated in chunks of at most batch_rows rows (memory stays bounded by the chunk)."""
+    import pyarrow.parquet as pq
+    f = pq.ParquetFile(validated_path(csv_path, kind), memory_map=True)
+    for batch in f.iter_batches(batch_size=batch_rows, columns=columns):
+        yield batch.to_pandas()
+
+def report_cache_key(
+    sales_hash: str,
+    purchases_hash: Optional[str],
+    recipes_hash: Optional[str],
+    ml_per_unit_purchased_default: float,
+    cogs_method: str = "approx",
+    counts_hash: Optional[str] = None,
+    mappings_hash: Optional[str] = None,
+    daily_anomalies: bool = False,
+    weekly_shrinkage: bool = False
+) -> str:
+    parts = [f"v{REPORT_ENGINE_VERSION}", sales_hash, purchases_hash or "-", recipes_hash or "-",
+             repr(float(ml_per_unit_purchased_default))]
+    # optional inputs are appended only when set, so existing cache entries stay valid
+    if cogs_method != "approx":
+        parts.append(cogs_method)
+    if counts_hash:
+        parts.append(f"counts:{counts_hash}")
+    if mappings_hash:
+        parts.append(f"names:{mappings_hash}")
+    if daily_anomalies:
+        parts.append("anomalies")
+    if weekly_shrinkage:
+        parts.append("weekly")
+    return content_hash("|".join(parts).encode("utf-8"))
+
+def get_cached_report(db_path: str, cache_key: str) -> Optional[Tuple[str, Optional[bytes]]]:
+    """(report_json, report_blob) as produced by report_codec.encode_report, or None."""
+    row = q_one(db_path, "SELECT report_json, report_blob FROM report_cache WHERE cache_key = ?", (cache_key,))
+    return (row["report_json"], row["report_blob"]) if row else None
+
+def put_cached_report(db_path: str, cache_key: str, report_json: str, report_blob: Optional[bytes] = None) -> None:
+    exec_one(db_path, "INSERT OR REPLACE INTO report_cache (cache_key, report_json, report_blob) VALUES (?, ?, ?)",
+             (cache_key, report_json, report_blob))
+
+def day_cube_key(sales_hash: str, purchases_hash: Optional[str]) -> str:
+    return content_hash(f"cube{DAY_CUBE_VERSION}|{sales_hash}|{purchases_hash or '-'}".encode("utf-8"))
+
+def has_day_cube(db_path: str, cube_key: str) -> bool:
+    return q_one(db_path, "SELECT 1 AS found FROM day_cubes WHERE cube_key = ?", (cube_key,)) is not None
+
+def get_day_cube(db_path: str, cube_key: str) -> Optional[bytes]:
+    row = q_one(db_path, "SELECT cube_blob FROM day_cubes WHERE cube_key = ?", (cube_key,))
+    return row["cube_blob"] if row else None
+
+def put_day_cube(db_path: str, cube_key: str, cube_blob: bytes) -> None:
+    exec_one(db_path, "INSERT OR IGNORE INTO day_cubes (cube_key, cube_blob) VALUES (?, ?)", (cube_key, cube_blob))
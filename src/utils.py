@@ -1,12 +1,17 @@
 import os
 import streamlit as st
 
+# resolved once per process; secrets don't change without a restart
+@st.cache_resource
 def get_settings() -> dict:
     # Safe defaults
     secret = st.secrets.get("APP_SECRET", "dev-secret-change-me")
     db_path = st.secrets.get("DB_PATH", "app.db")
     data_dir = st.secrets.get("DATA_DIR", "data")
+    perf_enabled = bool(st.secrets.get("PERF_ENABLED", True))
+    admin_emails = [str(e).strip().lower() for e in st.secrets.get("ADMIN_EMAILS", [])]
 
     os.makedirs(data_dir, exist_ok=True)
-    return {"APP_SECRET": secret, "DB_PATH": db_path, "DATA_DIR": data_dir}
+    return {"APP_SECRET": secret, "DB_PATH": db_path, "DATA_DIR": data_dir,
+            "PERF_ENABLED": perf_enabled, "ADMIN_EMAILS": admin_emails}
 